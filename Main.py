@@ -4,22 +4,244 @@
 
 # import needed libraries
 import argparse
-import glob
+import os
+import shutil
 
 import scripts.python.DataSources
 import scripts.python.EdgeDictionary
+from scripts.python.DeductiveClosure import closes_knowledge_graph_incrementally
 from scripts.python.KnowledgeGraph import *
 from scripts.python.KnowledgeGraphEmbedder import *
+from scripts.python.PipelineRunner import PipelineRunner, Stage
+from scripts.python.RDFXMLReader import reads_rdfxml, writes_ntriples
+from scripts.python.ShardedKnowledgeGraph import creates_shard_tasks, merges_edge_shards, runs_shard_workers
+from scripts.python.TripleStore import creates_graph
 
 
-def main():
-    parser = argparse.ArgumentParser(description='PheKnowLator: This program builds a biomedical knowledge graph using'
-                                                 'Open Biomedical Ontologies and linked open data. The programs takes'
-                                                 'the following arguments:')
-    parser.add_argument('-o', '--onts', help='name/path to text file containing ontologies', required=True)
-    parser.add_argument('-c', '--cls', help='name/path to text file containing class sources', required=True)
-    parser.add_argument('-i', '--inst', help='name/path to text file containing instance sources', required=True)
-    args = parser.parse_args()
+# set file paths
+ont_files = './resources/ontologies/'
+merged_onts = ont_files + 'merged_ontologies/'
+edge_files = './resources/edge_data/'
+ont_kg = './resources/knowledge_graphs/'
+embed_path = './resources/embeddings/'
+
+
+def downloads_data_sources(data_source, resource_file, download_type, output):
+    """Downloads the data sources listed in a resource file, writes their metadata, and saves the mapping between each
+    source and its downloaded file to a json file.
+
+    Args:
+        data_source (class): The DataSources class used to process the sources (i.e. OntData or Data).
+        resource_file (str): A string naming the name/path to the text file listing the sources.
+        download_type (str): A string that indicates whether ontologies should be downloaded with imports ('imports').
+        output (str): A string naming the json file to write the source-file mapping to.
+
+    Returns:
+        None.
+    """
+
+    data = data_source(resource_file)
+    data.parses_resource_file()
+    data.downloads_data_from_url(download_type)
+    data.generates_source_metadata()
+    data.writes_source_metadata_locally()
+
+    with open(output, 'w') as filepath:
+        json.dump(data.data_files, filepath)
+
+    return None
+
+
+def creates_master_edge_dictionary(data_file_maps, resource_info, output):
+    """Creates the edge lists for every edge type and saves the master edge dictionary locally.
+
+    Args:
+        data_file_maps (list): A list of json files mapping sources to downloaded files (later files take precedence).
+        resource_info (str): A string naming the name/path to the resource_info text file.
+        output (str): A string naming the json file to write the master edge dictionary to.
+
+    Returns:
+        None.
+    """
+
+    combined_edges = {}
+    for data_file_map in data_file_maps:
+        with open(data_file_map, 'r') as filepath:
+            combined_edges.update(json.load(filepath))
+
+    master_edges = scripts.python.EdgeDictionary.EdgeList(combined_edges, resource_info)
+    master_edges.creates_knowledge_graph_edges()
+
+    with open(output, 'w') as filepath:
+        json.dump(master_edges.source_info, filepath)
+
+    return None
+
+
+def converts_ontology_to_ntriples(ontology, output):
+    """Converts an RDF/XML ontology into N-Triples so it can be combined with the edge shards, streaming the triples
+    instead of loading the ontology into a graph (see RDFXMLReader.reads_rdfxml).
+
+    Args:
+        ontology (str): A string naming the name/path to an ontology.
+        output (str): A string naming the N-Triples file to write.
+
+    Returns:
+        None.
+    """
+
+    writes_ntriples(reads_rdfxml(ontology), output)
+
+    return None
+
+
+def builds_edge_shards(master_edges, queue_dir, shard_dir, manifest, processes):
+    """Builds one N-Triples shard per edge type with a pool of workers sharing a file-based work queue and saves the
+    list of shards to a manifest file.
+
+    Args:
+        master_edges (str): A string naming the json file storing the master edge dictionary.
+        queue_dir (str): A string naming the directory of the work queue.
+        shard_dir (str): A string naming the directory to write the shards to.
+        manifest (str): A string naming the json file to write the list of shards to.
+        processes (int): The number of worker processes.
+
+    Returns:
+        None.
+    """
+
+    with open(master_edges, 'r') as filepath:
+        edge_dict = json.load(filepath)
+
+    # start from an empty queue and shard directory so shards of removed edge types are not kept
+    shutil.rmtree(queue_dir, ignore_errors=True)
+    shutil.rmtree(shard_dir, ignore_errors=True)
+
+    creates_shard_tasks(edge_dict, queue_dir)
+    shards = runs_shard_workers(queue_dir, shard_dir, processes)
+
+    with open(manifest, 'w') as filepath:
+        json.dump(shards, filepath)
+
+    return None
+
+
+def builds_knowledge_graph(ontology_triples, manifest, shard_dir, output, class_map_output):
+    """Combines the ontology and the edge shards into the knowledge graph.
+
+    Args:
+        ontology_triples (str): A string naming the ontology N-Triples file.
+        manifest (str): A string naming the json file listing the shards.
+        shard_dir (str): A string naming the directory of the shards.
+        output (str): A string naming the N-Triples file to write the knowledge graph to.
+        class_map_output (str): A string naming the json file to write the class instance iri map to.
+
+    Returns:
+        None.
+    """
+
+    with open(manifest, 'r') as filepath:
+        shards = json.load(filepath)
+
+    merges_edge_shards([ontology_triples] + [shard_dir + shard for shard in shards], output, shard_dir,
+                       class_map_output)
+
+    return None
+
+
+def removes_disjointness(kg, output, backend):
+    """Removes the disjointness axioms from a knowledge graph (see KnowledgeGraph.removes_disointness_axioms).
+
+    Args:
+        kg (str): A string naming the knowledge graph N-Triples file.
+        output (str): A string naming the file to write the knowledge graph without disjointness axioms to.
+        backend (str): A string naming the store used to hold the graph (see TripleStore.creates_graph).
+
+    Returns:
+        None.
+    """
+
+    removes_disointness_axioms(creates_graph(backend).parse(kg, format='nt'), output)
+
+    return None
+
+
+def closes_knowledge_graph_from_shards(kg, ontology, manifest, shard_dir, output, cache_dir):
+    """Deductively closes a knowledge graph from its merged ontology and edge shards, reusing the cached ontology
+    closure and the cached inferences of the shards that did not change (see
+    DeductiveClosure.closes_knowledge_graph_incrementally), and merges the inferred triples with the asserted triples
+    of the knowledge graph.
+
+    Args:
+        kg (str): A string naming the knowledge graph (RDF/XML) to close.
+        ontology (str): A string naming the merged ontology (RDF/XML).
+        manifest (str): A string naming the json file listing the shards.
+        shard_dir (str): A string naming the directory of the shards.
+        output (str): A string naming the N-Triples file to write the closed knowledge graph to.
+        cache_dir (str): A string naming the directory that stores the cached closures and inferences.
+
+    Returns:
+        None.
+    """
+
+    with open(manifest, 'r') as filepath:
+        shards = json.load(filepath)
+
+    inferred, asserted = output[:-3] + '_Inferred.nt', output[:-3] + '_Asserted.nt'
+    closes_knowledge_graph_incrementally(ontology, [shard_dir + shard for shard in shards], inferred, cache_dir)
+    writes_ntriples(reads_rdfxml(kg), asserted)
+
+    try:
+        merges_edge_shards([asserted, inferred], output)
+    finally:
+        os.remove(asserted)
+
+    return None
+
+
+def strips_metadata_nodes(kg, output, iri_mapper):
+    """Removes the metadata nodes from a knowledge graph (see KnowledgeGraph.removes_metadata_nodes).
+
+    Args:
+        kg (str): A string naming the knowledge graph file (N-Triples if it ends with '.nt', otherwise RDF/XML).
+        output (str): A string naming the N-Triples file to write results to.
+        iri_mapper (str): A string naming the class instance iri-class identifier map.
+
+    Returns:
+        None.
+    """
+
+    removes_metadata_nodes(reads_ntriples(kg) if kg.endswith('.nt') else reads_rdfxml(kg), output, iri_mapper)
+
+    return None
+
+
+def encodes_knowledge_graph(kg, output_trip_ints, output_map):
+    """Converts the triples of a knowledge graph to integers (see KnowledgeGraph.maps_str_to_int).
+
+    Args:
+        kg (str): A string naming the knowledge graph N-Triples file.
+        output_trip_ints (str): A string naming the integer edge list file.
+        output_map (str): A string naming the json file to export the node label-integer map to.
+
+    Returns:
+        None.
+    """
+
+    maps_str_to_int(reads_ntriples(kg), output_trip_ints, output_map)
+
+    return None
+
+
+def builds_pipeline(args):
+    """Defines the PheKnowLator build as a directed acyclic graph of stages connected through their files.
+
+    Args:
+        args (namespace): The parsed command line arguments.
+
+    Returns:
+        A list of PipelineRunner.Stage objects.
+    """
 
     ######################
     # READ IN DATA #
@@ -31,159 +253,146 @@ def main():
     # get mapping between CHEBI and MESH
     # run python/NCBO_rest_api.py file to get mappings between ChEBI and MESH, which writes to ./resources/text_files/
 
-    # STEP 2: PROCESS ONTOLOGIES
-    print('\nPROCESSING DATA: ONTOLOGY DATA\n')
-    ont = scripts.python.DataSources.OntData(args.onts)
-    # ont = scripts.python.DataSources.OntData('resources/ontology_source_list.txt')
-    ont.parses_resource_file()
-    ont.downloads_data_from_url('imports')
-    ont.generates_source_metadata()
-    ont.writes_source_metadata_locally()
-
-    # STEP 3: PROCESS CLASS EDGES
-    print('\nPROCESSING DATA: CLASS DATA\n')
-    cls = scripts.python.DataSources.Data(args.cls)
-    # cls = scripts.python.DataSources.Data('resources/class_source_list.txt')
-    cls.parses_resource_file()
-    cls.downloads_data_from_url('')
-    cls.generates_source_metadata()
-    cls.writes_source_metadata_locally()
-
-    # STEP 4: PROCESS INSTANCE EDGES
-    print('\nPROCESSING DATA: INSTANCE DATA\n')
-    inst = scripts.python.DataSources.Data(args.inst)
-    # inst = scripts.python.DataSources.Data('resources/instance_source_list.txt')
-    inst.parses_resource_file()
-    inst.downloads_data_from_url('')
-    inst.generates_source_metadata()
-    inst.writes_source_metadata_locally()
+    # STEP 2-4: PROCESS ONTOLOGIES, CLASS EDGES, AND INSTANCE EDGES
+    ontologies = [ont_files + 'hp_with_imports.owl', ont_files + 'go_with_imports.owl', ont_files + 'chebi_lite.owl',
+                  ont_files + 'vo_with_imports.owl']
+    data_file_maps = [edge_files + 'class_data_files.json', edge_files + 'instance_data_files.json',
+                      ont_files + 'ontology_data_files.json']
+
+    stages = [Stage('ontology_data', downloads_data_sources,
+                    (scripts.python.DataSources.OntData, args.onts, 'imports', data_file_maps[2]),
+                    inputs=[args.onts], outputs=[data_file_maps[2]] + ontologies, in_process=True),
+              Stage('class_data', downloads_data_sources,
+                    (scripts.python.DataSources.Data, args.cls, '', data_file_maps[0]),
+                    inputs=[args.cls], outputs=[data_file_maps[0]], in_process=True),
+              Stage('instance_data', downloads_data_sources,
+                    (scripts.python.DataSources.Data, args.inst, '', data_file_maps[1]),
+                    inputs=[args.inst], outputs=[data_file_maps[1]], in_process=True, after=['class_data'])]
 
     #####################
     # CREATE EDGE LISTS #
     #####################
-
-    # STEP 1: create master resource dictionary
-    combined_edges = dict(dict(cls.data_files, **inst.data_files), **ont.data_files)
-    master_edges = scripts.python.EdgeDictionary.EdgeList(combined_edges, './resources/resource_info.txt')
-    master_edges.creates_knowledge_graph_edges()
-
-    # # save nested edges locally
-    with open('./resources/kg_master_edge_dictionary.json', 'w') as filepath:
-        json.dump(master_edges.source_info, filepath)
-
-    # load existing master_edge dictionary
-    # with open('./resources/kg_master_edge_dictionary.json', 'r') as filepath:
-    #     master_edges = json.load(filepath)
+    stages += [Stage('edge_lists', creates_master_edge_dictionary,
+                     (data_file_maps, './resources/resource_info.txt', './resources/kg_master_edge_dictionary.json'),
+                     inputs=data_file_maps + ['./resources/resource_info.txt'],
+                     outputs=['./resources/kg_master_edge_dictionary.json'])]
 
     #########################
     # BUILD KNOWLEDGE GRAPH #
     #########################
+    merged_ontology = merged_onts + 'PheKnowLator_v2_MergedOntologies_BioKG.owl'
+    full_kg = ont_kg + 'PheKnowLator_v2_Full_BioKG.nt'
+    class_map = ont_kg + 'PheKnowLator_v2_Full_BioKG_ClassInstanceMap.json'
+    no_disjoint_kg = ont_kg + 'PheKnowLator_v2_Full_BioKG_NoDisjointness.owl'
+    closed_name = 'Closed_' + args.reasoner.upper()
+    closed_kg = ont_kg + 'PheKnowLator_v2_Full_BioKG_NoDisjointness_' + closed_name + \
+        ('.nt' if args.reasoner == 'incremental' else '.owl')
+
+    # STEP 1: merge ontologies
+    stages += [Stage('merge_ontologies', merges_ontologies, (ontologies, merged_ontology, merged_onts + 'cache/'),
+                     inputs=ontologies, outputs=[merged_ontology]),
+               Stage('ontology_triples', converts_ontology_to_ntriples,
+                     (merged_ontology, merged_ontology[:-4] + '.nt'),
+                     inputs=[merged_ontology], outputs=[merged_ontology[:-4] + '.nt'])]
+
+    # STEP 2: build class-instance, instance-instance, and class-class edges as shards and combine them
+    stages += [Stage('edge_shards', builds_edge_shards,
+                     ('./resources/kg_master_edge_dictionary.json', ont_kg + 'shard_queue/', ont_kg + 'shards/',
+                      ont_kg + 'shards_manifest.json', args.processes),
+                     inputs=['./resources/kg_master_edge_dictionary.json'], outputs=[ont_kg + 'shards_manifest.json']),
+               Stage('knowledge_graph', builds_knowledge_graph,
+                     (merged_ontology[:-4] + '.nt', ont_kg + 'shards_manifest.json', ont_kg + 'shards/', full_kg,
+                      class_map),
+                     inputs=[merged_ontology[:-4] + '.nt', ont_kg + 'shards_manifest.json'],
+                     outputs=[full_kg, class_map])]
 
-    # STEP 1: set-up vars for file manipulation
-    ont_files = './resources/ontologies/'
-    merged_onts = ont_files + 'merged_ontologies/'
-
-    # create list of ontologies to merge
-    ontology_list = [
-        [ont_files + 'go_with_imports.owl', ont_files + 'hp_with_imports.owl', merged_onts + 'hp_go_merged.owl'],
-        [merged_onts + 'hp_go_merged.owl', ont_files + 'chebi_lite.owl', merged_onts + 'hp_go_chebi_merged.owl'],
-        [merged_onts + 'hp_go_chebi_merged.owl', ont_files + 'vo_with_imports.owl', merged_onts +
-         'PheKnowLator_v2_MergedOntologies_BioKG.owl']
-    ]
-
-    # merge ontologies
-    merges_ontologies(ontology_list)
-
-    # STEP 2: make edge lists
-    # set file path
-    ont_kg = './resources/knowledge_graphs/'
-
-    # separate edge lists by data type
-    master_edges = master_edges.source_info.copy()
-    class_edges = {}
-    other_edges = {}
-
-    for edge in master_edges.keys():
-        if master_edges[edge]['data_type'] == 'class-instance' or master_edges[edge]['data_type'] == 'instance-class':
-            class_edges[edge] = master_edges[edge]
+    # STEP 3: remove disjoint axioms
+    stages += [Stage('remove_disjointness', removes_disjointness, (full_kg, no_disjoint_kg, args.backend),
+                     inputs=[full_kg], outputs=[no_disjoint_kg])]
+
+    # STEP 4: deductively close graph (with owltools and ELK, in-process with sparse matrices, or incrementally from
+    # the cached ontology closure and the edge shards)
+    if args.reasoner == 'incremental':
+        stages += [Stage('close_kg', closes_knowledge_graph_from_shards,
+                         (no_disjoint_kg, merged_ontology, ont_kg + 'shards_manifest.json', ont_kg + 'shards/',
+                          closed_kg, ont_kg + 'closure_cache/'),
+                         inputs=[no_disjoint_kg, merged_ontology, ont_kg + 'shards_manifest.json'],
+                         outputs=[closed_kg])]
+    else:
+        stages += [Stage('close_kg', closes_knowledge_graph, (no_disjoint_kg, args.reasoner, closed_kg, args.backend),
+                         inputs=[no_disjoint_kg], outputs=[closed_kg])]
+
+    # STEP 5-6: remove metadata nodes and convert triples to ints, for the closed and the not closed graphs
+    for name, kg, path, label_map in [('closed', closed_kg,
+                                       'kg_closed/PheKnowLator_v2_Full_BioKG_NoDisjointness_' + closed_name,
+                                       'kg_closed/PheKnowLator_v2_Full_BioKG_' + closed_name),
+                                      ('not_closed', no_disjoint_kg,
+                                       'kg_not_closed/PheKnowLator_v2_Full_BioKG_NoDisjointness_NotClosed',
+                                       'kg_not_closed/PheKnowLator_v2_Full_BioKG_NotClosed')]:
+        stripped_kg = ont_kg + path + '_NoMetadataNodes.nt'
+        triple_ints = ont_kg + path + '_Triples_Integers.txt'
+        label_map = ont_kg + label_map + '_Triples_Integer_Labels_Map.json'
+
+        stages += [Stage('metadata_' + name, strips_metadata_nodes, (kg, stripped_kg, class_map),
+                         inputs=[kg, class_map], outputs=[stripped_kg]),
+                   Stage('integers_' + name, encodes_knowledge_graph, (stripped_kg, triple_ints, label_map),
+                         inputs=[stripped_kg], outputs=[triple_ints, triple_ints[:-4] + '.bcsr', label_map])]
+
+        ##############################
+        # KNOWLEDGE GRAPH EMBEDDINGS #
+        ##############################
+        embedding = embed_path + path.split('/')[-1] + '_DeepWalk_Embeddings'
+
+        if args.embedder == 'deepwalk-c':
+            embedding_file = embedding + '_128_100_20_10_100_0.01.txt'
+            stages += [Stage('deepwalk_' + name, runs_deepwalk, (triple_ints[:-4] + '.bcsr', embedding),
+                             {'threads': 100, 'dim': 128, 'nwalks': 100, 'walklen': 20, 'window': 10, 'nprwalks': 100,
+                              'lr': 0.01},
+                             inputs=[triple_ints[:-4] + '.bcsr'], outputs=[embedding_file])]
         else:
-            other_edges[edge] = master_edges[edge]
+            embedding_file = embedding + '_128_100_20_10_0.01.bin'
+            stages += [Stage('deepwalk_' + name, runs_walk_embedding, (triple_ints[:-4] + '.bcsr', embedding),
+                             {'threads': 100, 'dim': 128, 'nwalks': 100, 'walklen': 20, 'window': 10, 'lr': 0.01},
+                             inputs=[triple_ints[:-4] + '.bcsr'], outputs=[embedding_file])]
 
-    # create class-instance edges
-    class_kg = creates_knowledge_graph_edges(class_edges,  'class',
-                                             Graph().parse(merged_onts + 'PheKnowLator_v2_MergedOntologies_BioKG.owl'),
-                                             ont_kg + 'PheKnowLator_v2_ClassInstancesOnly_BioKG2.owl',
-                                             kg_class_iri_map={})
+        # read in embeddings to convert from binary compressed sparse row (BCSR) into numpy array
+        stages += [Stage('embeddings_' + name, processes_embedded_nodes, ([embedding_file], label_map),
+                         inputs=[embedding_file, label_map],
+                         outputs=[embedding_file[:-4] + '_formatted.npy',
+                                  embedding_file[:-4] + '_formatted_Labels.txt'])]
 
-    # create instance-instance and class-class edges
-    class_inst_kg = creates_knowledge_graph_edges(other_edges, 'other', class_kg,
-                                                  ont_kg + 'PheKnowLator_v2_Full_BioKG.owl')
+    return stages
 
-    # STEP 3: remove disjoint axioms
-    removes_disointness_axioms(class_inst_kg, ont_kg + 'PheKnowLator_v2_Full_BioKG_NoDisjointness.owl')
-
-    # STEP 4: deductively close graph
-    closes_knowledge_graph(ont_kg + 'PheKnowLator_v2_Full_BioKG_NoDisjointness.owl',
-                           'elk',
-                           ont_kg + 'PheKnowLator_v2_Full_BioKG_NoDisjointness_Closed_ELK.owl')
-
-    # STEP 5: remove metadata node
-    removes_metadata_nodes(Graph().parse(ont_kg + 'PheKnowLator_v2_Full_BioKG_NoDisjointness_Closed_ELK.owl'),
-                           ont_kg + 'PheKnowLator_v2_Full_BioKG_NoDisjointness_Closed_ELK_NoMetadataNodes.owl',
-                           ont_kg + 'PheKnowLator_v2_ClassInstancesOnly_BioKG_ClassInstanceMap.json')
-
-    # NOT CLOSED
-    removes_metadata_nodes(Graph().parse(ont_kg + 'PheKnowLator_v2_Full_BioKG_NoDisjointness.owl'),
-                           ont_kg + 'PheKnowLator_v2_Full_BioKG_NoDisjointness_NotClosed_NoMetadataNodes.owl',
-                           ont_kg + 'PheKnowLator_v2_ClassInstancesOnly_BioKG_ClassInstanceMap.json')
-
-    # STEP 6: convert triples to ints
-    maps_str_to_int(Graph().parse(ont_kg +
-                                  'kg_closed/PheKnowLator_v2_Full_BioKG_NoDisjointness_Closed_ELK_NoMetadataNodes.owl'),
-                    ont_kg + 'kg_closed/PheKnowLator_v2_Full_BioKG_NoDisjointness_Closed_ELK_Triples_Integers.txt',
-                    ont_kg + 'kg_closed/PheKnowLator_v2_Full_BioKG_Closed_ELK_Triples_Integer_Labels_Map.json')
-
-    maps_str_to_int(Graph().parse(ont_kg +
-                                  'kg_not_closed/PheKnowLator_v2_Full_BioKG_NoDisjointness_NotClosed_NoMetadataNodes'
-                                  '.owl'),
-                    ont_kg + 'kg_not_closed/PheKnowLator_v2_Full_BioKG_NoDisjointness_NotClosed_Triples_Integers.txt',
-                    ont_kg + 'kg_not_closed/PheKnowLator_v2_Full_BioKG_NotClosed_Triples_Integer_Labels_Map.json')
-
-    ##############################
-    # KNOWLEDGE GRAPH EMBEDDINGS #
-    ##############################
-    # set file path
-    embed_path = './resources/embeddings/'
-
-    runs_deepwalk(input_file=ont_kg + 'PheKnowLator_v2_Full_BioKG_NoDisjointness_Closed_ELK_Triples_Integers.txt',
-                  output_file=embed_path + 'PheKnowLator_v2_Full_BioKG_DeepWalk_Embeddings_128_10_50_20.txt',
-                  threads=100,
-                  dim=128,
-                  nwalks=100,
-                  walklen=20,
-                  window=10,
-                  nprwalks=100,
-                  lr=0.01)
-
-    # read in embeddings to convert from binary compressed sparse row (BCSR) into numpy array
-    # not closed graphs
-    processes_embedded_nodes(glob.glob('./resources/embeddings/*_NotClosed_*.out'),
-                             glob.glob('./resources/knowledge_graphs/kg_not_closed/*Triples_Integers.txt')[0],
-                             glob.glob('./resources/knowledge_graphs/kg_not_closed/*.json')[0])
-
-    # closed graphs
-    processes_embedded_nodes(glob.glob('./resources/embeddings/*_Closed_*.out'),
-                             glob.glob('./resources/knowledge_graphs/kg_closed/*Triples_Integers.txt')[0],
-                             glob.glob('./resources/knowledge_graphs/kg_closed/*.json')[0])
+
+def main():
+    parser = argparse.ArgumentParser(description='PheKnowLator: This program builds a biomedical knowledge graph using'
+                                                 'Open Biomedical Ontologies and linked open data. The programs takes'
+                                                 'the following arguments:')
+    parser.add_argument('-o', '--onts', help='name/path to text file containing ontologies', required=True)
+    parser.add_argument('-c', '--cls', help='name/path to text file containing class sources', required=True)
+    parser.add_argument('-i', '--inst', help='name/path to text file containing instance sources', required=True)
+    parser.add_argument('-s', '--stages', help='names of the stages to build (with their dependencies)', nargs='*')
+    parser.add_argument('-j', '--jobs', help='number of stages to run at the same time', type=int, default=2)
+    parser.add_argument('-p', '--processes', help='number of edge shard workers', type=int, default=None)
+    parser.add_argument('-k', '--checkpoints', help='name/path to the checkpoint file',
+                        default='./resources/pipeline_checkpoints.json')
+    parser.add_argument('-b', '--backend', help='store used to hold graphs in memory', default='triplestore',
+                        choices=['triplestore', 'rdflib'])
+    parser.add_argument('-e', '--embedder', help='deepwalk-c binary or in-process walks with gensim Word2Vec',
+                        default='deepwalk-c', choices=['deepwalk-c', 'walks'])
+    parser.add_argument('-R', '--reasoner', help='owltools ELK reasoner, in-process sparse matrix closure, or '
+                                                 'incremental sparse closure reusing cached results',
+                        default='elk', choices=['elk', 'native', 'incremental'])
+    parser.add_argument('-f', '--force', help='rerun stages even if they are up to date', action='store_true')
+    parser.add_argument('-r', '--reports', help='name/path to the directory to write performance reports to',
+                        default='./resources/pipeline_reports/')
+    parser.add_argument('--cprofile', help='also write cProfile statistics for each stage', action='store_true')
+    args = parser.parse_args()
+
+    # run stages that are out of date, resuming after the last stages that succeeded
+    runner = PipelineRunner(builds_pipeline(args), args.checkpoints, args.jobs, args.reports, args.cprofile)
+    runner.runs(args.stages, args.force)
 
 
 if __name__ == '__main__':
     main()
-
-pathways = []
-for edge in list(y):
-    if 'geneid' in str(edge[0]):
-        # print(str(edge[0]), str(edge[1]), str(edge[2]))
-        pathways.append([str(edge[0]), str(edge[1]), str(edge[2])])
-    if 'geneid' in str(edge[2]):
-        pathways.append([str(edge[0]), str(edge[1]), str(edge[2])])
\ No newline at end of file
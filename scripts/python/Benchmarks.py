@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import argparse
+import codecs
+import datetime
+import json
+import numpy as np
+import os
+import platform
+
+from scripts.python.EdgeDictionary import EdgeList
+from scripts.python.GraphEncoding import reads_ntriples
+from scripts.python.KnowledgeGraph import creates_knowledge_graph_edges, maps_str_to_int, removes_metadata_nodes
+from scripts.python.KnowledgeGraphEmbedder import processes_embedded_nodes, runs_walk_embedding, updates_walk_embedding
+from scripts.python.Profiler import Profiler, gets_git_commit
+from scripts.python.SyntheticData import generates_synthetic_data
+from scripts.python.TripleStore import creates_graph
+
+
+def _reads_edge_lines(data, file_split):
+    """Reads the rows of an edge file the same way as EdgeList.processes_edge_data, so filters_data can be timed on
+    its own.
+
+    Args:
+        data (str): A string containing a filepath for a data set.
+        file_split (str): A string containing a character to split a string into rows of data.
+
+    Returns:
+        A list of strings, one per row.
+    """
+
+    if '!' in file_split or '#' in file_split:
+        return codecs.decode(open(data).read().split(file_split)[-1], 'unicode_escape').split('\n')[1:]
+    else:
+        return codecs.decode(open(data).read(), 'unicode_escape').split('\n' if 'n' in file_split else ' ')[1:]
+
+
+def _times(results, name, function, *args):
+    """Runs a function under a Profiler and stores its measurements in results.
+
+    Args:
+        results (dict): A dictionary mapping each benchmark name to its measurements.
+        name (str): A string naming the benchmark.
+        function (function): The function to run.
+        *args: The arguments passed to the function.
+
+    Returns:
+        The value returned by the function.
+    """
+
+    print('\nBenchmarking: {}'.format(name))
+
+    with Profiler(name) as profiler:
+        value = function(*args)
+
+    results[name] = profiler.results
+    print('{name}: {wall:.3f} seconds, {rss:.1f} MB peak'.format(name=name, wall=profiler.results['wall_seconds'],
+                                                                  rss=profiler.results['peak_rss_bytes'] / 1e6))
+
+    return value
+
+
+def runs_benchmarks(work_dir, rows, seed=0, processes=1, backend='rdflib'):
+    """Times the hot paths of the edge list and knowledge graph steps on synthetic data (see
+    SyntheticData.generates_synthetic_data): EdgeList.filters_data, EdgeList.processes_edge_data,
+    EdgeList.maps_identifiers, and EdgeList.creates_knowledge_graph_edges for every source, then
+    KnowledgeGraph.creates_knowledge_graph_edges, removes_metadata_nodes, and maps_str_to_int on the resulting graph.
+
+    Args:
+        work_dir (str): A string naming the directory to write the synthetic data and intermediate files to.
+        rows (int): The number of rows per synthetic edge file.
+        seed (int): The seed of the synthetic data generator.
+        processes (int): The number of processes used by removes_metadata_nodes.
+        backend (str): A string naming the store used to hold the knowledge graph (see TripleStore.creates_graph).
+
+    Returns:
+        A dictionary mapping each benchmark name to its measurements (see Profiler.results).
+    """
+
+    results = {}
+    data_files = _times(results, 'generates_synthetic_data', generates_synthetic_data, work_dir, rows, seed)
+
+    # the edge list and knowledge graph functions use paths relative to the working directory
+    current_dir = os.getcwd()
+    os.chdir(work_dir)
+
+    try:
+        edges = EdgeList(data_files, './resource_info.txt')
+
+        for edge_type, info in sorted(edges.source_info.items()):
+            if 'None' not in info['filter_criteria']:
+                splitter = '\t' if 't' in info['column_splitter'] else ' ' if ' ' in info['column_splitter'] \
+                    else info['column_splitter']
+                _times(results, 'EdgeList.filters_data[{}]'.format(edge_type), edges.filters_data,
+                       _reads_edge_lines(data_files[edge_type], info['row_splitter']), splitter,
+                       info['filter_criteria'])
+
+            clean_data = _times(results, 'EdgeList.processes_edge_data[{}]'.format(edge_type),
+                                edges.processes_edge_data, data_files[edge_type], info['row_splitter'],
+                                info['column_splitter'], info['column_indicies'], info['evidence_criteria'],
+                                info['filter_criteria'], info['source_labels'])
+            results['EdgeList.processes_edge_data[{}]'.format(edge_type)]['items'] = {'edges': len(clean_data)}
+
+            if info['identifier_maps'] != 'None':
+                maps = [i for j in info['identifier_maps'].split(';') for i in j.split(':')]
+                mapped = _times(results, 'EdgeList.maps_identifiers[{}]'.format(edge_type), edges.maps_identifiers,
+                                clean_data, edge_type, maps[0::2], maps[1::2])
+                results['EdgeList.maps_identifiers[{}]'.format(edge_type)]['items'] = {'edges': len(mapped)}
+
+        _times(results, 'EdgeList.creates_knowledge_graph_edges', edges.creates_knowledge_graph_edges)
+
+        # build the knowledge graph from the synthetic ontologies and edge lists
+        class_edges = {k: v for k, v in edges.source_info.items() if v['data_type'] in ('class-instance',
+                                                                                         'instance-class')}
+        other_edges = {k: v for k, v in edges.source_info.items() if k not in class_edges}
+        graph = creates_graph(backend).parse(data_files['disease']).parse(data_files['phenotype'])
+
+        graph = _times(results, 'KnowledgeGraph.creates_knowledge_graph_edges[class]', creates_knowledge_graph_edges,
+                       class_edges, 'class', graph, './BioKG_Classes.owl', {}, True)
+        graph = _times(results, 'KnowledgeGraph.creates_knowledge_graph_edges[other]', creates_knowledge_graph_edges,
+                       other_edges, 'other', graph, './BioKG_Full.owl')
+
+        _times(results, 'KnowledgeGraph.removes_metadata_nodes', removes_metadata_nodes, graph,
+               './BioKG_Full_NoMetadataNodes.nt', './BioKG_Classes_ClassInstanceMap.json', processes)
+        _times(results, 'KnowledgeGraph.maps_str_to_int', maps_str_to_int,
+               reads_ntriples('./BioKG_Full_NoMetadataNodes.nt'), './BioKG_Full_Triples_Integers.txt',
+               './BioKG_Full_Triples_Integer_Labels_Map.json')
+
+    finally:
+        os.chdir(current_dir)
+
+    # throughput of the functions which do not report their own item counts
+    for result in results.values():
+        if result['items'] and not result['throughput']:
+            result['throughput'] = {unit + '_per_second': round(count / result['wall_seconds'], 2)
+                                    for unit, count in result['items'].items() if result['wall_seconds'] > 0}
+
+    return results
+
+
+def _generates_community_edges(num_nodes, degree, rng, first_node=0, num_communities=50):
+    """Generates the edges of a graph with community structure: most edges of a node (98%) stay within its community
+    (the node integer modulo num_communities) and the rest go to random nodes.
+
+    Args:
+        num_nodes (int): The number of nodes to generate edges for.
+        degree (int): The number of edges per node.
+        rng (Generator): The NumPy random generator.
+        first_node (int): The integer of the first node to generate edges for.
+        num_communities (int): The number of communities.
+
+    Returns:
+        A tuple of two NumPy int64 arrays holding the source and target node of each edge.
+    """
+
+    sources = np.repeat(np.arange(first_node, first_node + num_nodes, dtype=np.int64), degree)
+
+    return sources, _draws_community_targets(sources, first_node + num_nodes, rng, num_communities)
+
+
+def _draws_community_targets(sources, num_nodes, rng, num_communities=50):
+    """Draws the target of each edge of a graph with community structure (see _generates_community_edges).
+
+    Args:
+        sources (array): A NumPy int64 array of the source node of each edge.
+        num_nodes (int): The number of nodes targets are drawn from.
+        rng (Generator): The NumPy random generator.
+        num_communities (int): The number of communities.
+
+    Returns:
+        A NumPy int64 array of target nodes.
+    """
+
+    targets = rng.integers(0, num_nodes, len(sources))
+    local = rng.random(len(sources)) < 0.98
+    targets[local] += sources[local] % num_communities - targets[local] % num_communities
+    targets[targets >= num_nodes] -= num_communities
+
+    return targets
+
+
+def _writes_community_build(sources, targets, output_prefix):
+    """Encodes the edges of a synthetic graph as a knowledge graph build (see KnowledgeGraph.maps_str_to_int), with an
+    undirected BCSR graph.
+
+    Args:
+        sources (array): A NumPy integer array of the source node of each edge.
+        targets (array): A NumPy integer array of the target node of each edge.
+        output_prefix (str): A string naming the file path prefix of the build.
+
+    Returns:
+        A NumPy int64 array mapping each node of the synthetic graph to its node integer in the build (-1 for nodes
+        without edges).
+    """
+
+    node = 'https://example.org/node/{:08d}'
+    maps_str_to_int(((node.format(s), 'https://example.org/links', node.format(o))
+                     for s, o in zip(sources.tolist(), targets.tolist()) if s != o),
+                    output_prefix + '.txt', output_prefix + '_Labels_Map.json', undirected=True, edge_list=False)
+
+    with open(output_prefix + '_Labels_Map.json', 'r') as infile:
+        label_map = json.load(infile)
+
+    return np.array([label_map.get(node.format(i), -1) for i in range(int(max(sources.max(), targets.max())) + 1)],
+                    dtype=np.int64)
+
+
+def _scores_link_auc(vectors, sources, targets, rng):
+    """Measures how well an embedding separates the edges of a graph from random node pairs, as the area under the ROC
+    curve of the cosine similarity of the pairs.
+
+    Args:
+        vectors (array): A NumPy float32 array with one row per node.
+        sources (array): A NumPy integer array of the source node of each edge.
+        targets (array): A NumPy integer array of the target node of each edge.
+        rng (Generator): The NumPy random generator used to draw the random pairs.
+
+    Returns:
+        A float between 0 and 1 (0.5 for an embedding that does not separate edges from random pairs).
+    """
+
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    positive = np.sum(unit[sources] * unit[targets], axis=1)
+    negative = np.sort(np.sum(unit[rng.integers(0, len(unit), len(sources))] *
+                              unit[rng.integers(0, len(unit), len(sources))], axis=1))
+
+    return float(np.mean((np.searchsorted(negative, positive, 'left') +
+                          np.searchsorted(negative, positive, 'right')) / 2) / len(negative))
+
+
+def runs_embedding_benchmarks(work_dir, nodes, seed=0, processes=1, changed_fraction=0.01):
+    """Times a full retrain of the walk embedding of a synthetic graph with community structure after a small change
+    against an incremental update of the previous embedding (see KnowledgeGraphEmbedder.updates_walk_embedding), and
+    checks the quality of both with the link AUC (see _scores_link_auc) over all edges and over the added edges.
+
+    Args:
+        work_dir (str): A string naming the directory to write the synthetic builds and embeddings to.
+        nodes (int): The number of nodes of the previous build.
+        seed (int): The seed of the synthetic graph, the walks, and the models.
+        processes (int): The number of processes generating walks and of Word2Vec threads.
+        changed_fraction (float): The number of changed edges relative to the number of nodes.
+
+    Returns:
+        A dictionary mapping each benchmark name to its measurements (see Profiler.results), with the quality of the
+        embeddings under 'quality'.
+    """
+
+    results, rng = {}, np.random.default_rng(seed)
+    os.makedirs(work_dir, exist_ok=True)
+    old_prefix, new_prefix = os.path.join(work_dir, 'Old_Build'), os.path.join(work_dir, 'New_Build')
+    walks = {'nwalks': 10, 'walklen': 20, 'window': 5, 'lr': 0.025}
+
+    # the new build removes some edges, and adds edges between existing nodes and to added nodes
+    sources, targets = _generates_community_edges(nodes, 5, rng)
+    changes = max(1, int(nodes * changed_fraction))
+    kept = np.ones(len(sources), dtype=bool)
+    kept[rng.choice(len(sources), changes // 2, replace=False)] = False
+    node_sources, node_targets = _generates_community_edges(max(1, changes // 10), 5, rng, first_node=nodes)
+    edge_sources = rng.integers(0, nodes, changes // 2)
+    added_sources = np.concatenate((node_sources, edge_sources))
+    added_targets = np.concatenate((node_targets, _draws_community_targets(edge_sources, nodes, rng)))
+    new_sources, new_targets = np.concatenate((sources[kept], added_sources)), np.concatenate((targets[kept],
+                                                                                             added_targets))
+
+    _writes_community_build(sources, targets, old_prefix)
+    rows = _writes_community_build(new_sources, new_targets, new_prefix)
+
+    previous = runs_walk_embedding(old_prefix + '.bcsr', old_prefix, processes, 64, processes=processes, seed=seed,
+                                   **walks)
+    previous = processes_embedded_nodes([previous], old_prefix + '_Labels_Map.json', processes=1)[0]
+
+    full = _times(results, 'KnowledgeGraphEmbedder.runs_walk_embedding[full]', runs_walk_embedding,
+                  new_prefix + '.bcsr', new_prefix, processes, 64, walks['nwalks'], walks['walklen'], walks['window'],
+                  walks['lr'], processes, seed)
+    incremental = _times(results, 'KnowledgeGraphEmbedder.updates_walk_embedding', updates_walk_embedding, previous,
+                         old_prefix, new_prefix, new_prefix, processes, walks['nwalks'], walks['walklen'],
+                         walks['window'], walks['lr'], 1, processes, seed, 1, os.path.join(work_dir, 'kg_diff'))
+
+    quality = {}
+    for name, embedding_file in (('full', full), ('incremental', incremental)):
+        vectors = np.fromfile(embedding_file, dtype=np.float32).reshape(-1, 64)
+        for key, edge_sources, edge_targets in ((name + '_auc', new_sources, new_targets),
+                                                (name + '_added_auc', added_sources, added_targets)):
+            valid = edge_sources != edge_targets
+            quality[key] = _scores_link_auc(vectors, rows[edge_sources[valid]], rows[edge_targets[valid]], rng)
+
+    results['KnowledgeGraphEmbedder.updates_walk_embedding']['quality'] = quality
+    print('\nLink AUC, full retrain: {full_auc:.3f} (added edges {full_added_auc:.3f}), incremental update: '
+          '{incremental_auc:.3f} (added edges {incremental_added_auc:.3f})'.format(**quality))
+
+    return results
+
+
+def stores_benchmark_results(results, results_file, rows, seed, commit=None, backend='rdflib'):
+    """Appends the results of a benchmark run to a json file holding every run, keyed by git commit, so runs can be
+    compared across commits (see compares_benchmark_runs).
+
+    Args:
+        results (dict): A dictionary mapping each benchmark name to its measurements.
+        results_file (str): A string naming the json file storing the runs.
+        rows (int): The number of rows per synthetic edge file.
+        seed (int): The seed of the synthetic data generator.
+        commit (str): A string containing the git commit that was benchmarked (defaults to the current commit).
+        backend (str): A string naming the store used to hold the knowledge graph.
+
+    Returns:
+        A dictionary containing the stored run.
+    """
+
+    runs = {}
+    if os.path.exists(results_file):
+        with open(results_file, 'r') as infile:
+            runs = json.load(infile)
+
+    run = {'created': datetime.datetime.now().isoformat(timespec='seconds'),
+           'host': platform.node(),
+           'python': platform.python_version(),
+           'cpus': os.cpu_count(),
+           'rows': rows,
+           'seed': seed,
+           'backend': backend,
+           'results': results}
+    runs.setdefault(commit or gets_git_commit() or 'unknown', []).append(run)
+
+    os.makedirs(os.path.dirname(os.path.abspath(results_file)), exist_ok=True)
+    with open(results_file, 'w') as outfile:
+        json.dump(runs, outfile, indent=2)
+
+    return run
+
+
+def compares_benchmark_runs(results_file, base_commit, new_commit, rows=None):
+    """Prints the wall time and peak memory of each benchmark for two commits, using the latest run of each commit
+    (optionally restricted to a number of rows).
+
+    Args:
+        results_file (str): A string naming the json file storing the runs.
+        base_commit (str): A string containing the git commit (or a prefix of it) to compare against.
+        new_commit (str): A string containing the git commit (or a prefix of it) to compare.
+        rows (int): An optional number of rows per synthetic edge file to restrict the comparison to.
+
+    Returns:
+        A dictionary mapping each benchmark name to the ratio of the new and the base wall time.
+
+    Raises:
+        An exception is raised if either commit has no matching run.
+    """
+
+    with open(results_file, 'r') as infile:
+        runs = json.load(infile)
+
+    latest = []
+    for commit in (base_commit, new_commit):
+        matches = [run for key, commit_runs in runs.items() if key.startswith(commit) for run in commit_runs
+                   if rows is None or run['rows'] == rows]
+        if not matches:
+            raise Exception('ERROR: No benchmark run for commit {}'.format(commit))
+        latest.append(max(matches, key=lambda x: x['created'])['results'])
+
+    print('\n{:<60}{:>12}{:>12}{:>9}{:>12}{:>12}'.format('Benchmark', 'Base (s)', 'New (s)', 'Ratio', 'Base (MB)',
+                                                       'New (MB)'))
+
+    ratios = {}
+    for name in sorted(set(latest[0]) & set(latest[1])):
+        base, new = latest[0][name], latest[1][name]
+        ratios[name] = new['wall_seconds'] / base['wall_seconds'] if base['wall_seconds'] > 0 else None
+        print('{:<60}{:>12.3f}{:>12.3f}{:>9}{:>12.1f}{:>12.1f}'.format(name, base['wall_seconds'], new['wall_seconds'],
+                                                                      '{:.2f}'.format(ratios[name])
+                                                                      if ratios[name] is not None else '-',
+                                                                      base['peak_rss_bytes'] / 1e6,
+                                                                      new['peak_rss_bytes'] / 1e6))
+
+    return ratios
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmarks the edge list and knowledge graph steps on synthetic '
+                                                 'data.')
+    parser.add_argument('-w', '--work', help='name/path to the directory for synthetic data',
+                        default='./resources/benchmarks/work/')
+    parser.add_argument('-r', '--rows', help='number of rows per edge file (e.g. 10000 to 50000000)', type=int,
+                        nargs='+')
+    parser.add_argument('-s', '--seed', help='seed of the synthetic data generator', type=int, default=0)
+    parser.add_argument('-p', '--processes', help='number of processes for removes_metadata_nodes', type=int,
+                        default=1)
+    parser.add_argument('-b', '--backend', help='store used to hold the knowledge graph', default='rdflib',
+                        choices=['rdflib', 'triplestore'])
+    parser.add_argument('-o', '--out', help='name/path to the json file storing the results',
+                        default='./resources/benchmarks/benchmark_results.json')
+    parser.add_argument('-c', '--compare', help='compare two commits instead of running', nargs=2)
+    parser.add_argument('-e', '--embeddings', help='also benchmark full and incremental embeddings (with the number of '
+                                                   'rows as the number of nodes)', action='store_true')
+    args = parser.parse_args()
+
+    if args.compare:
+        compares_benchmark_runs(args.out, args.compare[0], args.compare[1], args.rows[0] if args.rows else None)
+        return None
+
+    commit = gets_git_commit()
+    for rows in args.rows or [10000]:
+        results = runs_benchmarks(os.path.join(args.work, str(rows)), rows, args.seed, args.processes, args.backend)
+        if args.embeddings:
+            results.update(runs_embedding_benchmarks(os.path.join(args.work, str(rows), 'embeddings'), rows, args.seed,
+                                                     args.processes))
+        stores_benchmark_results(results, args.out, rows, args.seed, commit, args.backend)
+
+    return None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import hashlib
+
+
+def hashes_file(filepath, block_size=1048576):
+    """Computes the SHA-256 digest of the contents of a file, reading it in blocks.
+
+    Args:
+        filepath (str): A string naming a file path.
+        block_size (int): The number of bytes read at a time.
+
+    Returns:
+        A string containing the hexadecimal digest.
+    """
+
+    digest = hashlib.sha256()
+
+    with open(filepath, 'rb') as data:
+        for block in iter(lambda: data.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def hashes_strings(*values):
+    """Computes the SHA-256 digest of a sequence of strings (e.g. other digests and parameters).
+
+    Args:
+        *values (str): The strings to hash, in order.
+
+    Returns:
+        A string containing the hexadecimal digest.
+    """
+
+    digest = hashlib.sha256()
+
+    for value in values:
+        digest.update(str(value).encode('utf-8'))
+        digest.update(b'\0')
+
+    return digest.hexdigest()
@@ -16,6 +16,8 @@ from contextlib import closing
 from owlready2 import subprocess
 from tqdm import tqdm
 
+from scripts.python.Profiler import runs_profiled_command
+
 
 class DataSource(object):
     """The class takes an input string that contains the file path/name of a text file listing different data sources.
@@ -248,7 +250,7 @@ class OntData(DataSource):
 
             if download_type == 'imports' and 'purl' in source:
                 try:
-                    subprocess.check_call(['./resources/lib/owltools',
+                    runs_profiled_command(['./resources/lib/owltools',
                                            str(source),
                                            '--merge-import-closure',
                                            '-o',
@@ -262,7 +264,7 @@ class OntData(DataSource):
 
             elif download_type != 'imports' and 'purl' in source:
                 try:
-                    subprocess.check_call(['./resources/lib/owltools',
+                    runs_profiled_command(['./resources/lib/owltools',
                                            str(source),
                                            '-o',
                                            './resources/ontologies/'
@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import argparse
+import json
+import numpy as np
+import os
+import time
+
+from array import array
+from rdflib import Graph
+from scipy import sparse
+from tqdm import tqdm
+
+from scripts.python.Checksums import hashes_file, hashes_strings
+from scripts.python.GraphEncoding import reads_ntriples
+from scripts.python.RDFXMLReader import reads_rdfxml
+
+
+# iris of the axioms covered by the sparse closure
+rdf_type = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+subclass_of = 'http://www.w3.org/2000/01/rdf-schema#subClassOf'
+equivalent_class = 'http://www.w3.org/2002/07/owl#equivalentClass'
+
+# version of the cached closures, changed whenever the format or the computation of the cache changes (2: boolean
+# closure matrices) so that closures cached by earlier versions are not reused
+closure_cache_version = '2'
+
+# terms which are not named classes or instances (e.g. owl:Class, owl:Thing, blank nodes)
+named_prefixes = ('http://', 'https://')
+vocabulary_prefixes = ('http://www.w3.org/1999/02/22-rdf-syntax-ns#', 'http://www.w3.org/2000/01/rdf-schema#',
+                       'http://www.w3.org/2002/07/owl#')
+
+
+def _is_named(term):
+    """Checks whether a term is a named class or instance, i.e. an iri outside of the RDF, RDFS, and OWL vocabularies.
+
+    Args:
+        term (str): A string containing a term.
+
+    Returns:
+        True if the term is a named class or instance, otherwise False.
+    """
+
+    return term.startswith(named_prefixes) and not term.startswith(vocabulary_prefixes)
+
+
+def extracts_closure_axioms(triples):
+    """Streams a set of triples and encodes the axioms covered by the sparse closure as sparse matrices. Named
+    rdfs:subClassOf axioms (and owl:equivalentClass axioms, as subclass axioms in both directions) become a class by
+    class adjacency matrix and rdf:type assertions become an instance by class matrix. Axioms on anonymous classes
+    (e.g. existential restrictions) are not covered.
+
+    Args:
+        triples (iterable): An RDFLib graph or any iterable of triples.
+
+    Returns:
+        A tuple of four items: a list of class iris, a list of instance iris, a scipy CSR matrix of asserted subclass
+        axioms (row class is a subclass of column class), and a scipy CSR matrix of asserted types (row instance has
+        the column class as type).
+    """
+
+    classes, instances = {}, {}
+    sub_rows, sub_cols, type_rows, type_cols = array('i'), array('i'), array('i'), array('i')
+
+    for edge in tqdm(triples):
+        subj, pred, obj = str(edge[0]), str(edge[1]), str(edge[2])
+
+        if (pred == subclass_of or pred == equivalent_class) and _is_named(subj) and _is_named(obj):
+            subj_id, obj_id = classes.setdefault(subj, len(classes)), classes.setdefault(obj, len(classes))
+            sub_rows.append(subj_id)
+            sub_cols.append(obj_id)
+
+            if pred == equivalent_class:
+                sub_rows.append(obj_id)
+                sub_cols.append(subj_id)
+
+        elif pred == rdf_type and _is_named(subj) and _is_named(obj):
+            type_rows.append(instances.setdefault(subj, len(instances)))
+            type_cols.append(classes.setdefault(obj, len(classes)))
+
+    subclasses = _builds_boolean_matrix(sub_rows, sub_cols, (len(classes), len(classes)))
+    types = _builds_boolean_matrix(type_rows, type_cols, (len(instances), len(classes)))
+
+    return list(classes), list(instances), subclasses, types
+
+
+def _builds_boolean_matrix(rows, cols, shape):
+    """Builds a de-duplicated boolean sparse matrix from row and column indices. The matrices are boolean rather than
+    integer, so the products of the closure add up paths with a logical or and can not overflow however many paths
+    connect two nodes.
+
+    Args:
+        rows (array): An integer array of row indices.
+        cols (array): An integer array of column indices.
+        shape (tuple): The shape of the matrix.
+
+    Returns:
+        A scipy CSR matrix with boolean values.
+    """
+
+    return sparse.csr_matrix((np.ones(len(rows), dtype=bool), (np.frombuffer(rows, dtype=np.int32),
+                                                               np.frombuffer(cols, dtype=np.int32))), shape=shape)
+
+
+def computes_transitive_closure(adjacency):
+    """Computes the transitive closure of a sparse adjacency matrix by repeated squaring: every product doubles the
+    length of the paths covered, so a hierarchy of depth d needs about log2(d) batched sparse products.
+
+    Args:
+        adjacency (matrix): A scipy sparse 0/1 matrix.
+
+    Returns:
+        A scipy CSR boolean matrix, where an entry is set if the column can be reached from the row.
+    """
+
+    closure = (adjacency > 0).tocsr()
+
+    while True:
+        updated = closure + closure.dot(closure)
+
+        # the closure only grows, so an unchanged number of entries means a fixed point was reached
+        if updated.nnz == closure.nnz:
+            return updated
+
+        closure = updated
+
+
+def _computes_entailments(subclasses, types):
+    """Computes the subclass and type entailments of a set of asserted axioms.
+
+    Args:
+        subclasses (matrix): A scipy CSR boolean matrix of asserted subclass axioms.
+        types (matrix): A scipy CSR boolean matrix of asserted types.
+
+    Returns:
+        A tuple of two scipy CSR boolean matrices: all entailed (strict) subclass axioms and all entailed types.
+    """
+
+    # drop the reflexive entries created by cycles (e.g. equivalent classes)
+    closure = computes_transitive_closure(subclasses).tocoo()
+    strict = closure.row != closure.col
+    closure = sparse.csr_matrix((closure.data[strict], (closure.row[strict], closure.col[strict])), shape=closure.shape)
+
+    entailed_types = types + types.dot(closure)
+
+    return closure, entailed_types
+
+
+def _emits_triples(matrix, row_labels, predicate, col_labels):
+    """Converts the entries of a sparse matrix into triples.
+
+    Args:
+        matrix (matrix): A scipy sparse matrix.
+        row_labels (list): A list of the iris of the rows.
+        predicate (str): A string containing the predicate iri.
+        col_labels (list): A list of the iris of the columns.
+
+    Returns:
+        A generator of tuples, where each tuple contains the string subject, predicate, and object of a triple.
+    """
+
+    matrix = matrix.tocoo()
+
+    for row, col in zip(matrix.row.tolist(), matrix.col.tolist()):
+        yield row_labels[row], predicate, col_labels[col]
+
+
+def infers_closure_triples(triples):
+    """Deductively closes the subclass hierarchy and the type assertions of a set of triples (see
+    extracts_closure_axioms) and returns only the new triples: subclass axioms entailed by transitivity and types
+    inherited by instances from the superclasses of their asserted types.
+
+    Args:
+        triples (iterable): An RDFLib graph or any iterable of triples.
+
+    Returns:
+        A list of tuples, where each tuple contains the string subject, predicate, and object of an inferred triple.
+    """
+
+    classes, instances, subclasses, types = extracts_closure_axioms(triples)
+    closure, entailed_types = _computes_entailments(subclasses, types)
+
+    # keep only the entries which were not asserted
+    new_subclasses = closure - closure.multiply(subclasses)
+    new_types = entailed_types - entailed_types.multiply(types)
+    new_subclasses.eliminate_zeros()
+    new_types.eliminate_zeros()
+
+    return (list(_emits_triples(new_subclasses, classes, subclass_of, classes)) +
+            list(_emits_triples(new_types, instances, rdf_type, classes)))
+
+
+def closes_ontology(ontology, cache_dir):
+    """Computes the subclass closure of an ontology (the TBox) and caches it under a hash of the ontology file and of
+    closure_cache_version, so it is only recomputed when the ontology or the closure code changes. The cache holds the
+    class iris (json), the strict closure matrix (scipy npz), and the inferred subclass triples (N-Triples).
+
+    Args:
+        ontology (str): A string naming the file path of an ontology.
+        cache_dir (str): A string naming the directory that stores the cached closures.
+
+    Returns:
+        A tuple of three items: the hash of the ontology, a dictionary mapping class iris to closure matrix indices,
+        and a scipy CSR matrix of all entailed (strict) subclass axioms.
+    """
+
+    key = hashes_strings(closure_cache_version, hashes_file(ontology))
+    cache_prefix = os.path.join(cache_dir, key)
+
+    if not os.path.exists(cache_prefix + '_Inferred.nt'):
+        print('Closing Ontology: {ont}'.format(ont=ontology.split('/')[-1]))
+
+        classes, instances, subclasses, types = extracts_closure_axioms(reads_rdfxml(ontology))
+        closure, _ = _computes_entailments(subclasses, types)
+        new_subclasses = closure - closure.multiply(subclasses)
+        new_subclasses.eliminate_zeros()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_prefix + '_Classes.json', 'w') as outfile:
+            json.dump(classes, outfile)
+        sparse.save_npz(cache_prefix + '_Closure.npz', closure)
+
+        # the inferred triples are written last, marking the cache entry as complete
+        with open(cache_prefix + '_Inferred.nt.tmp', 'w') as outfile:
+            outfile.writelines('<{}> <{}> <{}> .\n'.format(*edge) for edge in _emits_triples(new_subclasses, classes,
+                                                                                            subclass_of, classes))
+        os.replace(cache_prefix + '_Inferred.nt.tmp', cache_prefix + '_Inferred.nt')
+
+    else:
+        print('Using Cached Ontology Closure: {ont}'.format(ont=ontology.split('/')[-1]))
+
+    with open(cache_prefix + '_Classes.json', 'r') as infile:
+        classes = json.load(infile)
+
+    closure = sparse.load_npz(cache_prefix + '_Closure.npz').tocsr().astype(bool)
+
+    return key, {cls: i for i, cls in enumerate(classes)}, closure
+
+
+def infers_edge_closure(triples, class_index, closure):
+    """Computes the inferences that a set of data edges produces against a closed ontology: the types inherited by
+    instances from the superclasses of their asserted types, and the superclasses of new classes declared as subclasses
+    of ontology classes. The edges may only add instances and leaf classes below the ontology classes (which is the case
+    for all of the edges built from the resource files), so the inferences of independent sets of edges can be computed
+    separately and merged.
+
+    Args:
+        triples (iterable): An RDFLib graph or any iterable of triples.
+        class_index (dict): A dictionary mapping ontology class iris to closure matrix indices.
+        closure (matrix): A scipy CSR matrix of all entailed (strict) subclass axioms of the ontology.
+
+    Returns:
+        A list of tuples, where each tuple contains the string subject, predicate, and object of an inferred triple.
+    """
+
+    classes = list(class_index)
+    asserted = {rdf_type: ({}, array('i'), array('i')), subclass_of: ({}, array('i'), array('i'))}
+
+    for edge in triples:
+        subj, pred, obj = str(edge[0]), str(edge[1]), str(edge[2])
+
+        if pred in asserted and obj in class_index and _is_named(subj):
+            nodes, rows, cols = asserted[pred]
+            rows.append(nodes.setdefault(subj, len(nodes)))
+            cols.append(class_index[obj])
+
+    inferred = []
+    for predicate, (nodes, rows, cols) in asserted.items():
+        asserted_matrix = _builds_boolean_matrix(rows, cols, (len(nodes), len(classes)))
+        entailed = asserted_matrix.dot(closure.astype(bool))
+        entailed = entailed - entailed.multiply(asserted_matrix)
+        entailed.eliminate_zeros()
+
+        inferred += list(_emits_triples(entailed, list(nodes), predicate, classes))
+
+    return inferred
+
+
+def closes_knowledge_graph_incrementally(ontology, edge_files, output, cache_dir):
+    """Deductively closes a knowledge graph built from an ontology and independent files of data edges (e.g. one
+    N-Triples file per edge type), reusing the reasoning of previous builds. The ontology closure is cached under a hash
+    of the ontology (see closes_ontology) and the inferences of each edge file are cached under a hash of the ontology
+    and of the edge file (see infers_edge_closure). When only some edge types change, only their inferences are
+    computed, so the cost of a refresh follows the size of the changed edges rather than of the whole graph.
+
+    The inferred triples of the ontology and of all edge files are written to output as N-Triples, to be merged with
+    the asserted triples. A triple inferred from several edge files (e.g. the types of a node found in more than one
+    file) is only written once.
+
+    Args:
+        ontology (str): A string naming the file path of the merged ontology.
+        edge_files (list): A list of strings naming N-Triples files of data edges.
+        output (str): A string naming the file path to write the inferred triples to.
+        cache_dir (str): A string naming the directory that stores the cached closures and inferences.
+
+    Returns:
+        None.
+    """
+
+    print('\n\n' + '=' * len('Incrementally Closing Knowledge Graph'))
+    print('Incrementally Closing Knowledge Graph')
+    print('=' * len('Incrementally Closing Knowledge Graph') + '\n')
+
+    ontology_key, class_index, closure = closes_ontology(ontology, cache_dir)
+    inferred_files = [os.path.join(cache_dir, ontology_key + '_Inferred.nt')]
+    changed = 0
+
+    for edge_file in tqdm(sorted(edge_files)):
+        inferred_file = os.path.join(cache_dir, hashes_strings(ontology_key, hashes_file(edge_file)) + '_Inferred.nt')
+
+        if not os.path.exists(inferred_file):
+            inferred = infers_edge_closure(reads_ntriples(edge_file), class_index, closure)
+
+            with open(inferred_file + '.tmp', 'w') as outfile:
+                outfile.writelines('<{}> <{}> <{}> .\n'.format(*edge) for edge in inferred)
+            os.replace(inferred_file + '.tmp', inferred_file)
+            changed += 1
+
+        inferred_files.append(inferred_file)
+
+    written = set()
+    with open(output, 'w') as outfile:
+        for inferred_file in inferred_files:
+            with open(inferred_file, 'r') as infile:
+                for line in infile:
+                    if line not in written:
+                        written.add(line)
+                        outfile.write(line)
+    edge_count = len(written)
+
+    print('\nInferred {edge} edges ({n} edge files changed)\n'.format(edge=edge_count, n=changed))
+
+    return None
+
+
+def _entailment_set(triples):
+    """Computes the set of all subclass and type triples entailed by a set of triples.
+
+    Args:
+        triples (iterable): An RDFLib graph or any iterable of triples.
+
+    Returns:
+        A set of tuples, where each tuple contains the string subject, predicate, and object of an entailed triple.
+    """
+
+    classes, instances, subclasses, types = extracts_closure_axioms(triples)
+    closure, entailed_types = _computes_entailments(subclasses, types)
+
+    return set(_emits_triples(closure, classes, subclass_of, classes)) | set(_emits_triples(entailed_types, instances,
+                                                                                            rdf_type, classes))
+
+
+def compares_closures(asserted_graph, reasoner_graph, output=None, examples=25):
+    """Compares the sparse closure of an asserted graph against the output of a reasoner (e.g. the owltools ELK
+    closure). Because reasoners differ in which redundant axioms they assert, both graphs are compared on everything
+    they entail for the covered axioms: the sparse closure of the asserted graph and the sparse closure of the reasoner
+    output. Triples only entailed by the reasoner output come from axioms outside of the covered subset (e.g.
+    existential restrictions) and triples only entailed by the sparse closure point to an unsound inference.
+
+    Args:
+        asserted_graph (iterable): An RDFLib graph or any iterable of triples for the graph before closure.
+        reasoner_graph (iterable): An RDFLib graph or any iterable of triples for the graph closed by the reasoner.
+        output (str): An optional string naming a file path to write the json report to.
+        examples (int): The number of example triples to include in the report for each difference.
+
+    Returns:
+        A dictionary containing the comparison report.
+    """
+
+    print('\n\n' + '=' * len('Comparing Sparse Closure to Reasoner Output'))
+    print('Comparing Sparse Closure to Reasoner Output')
+    print('=' * len('Comparing Sparse Closure to Reasoner Output') + '\n')
+
+    start = time.time()
+    native = _entailment_set(asserted_graph)
+    native_seconds = time.time() - start
+    reasoner = _entailment_set(reasoner_graph)
+
+    report = {'native_seconds': native_seconds,
+              'shared': len(native & reasoner),
+              'native_only': len(native - reasoner),
+              'reasoner_only': len(reasoner - native),
+              'native_only_examples': sorted(native - reasoner)[:examples],
+              'reasoner_only_examples': sorted(reasoner - native)[:examples]}
+
+    print('Shared: {shared}; Sparse Closure Only: {native}; Reasoner Only: {reasoner}\n'.format(
+        shared=report['shared'], native=report['native_only'], reasoner=report['reasoner_only']))
+
+    if output is not None:
+        with open(output, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+
+    return report
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Compares the sparse deductive closure of a knowledge graph against '
+                                                 'the output of a reasoner.')
+    parser.add_argument('-g', '--graph', help='name/path to the knowledge graph before closure', required=True)
+    parser.add_argument('-r', '--reasoner', help='name/path to the knowledge graph closed by a reasoner', required=True)
+    parser.add_argument('-o', '--out', help='name/path to write the json comparison report to', required=False)
+    args = parser.parse_args()
+
+    compares_closures(Graph().parse(args.graph), Graph().parse(args.reasoner), args.out)
+
+
+if __name__ == '__main__':
+    main()
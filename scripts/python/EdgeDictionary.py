@@ -9,11 +9,19 @@ import re
 import urllib
 
 from copy import deepcopy
-from rdflib import Graph
+from rdflib import URIRef
+from rdflib.namespace import OWL, RDF
 from tqdm import tqdm
 from urllib.parse import urlencode
 from urllib.request import urlopen
 
+from scripts.python.Profiler import records_items
+from scripts.python.RDFXMLReader import reads_rdfxml
+
+
+# iri of the database cross-reference annotation
+has_dbxref = URIRef('http://www.geneontology.org/formats/oboInOwl#hasDbXref')
+
 
 # TODO: currently using eval() to handle filtering of downloaded data, should consider replacing this in a future
 #  release.
@@ -188,9 +196,9 @@ class EdgeList(object):
 
     @staticmethod
     def queries_ontologies(data_file):
-        """Takes a string representing a path/file name to an ontology. The function uses the RDFLib library
-        and creates a graph. The graph is then queried to return all classes and their database cross-references. The
-        function returns a list of query results
+        """Takes a string representing a path/file name to an ontology. The function streams the triples of the
+        ontology (see RDFXMLReader.reads_rdfxml) to find all classes and their database cross-references, without
+        loading the ontology into a graph. The function returns a dictionary of the cross-references.
 
         Args:
             data_file (str): A filepath pointing to an ontology saved in an '.owl' file.
@@ -203,23 +211,21 @@ class EdgeList(object):
             ontology graph.
          """
 
-        # read in ontology as graph
-        graph = Graph()
-        graph.parse(data_file)
+        # stream ontology triples to get all classes and cross-referenced sources
+        classes, xrefs = set(), set()
 
-        # query graph to get all cross-referenced sources
-        results = graph.query(
-            """SELECT DISTINCT ?source ?c
-               WHERE {
-                  ?c rdf:type owl:Class .
-                  ?c oboInOwl:hasDbXref ?source .}
-               """, initNs={"rdf": 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
-                            "owl": 'http://www.w3.org/2002/07/owl#',
-                            "oboInOwl": 'http://www.geneontology.org/formats/oboInOwl#'})
+        for subj, pred, obj in reads_rdfxml(data_file):
+            if pred == RDF.type and obj == OWL.Class:
+                classes.add(subj)
+            elif pred == has_dbxref:
+                xrefs.add((obj, subj))
 
         # convert results to dictionary
         ont_results = {}
-        for res in list(results):
+        for res in xrefs:
+            if res[1] not in classes:
+                continue
+
             if str(res[0]).split(':')[-1] in ont_results.keys():
                 ont_results[str(res[0]).split(':')[-1]].append(str(res[1]))
 
@@ -439,6 +445,7 @@ class EdgeList(object):
             n0 = len(set([x[0] for x in self.source_info[edge_type]['edge_list']]))
             n1 = len(set([x[1] for x in self.source_info[edge_type]['edge_list']]))
             link = len(self.source_info[edge_type]['edge_list'])
+            records_items(link, 'edges')
             print('\n\n' + '=' * 75)
             print('Processed Edge: {0} (nodes:{1}; edge:{2}; nodes:{3})'.format(edge_type, n0, link, n1))
             print('=' * 75 + '\n')
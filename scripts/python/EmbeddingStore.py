@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import argparse
+import bisect
+import numpy as np
+import os
+
+
+class EmbeddingStore(object):
+    """Class provides fast access to the node embeddings written by KnowledgeGraphEmbedder.processes_embedded_nodes (a
+    float32 NumPy array and a file with the label of each row). The array is memory-mapped, the row norms are computed
+    once and cached next to it, and rows are looked up by label with a binary search over the labels, which are sorted
+    when they come from maps_str_to_int (so every namespace, e.g. 'http://purl.obolibrary.org/obo/CHEBI_', is a
+    contiguous range of rows). Unsorted labels fall back to a dictionary.
+
+    Nearest neighbors are found by cosine similarity, either exactly, with blocked matrix products over the (namespace
+    restricted) rows, or approximately, with an inverted file (IVF) index that clusters the rows with spherical
+    k-means and only scores the rows of the clusters closest to each query (see builds_index).
+
+    Args:
+        embedding_file (str): A string naming the NumPy embedding file.
+        labels_file (str): A string naming the label file (defaults to the embedding file with '_Labels.txt' in place
+            of '.npy').
+        mmap_mode (str): The NumPy memory-map mode used to open the embeddings (None reads them into memory).
+
+    Raises:
+        An exception is raised if the number of labels does not match the number of embeddings.
+    """
+
+    def __init__(self, embedding_file, labels_file=None, mmap_mode='r'):
+
+        self.embedding_file = embedding_file
+        self.embeddings = np.load(embedding_file, mmap_mode=mmap_mode)
+        labels_file = labels_file or embedding_file.rsplit('.', 1)[0] + '_Labels.txt'
+
+        with open(labels_file, 'r') as infile:
+            self.labels = infile.read().split('\n')[:len(self.embeddings) + 1]
+        if self.labels and self.labels[-1] == '':
+            self.labels.pop()
+
+        if len(self.labels) != len(self.embeddings):
+            raise Exception('ERROR: {} has {} labels for {} embeddings'.format(labels_file, len(self.labels),
+                                                                             len(self.embeddings)))
+
+        self.is_sorted = all(self.labels[i] < self.labels[i + 1] for i in range(len(self.labels) - 1))
+        self.label_rows = None if self.is_sorted else {label: row for row, label in enumerate(self.labels)}
+        self.norms = self._reads_norms()
+        self.index = None
+
+    def __len__(self):
+
+        return len(self.embeddings)
+
+    def _reads_norms(self, block_size=100000):
+        """Loads the norm of every row, computing them block by block and caching them the first time.
+
+        Args:
+            block_size (int): The number of rows processed at a time.
+
+        Returns:
+            A NumPy float32 array of norms.
+        """
+
+        norm_file = self.embedding_file.rsplit('.', 1)[0] + '_Norms.npy'
+
+        if os.path.exists(norm_file) and os.path.getmtime(norm_file) >= os.path.getmtime(self.embedding_file):
+            return np.load(norm_file)
+
+        norms = np.empty(len(self.embeddings), dtype=np.float32)
+        for start in range(0, len(self.embeddings), block_size):
+            norms[start:start + block_size] = np.linalg.norm(self.embeddings[start:start + block_size], axis=1)
+
+        np.save(norm_file, norms)
+
+        return norms
+
+    def rows(self, labels):
+        """Gets the rows of a list of labels.
+
+        Args:
+            labels (list): A list of node labels (or a single one).
+
+        Returns:
+            A NumPy int64 array of rows.
+
+        Raises:
+            A KeyError is raised if a label has no embedding.
+        """
+
+        labels = [labels] if isinstance(labels, str) else labels
+        rows = []
+
+        for label in labels:
+            if self.is_sorted:
+                row = bisect.bisect_left(self.labels, label)
+                if row == len(self.labels) or self.labels[row] != label:
+                    raise KeyError(label)
+            else:
+                row = self.label_rows[label]
+
+            rows.append(row)
+
+        return np.array(rows, dtype=np.int64)
+
+    def namespace_rows(self, prefix):
+        """Gets the rows whose label starts with a prefix.
+
+        Args:
+            prefix (str): A string containing a label prefix (e.g. 'http://purl.obolibrary.org/obo/HP_').
+
+        Returns:
+            A NumPy int64 array of rows.
+        """
+
+        if self.is_sorted and not prefix:
+            return np.arange(len(self.labels), dtype=np.int64)
+
+        # the labels starting with a prefix sort between the prefix and the prefix with its last character incremented
+        if self.is_sorted and ord(prefix[-1]) < 0x10FFFF:
+            start = bisect.bisect_left(self.labels, prefix)
+            end = bisect.bisect_left(self.labels, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+
+            return np.arange(start, end, dtype=np.int64)
+
+        return np.array([row for row, label in enumerate(self.labels) if label.startswith(prefix)], dtype=np.int64)
+
+    def vectors(self, labels):
+        """Gets the embeddings of a list of labels.
+
+        Args:
+            labels (list): A list of node labels (or a single one).
+
+        Returns:
+            A NumPy float32 array with one row per label.
+        """
+
+        return np.asarray(self.embeddings[self.rows(labels)], dtype=np.float32)
+
+    def _normalizes_queries(self, queries):
+        """Converts queries (labels or vectors) to unit vectors.
+
+        Args:
+            queries (list): A list of node labels, or a NumPy array of vectors (one per row).
+
+        Returns:
+            A tuple of a NumPy float32 array of unit vectors and the rows of the queries (None for vectors).
+        """
+
+        if isinstance(queries, str) or (len(queries) and isinstance(queries[0], str)):
+            rows = self.rows(queries)
+            vectors = np.asarray(self.embeddings[rows], dtype=np.float32)
+        else:
+            rows, vectors = None, np.atleast_2d(np.asarray(queries, dtype=np.float32))
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        return vectors / np.where(norms > 0, norms, 1), rows
+
+    @staticmethod
+    def _keeps_top_k(best_rows, best_scores, rows, scores, k):
+        """Merges a block of scores into the running top k of each query.
+
+        Args:
+            best_rows (array): A NumPy int64 array (queries x k) of the best rows so far.
+            best_scores (array): A NumPy float32 array (queries x k) of the best scores so far.
+            rows (array): A NumPy int64 array of the rows of the block.
+            scores (array): A NumPy float32 array (queries x rows) of the scores of the block.
+            k (int): The number of neighbors to keep.
+
+        Returns:
+            A tuple of the updated best rows and best scores.
+        """
+
+        all_rows = np.concatenate((best_rows, np.broadcast_to(rows, scores.shape)), axis=1)
+        all_scores = np.concatenate((best_scores, scores), axis=1)
+        keep = np.argpartition(-all_scores, k - 1, axis=1)[:, :k] if all_scores.shape[1] > k else \
+            np.broadcast_to(np.arange(all_scores.shape[1]), all_scores.shape)
+
+        return np.take_along_axis(all_rows, keep, axis=1), np.take_along_axis(all_scores, keep, axis=1)
+
+    @staticmethod
+    def _sorts_top_k(best_rows, best_scores):
+        """Sorts the top k of each query by decreasing score.
+
+        Args:
+            best_rows (array): A NumPy int64 array (queries x k) of rows.
+            best_scores (array): A NumPy float32 array (queries x k) of scores.
+
+        Returns:
+            A tuple of the sorted rows and scores.
+        """
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def top_k(self, queries, k=10, namespace=None, block_size=100000):
+        """Finds the k rows most similar (by cosine similarity) to each query, scoring blocks of rows with one matrix
+        product per block. A label query does not return its own row.
+
+        Args:
+            queries (list): A list of node labels (or a single one), or a NumPy array of vectors.
+            k (int): The number of neighbors per query.
+            namespace (str): An optional label prefix the neighbors must start with.
+            block_size (int): The number of rows scored at a time.
+
+        Returns:
+            A tuple of two NumPy arrays (queries x k): the rows of the neighbors and their similarities, best first.
+            Queries with fewer than k candidates are padded with row -1 and similarity -inf.
+        """
+
+        queries, query_rows = self._normalizes_queries(queries)
+        candidates = np.arange(len(self), dtype=np.int64) if namespace is None else self.namespace_rows(namespace)
+        contiguous = len(candidates) == 0 or candidates[-1] - candidates[0] + 1 == len(candidates)
+
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        for start in range(0, len(candidates), block_size):
+            rows = candidates[start:start + block_size]
+            block = self.embeddings[rows[0]:rows[-1] + 1] if contiguous else self.embeddings[rows]
+            norms = self.norms[rows]
+
+            scores = (queries @ np.asarray(block, dtype=np.float32).T) / np.where(norms > 0, norms, 1)
+            if query_rows is not None:
+                scores[rows[None, :] == query_rows[:, None]] = -np.inf
+
+            best_rows, best_scores = self._keeps_top_k(best_rows, best_scores, rows, scores, k)
+
+        return self._sorts_top_k(best_rows, best_scores)
+
+    def builds_index(self, num_lists=None, iterations=10, sample_size=100000, seed=0, block_size=100000):
+        """Builds an inverted file (IVF) index for approximate nearest neighbor queries: the unit vectors of a sample
+        of rows are clustered with spherical k-means, every row is assigned to its closest centroid, and the rows are
+        grouped by centroid. The index is cached next to the embedding file and reused when it was built with the same
+        parameters.
+
+        Args:
+            num_lists (int): The number of clusters (defaults to the square root of the number of rows).
+            iterations (int): The number of k-means iterations.
+            sample_size (int): The number of rows used to fit the centroids.
+            seed (int): The seed of the sample and the initial centroids.
+            block_size (int): The number of rows assigned at a time.
+
+        Returns:
+            None.
+        """
+
+        num_lists = num_lists or max(1, int(np.sqrt(len(self))))
+        index_file = self.embedding_file.rsplit('.', 1)[0] + '_IVF_{}_{}_{}_{}.npz'.format(num_lists, iterations,
+                                                                                           sample_size, seed)
+
+        if os.path.exists(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(self.embedding_file):
+            with np.load(index_file) as index:
+                self.index = {key: index[key] for key in index.files}
+            return None
+
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(len(self), min(sample_size, len(self)), replace=False))
+        vectors = np.asarray(self.embeddings[sample], dtype=np.float32) / \
+            np.maximum(self.norms[sample], 1e-12)[:, None]
+        centroids = vectors[rng.choice(len(vectors), min(num_lists, len(vectors)), replace=False)]
+
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        assignments = np.empty(len(self), dtype=np.int64)
+        for start in range(0, len(self), block_size):
+            assignments[start:start + block_size] = np.argmax(np.asarray(self.embeddings[start:start + block_size],
+                                                                         dtype=np.float32) @ centroids.T, axis=1)
+
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=len(centroids)), out=offsets[1:])
+        self.index = {'centroids': centroids, 'offsets': offsets,
+                      'rows': np.argsort(assignments, kind='stable').astype(np.int64)}
+        np.savez(index_file, **self.index)
+
+        return None
+
+    def approximate_top_k(self, queries, k=10, namespace=None, num_probes=8):
+        """Finds approximately the k rows most similar to each query with the IVF index (see builds_index): only the
+        rows of the num_probes clusters whose centroids are closest to a query are scored. A label query does not
+        return its own row.
+
+        Args:
+            queries (list): A list of node labels (or a single one), or a NumPy array of vectors.
+            k (int): The number of neighbors per query.
+            namespace (str): An optional label prefix the neighbors must start with.
+            num_probes (int): The number of clusters scored per query.
+
+        Returns:
+            A tuple of two NumPy arrays (queries x k): the rows of the neighbors and their similarities, best first.
+            Queries with fewer than k candidates are padded with row -1 and similarity -inf.
+
+        Raises:
+            An exception is raised if the index has not been built.
+        """
+
+        if self.index is None:
+            raise Exception('ERROR: Build the index with builds_index before running approximate queries')
+
+        queries, query_rows = self._normalizes_queries(queries)
+        centroids, offsets, index_rows = self.index['centroids'], self.index['offsets'], self.index['rows']
+        probes = np.argsort(-(queries @ centroids.T), axis=1)[:, :num_probes]
+
+        allowed = None
+        if namespace is not None:
+            allowed = np.zeros(len(self), dtype=bool)
+            allowed[self.namespace_rows(namespace)] = True
+
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        # each probed list is scored once, against all the queries probing it, with a single matrix product
+        pairs = np.argsort(probes.ravel(), kind='stable')
+        lists, starts = np.unique(probes.ravel()[pairs], return_index=True)
+
+        for c, members in zip(lists.tolist(), np.split(pairs // probes.shape[1], starts[1:])):
+            rows = index_rows[offsets[c]:offsets[c + 1]]
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+            if len(rows) == 0:
+                continue
+
+            norms = self.norms[rows]
+            scores = (queries[members] @ np.asarray(self.embeddings[rows], dtype=np.float32).T) / \
+                np.where(norms > 0, norms, 1)
+            if query_rows is not None:
+                scores[rows[None, :] == query_rows[members][:, None]] = -np.inf
+
+            best_rows[members], best_scores[members] = self._keeps_top_k(best_rows[members], best_scores[members],
+                                                                         rows, scores, k)
+
+        # rows masked out above (a label query's own row) only fill the slots of queries with fewer than k candidates
+        best_rows[np.isneginf(best_scores)] = -1
+
+        return self._sorts_top_k(best_rows, best_scores)
+
+    def most_similar(self, label, k=10, namespace=None, approximate=False, num_probes=8):
+        """Finds the k nodes most similar to a node.
+
+        Args:
+            label (str): A string containing a node label.
+            k (int): The number of neighbors.
+            namespace (str): An optional label prefix the neighbors must start with.
+            approximate (bool): If True, the IVF index is used (see approximate_top_k).
+            num_probes (int): The number of clusters scored when approximate is True.
+
+        Returns:
+            A list of tuples of a label and a cosine similarity, best first.
+        """
+
+        rows, scores = self.approximate_top_k(label, k, namespace, num_probes) if approximate else \
+            self.top_k(label, k, namespace)
+
+        return [(self.labels[row], float(score)) for row, score in zip(rows[0].tolist(), scores[0].tolist())
+                if row >= 0]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Finds the nodes most similar to a node in a knowledge graph '
+                                                 'embedding.')
+    parser.add_argument('-e', '--embeddings', help='name/path to the NumPy embedding file', required=True)
+    parser.add_argument('-l', '--labels', help='node labels to query', nargs='+', required=True)
+    parser.add_argument('-k', '--top', help='number of similar nodes', type=int, default=10)
+    parser.add_argument('-n', '--namespace', help='only return nodes with this iri prefix')
+    parser.add_argument('-a', '--approximate', help='use an IVF index', action='store_true')
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.embeddings)
+    if args.approximate:
+        store.builds_index()
+
+    for label in args.labels:
+        print('\n' + label)
+        for neighbor, score in store.most_similar(label, args.top, args.namespace, args.approximate):
+            print('{:.4f}\t{}'.format(score, neighbor))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import traceback
+
+from multiprocessing.connection import wait
+
+from scripts.python.Checksums import hashes_file, hashes_strings
+from scripts.python.KnowledgeGraphEmbedder import runs_deepwalk, runs_walk_embedding
+
+
+# embedding functions a sweep can run, with the default value of each of their hyperparameters
+embedders = {'deepwalk-c': (runs_deepwalk, {'dim': 128, 'nwalks': 100, 'walklen': 20, 'window': 10, 'nprwalks': 100,
+                                            'lr': 0.01}),
+             'walks': (runs_walk_embedding, {'dim': 128, 'nwalks': 100, 'walklen': 20, 'window': 10, 'lr': 0.01,
+                                             'p': 1.0, 'q': 1.0})}
+
+
+def expands_parameter_grid(grid, defaults=None):
+    """Expands a parameter grid into the list of parameter combinations it describes.
+
+    Args:
+        grid (dict): A dictionary mapping each parameter name to a list of values (or a single value).
+        defaults (dict): A dictionary of default values for the parameters missing from the grid.
+
+    Returns:
+        A list of dictionaries, one per combination, in the order of the grid.
+    """
+
+    grid = {key: value if isinstance(value, (list, tuple)) else [value] for key, value in grid.items()}
+    runs = []
+
+    for values in itertools.product(*grid.values()):
+        parameters = dict(defaults or {})
+        parameters.update(zip(grid.keys(), values))
+        runs.append(parameters)
+
+    return runs
+
+
+def _runs_sweep_job(function, args, kwargs, result_file):
+    """Runs one embedding run in a child process and writes its output file and duration to result_file as json,
+    exiting with a non-zero code if it raises an exception.
+
+    Args:
+        function (function): The embedding function to run.
+        args (tuple): The positional arguments passed to the function.
+        kwargs (dict): The keyword arguments passed to the function.
+        result_file (str): A string naming the json file to write the result to.
+
+    Returns:
+        None.
+    """
+
+    try:
+        start = time.time()
+        output = function(*args, **kwargs)
+        with open(result_file, 'w') as outfile:
+            json.dump({'output': output, 'seconds': time.time() - start}, outfile)
+    except BaseException:
+        traceback.print_exc()
+        os._exit(1)
+
+    return None
+
+
+class EmbeddingSweep(object):
+    """Class runs a hyperparameter sweep of knowledge graph embeddings: every combination of a parameter grid is
+    embedded, several runs at a time, with the core budget split evenly across the concurrent runs. Each run is
+    identified by a hash of the embedder, its parameters, and the contents of the input graph, writes its embeddings
+    under output_file followed by that identifier, and is recorded in a json manifest with its status, duration, and
+    output file. Runs already completed for the same graph are skipped, and runs interrupted by a crash are started
+    again (the 'walks' embedder also reuses the walk shards they saved, and runs with the same walk parameters share
+    their walks).
+
+    Args:
+        input_file (str): A string naming the BCSR graph (see KnowledgeGraph.maps_str_to_int).
+        output_file (str): A string containing the name and file path prefix of the embedding files.
+        grid (dict): A dictionary mapping each parameter name to a list of values (see expands_parameter_grid).
+        embedder (str): The embedding function to run ('deepwalk-c' or 'walks').
+        cores (int): The number of cores the sweep may use (defaults to the number of CPUs).
+        jobs (int): The maximum number of runs at the same time (defaults to one core per run, up to the number of
+            runs).
+        manifest_file (str): A string naming the json manifest (defaults to output_file + '_Sweep.json').
+
+    Raises:
+        An exception is raised if the embedder is unknown or the grid names a parameter the embedder does not take.
+    """
+
+    def __init__(self, input_file, output_file, grid, embedder='walks', cores=None, jobs=None, manifest_file=None):
+
+        if embedder not in embedders:
+            raise Exception('ERROR: Unknown embedder {}, choose one of {}'.format(embedder, ', '.join(embedders)))
+
+        self.function, defaults = embedders[embedder]
+        unknown = [key for key in grid if key not in defaults]
+        if unknown:
+            raise Exception('ERROR: {} does not take the parameters {}'.format(embedder, ', '.join(unknown)))
+
+        self.input_file = input_file
+        self.output_file = output_file
+        self.embedder = embedder
+        self.runs = expands_parameter_grid(grid, defaults)
+        self.cores = cores or multiprocessing.cpu_count()
+        self.jobs = max(1, min(jobs or self.cores, len(self.runs), self.cores))
+        self.manifest_file = manifest_file or output_file + '_Sweep.json'
+        self.graph_hash = None
+
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r') as infile:
+                self.manifest = json.load(infile)
+        else:
+            self.manifest = {'runs': {}}
+
+    def identifies_run(self, parameters, graph_hash):
+        """Computes the identifier of a run from the embedder, its parameters, and the hash of the input graph.
+
+        Args:
+            parameters (dict): A dictionary of parameters.
+            graph_hash (str): A string containing the hexadecimal digest of the input graph.
+
+        Returns:
+            A string containing the first 16 hexadecimal characters of the hash.
+        """
+
+        return hashes_strings(self.embedder, json.dumps(parameters, sort_keys=True), graph_hash)[:16]
+
+    def _writes_manifest(self):
+        """Writes the manifest to the manifest file.
+
+        Returns:
+            None.
+        """
+
+        with open(self.manifest_file + '.tmp', 'w') as outfile:
+            json.dump(self.manifest, outfile, indent=2, sort_keys=True)
+        os.replace(self.manifest_file + '.tmp', self.manifest_file)
+
+        return None
+
+    def _starts_run(self, run_id, parameters, threads):
+        """Starts a run in its own child process.
+
+        Args:
+            run_id (str): A string containing the identifier of the run.
+            parameters (dict): A dictionary of the parameters of the run.
+            threads (int): The number of cores the run may use.
+
+        Returns:
+            The multiprocessing.Process running the run.
+        """
+
+        kwargs = dict(parameters, threads=threads)
+
+        # runs that only differ in their Word2Vec parameters share their walks
+        if self.embedder == 'walks':
+            walk_id = hashes_strings(self.graph_hash, *[parameters[x] for x in ('nwalks', 'walklen', 'p', 'q')])[:16]
+            kwargs.update(processes=threads, walk_dir=self.output_file + '_Walks_' + walk_id)
+
+        print('\nStarting Run {}: {} ({} cores)'.format(run_id, json.dumps(parameters, sort_keys=True), threads))
+        result_file = self.output_file + '_Sweep_' + run_id + '.json'
+        # the run identifier includes the graph hash, so runs over another graph never overwrite recorded outputs
+        output_file = self.output_file + '_' + run_id
+        process = multiprocessing.Process(target=_runs_sweep_job, args=(self.function, (self.input_file, output_file),
+                                                                        kwargs, result_file))
+        process.start()
+
+        return process
+
+    def _finishes_run(self, run_id, exitcode):
+        """Records the result of a run in the manifest.
+
+        Args:
+            run_id (str): A string containing the identifier of the run.
+            exitcode (int): The exit code of the process that ran the run.
+
+        Returns:
+            The status of the run ('done' or 'failed').
+        """
+
+        run = self.manifest['runs'][run_id]
+        result_file = self.output_file + '_Sweep_' + run_id + '.json'
+
+        if exitcode == 0 and os.path.exists(result_file):
+            with open(result_file, 'r') as infile:
+                run.update(json.load(infile))
+            os.remove(result_file)
+
+        run['status'] = 'done' if exitcode == 0 and run.get('output') and os.path.exists(run['output']) else 'failed'
+        run['finished'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self._writes_manifest()
+        print('\nRun {} {}'.format(run_id, run['status']))
+
+        return run['status']
+
+    def runs_sweep(self, force=False):
+        """Runs the sweep. Completed runs on the same graph are skipped (unless force is True), and the pending runs
+        are started as soon as a slot is free, each with an even share of the cores.
+
+        Args:
+            force (bool): If True, every run is started again even if it already completed.
+
+        Returns:
+            A list of dictionaries, one per run of the grid, with the parameters, status, duration (in seconds), and
+            output file of the run.
+        """
+
+        print('\n\n' + '=' * len('Running Embedding Sweep'))
+        print('Running Embedding Sweep')
+        print('=' * len('Running Embedding Sweep'))
+
+        graph_hash = self.graph_hash = hashes_file(self.input_file)
+        threads = max(1, self.cores // self.jobs)
+        pending, run_ids = [], []
+
+        for parameters in self.runs:
+            run_id = self.identifies_run(parameters, graph_hash)
+            run = self.manifest['runs'].get(run_id)
+            run_ids.append(run_id)
+
+            if not force and run is not None and run['status'] == 'done' and os.path.exists(run['output']):
+                print('Skipping Completed Run {}: {}'.format(run_id, run['output']))
+                continue
+            if run is not None and run['status'] == 'running':
+                print('Resuming Interrupted Run {}'.format(run_id))
+
+            pending.append((run_id, parameters))
+
+        running = {}
+        while pending or running:
+            while pending and len(running) < self.jobs:
+                run_id, parameters = pending.pop(0)
+                self.manifest['runs'][run_id] = {'parameters': parameters, 'embedder': self.embedder,
+                                                 'input_file': self.input_file, 'graph_hash': graph_hash,
+                                                 'threads': threads, 'status': 'running',
+                                                 'started': time.strftime('%Y-%m-%d %H:%M:%S')}
+                self._writes_manifest()
+                running[run_id] = self._starts_run(run_id, parameters, threads)
+
+            finished = wait([process.sentinel for process in running.values()])
+            for run_id in [x for x in running if running[x].sentinel in finished]:
+                process = running.pop(run_id)
+                process.join()
+                self._finishes_run(run_id, process.exitcode)
+
+        results = [self.manifest['runs'][run_id] for run_id in run_ids]
+
+        print('\n' + '=' * 50)
+        for run_id, run in zip(run_ids, results):
+            print('{}: {} ({:.1f}s) {}'.format(run_id, run['status'], run.get('seconds', 0), run.get('output', '')))
+        print('=' * 50 + '\n')
+
+        return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Runs a hyperparameter sweep of knowledge graph embeddings.')
+    parser.add_argument('-i', '--input', help='name/path to the BCSR graph', required=True)
+    parser.add_argument('-o', '--output', help='name/path prefix of the embedding files', required=True)
+    parser.add_argument('-g', '--grid', help='json object mapping each parameter to a list of values (e.g. '
+                                             '\'{"dim": [64, 128], "window": [5, 10]}\')', required=True)
+    parser.add_argument('-e', '--embedder', help='deepwalk-c binary or in-process walks with gensim Word2Vec',
+                        default='walks', choices=list(embedders))
+    parser.add_argument('-c', '--cores', help='number of cores the sweep may use', type=int)
+    parser.add_argument('-j', '--jobs', help='maximum number of concurrent runs', type=int)
+    parser.add_argument('-f', '--force', help='rerun completed runs', action='store_true')
+    args = parser.parse_args()
+
+    sweep = EmbeddingSweep(args.input, args.output, json.loads(args.grid), args.embedder, args.cores, args.jobs)
+    results = sweep.runs_sweep(args.force)
+
+    if any(run['status'] != 'done' for run in results):
+        raise Exception('ERROR: Not all runs of the sweep completed, see {}'.format(sweep.manifest_file))
+
+
+if __name__ == '__main__':
+    main()
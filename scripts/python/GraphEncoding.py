@@ -0,0 +1,430 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import numpy as np
+
+from itertools import islice
+from tqdm import tqdm
+
+
+class StringTable(object):
+    """Class provides read access to a compact, sorted table of strings that is stored on disk as two NumPy arrays: a
+    uint8 array holding the concatenated UTF-8 encoded strings and an int64 array holding the offset of each string
+    (n + 1 values). Because the strings are sorted, the position of a string in the table is also its integer
+    identifier, a string can be looked up with a binary search, and all strings sharing a prefix (e.g. a namespace)
+    occupy a contiguous range of identifiers.
+
+    Args:
+        table_prefix (str): A string naming the file path prefix the table was written to by writes_string_table.
+        mmap_mode (str): The NumPy memory-map mode used to open the arrays (None reads them into memory).
+
+    """
+
+    def __init__(self, table_prefix, mmap_mode='r'):
+
+        self.table_prefix = table_prefix
+        self.strings = np.load(table_prefix + '_Strings.npy', mmap_mode=mmap_mode)
+        self.offsets = np.load(table_prefix + '_Offsets.npy', mmap_mode=mmap_mode)
+
+    def __len__(self):
+
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+
+        return self.gets_bytes(index).decode('utf-8')
+
+    def __iter__(self):
+
+        for index in range(len(self)):
+            yield self[index]
+
+    def gets_bytes(self, index):
+        """Returns the UTF-8 encoded string stored at an index of the table.
+
+        Args:
+            index (int): An integer identifier.
+
+        Returns:
+            A bytes object.
+        """
+
+        if index < 0:
+            index += len(self)
+
+        return self.strings[int(self.offsets[index]):int(self.offsets[index + 1])].tobytes()
+
+    def bisects(self, term, side='left'):
+        """Performs a binary search over the sorted table. Sorting UTF-8 bytes gives the same order as sorting the
+        decoded strings, so the search runs directly on the stored bytes.
+
+        Args:
+            term (str): A string to search for.
+            side (str): If 'left' the first position where term could be inserted is returned, if 'right' the last.
+
+        Returns:
+            An integer position in the table.
+        """
+
+        key = term.encode('utf-8')
+        low, high = 0, len(self)
+
+        while low < high:
+            mid = (low + high) // 2
+            value = self.gets_bytes(mid)
+
+            if value < key or (side == 'right' and value == key):
+                low = mid + 1
+            else:
+                high = mid
+
+        return low
+
+    def index(self, term):
+        """Returns the integer identifier of a string.
+
+        Args:
+            term (str): A string stored in the table.
+
+        Returns:
+            An integer identifier.
+
+        Raises:
+            A KeyError is raised if the string is not in the table.
+        """
+
+        position = self.bisects(term)
+
+        if position == len(self) or self[position] != term:
+            raise KeyError(term)
+
+        return position
+
+    def prefix_range(self, prefix):
+        """Returns the contiguous range of identifiers of all strings that start with a prefix.
+
+        Args:
+            prefix (str): A string prefix (e.g. 'http://purl.obolibrary.org/obo/HP_').
+
+        Returns:
+            A tuple of two integers, the first and one past the last identifier of the matching strings.
+        """
+
+        start = self.bisects(prefix)
+
+        # the strings with a prefix are followed by the first string that does not start with it
+        low, high = start, len(self)
+        key = prefix.encode('utf-8')
+
+        while low < high:
+            mid = (low + high) // 2
+
+            if self.gets_bytes(mid).startswith(key):
+                low = mid + 1
+            else:
+                high = mid
+
+        return start, low
+
+    def to_list(self):
+        """Decodes all strings of the table.
+
+        Returns:
+            A list of strings ordered by integer identifier.
+        """
+
+        data = self.strings.tobytes()
+        offsets = self.offsets.tolist()
+
+        return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(self))]
+
+    def iterates_bytes(self, chunk_size=100000):
+        """Streams the UTF-8 encoded strings of the table in sorted order, reading chunk_size strings at a time.
+
+        Args:
+            chunk_size (int): The number of strings read from the table at a time.
+
+        Returns:
+            A generator of bytes objects, one per string, ordered by integer identifier.
+        """
+
+        for start in range(0, len(self), chunk_size):
+            offsets = np.asarray(self.offsets[start:min(start + chunk_size, len(self)) + 1], dtype=np.int64)
+            data = self.strings[int(offsets[0]):int(offsets[-1])].tobytes()
+            offsets = (offsets - offsets[0]).tolist()
+
+            for i in range(len(offsets) - 1):
+                yield data[offsets[i]:offsets[i + 1]]
+
+
+def writes_string_table(strings, table_prefix):
+    """Writes a sorted list of strings to disk as a compact string table (see StringTable).
+
+    Args:
+        strings (list): A sorted list of strings.
+        table_prefix (str): A string naming the file path prefix to write the table to.
+
+    Returns:
+        None.
+    """
+
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+
+    np.save(table_prefix + '_Strings.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(table_prefix + '_Offsets.npy', offsets)
+
+    return None
+
+
+def reads_string_table(table_prefix, mmap_mode='r'):
+    """Opens a string table written by writes_string_table.
+
+    Args:
+        table_prefix (str): A string naming the file path prefix the table was written to.
+        mmap_mode (str): The NumPy memory-map mode used to open the arrays (None reads them into memory).
+
+    Returns:
+        A StringTable object.
+    """
+
+    return StringTable(table_prefix, mmap_mode)
+
+
+def reads_ntriples(filepath):
+    """Streams the triples from an N-Triples file where every term is an IRI (e.g. the files written by
+    KnowledgeGraph.removes_metadata_nodes).
+
+    Args:
+        filepath (str): A string naming the N-Triples file to read.
+
+    Returns:
+        A generator of tuples, where each tuple contains the string subject, predicate, and object of a triple.
+    """
+
+    with open(filepath, 'r') as triples:
+        for line in triples:
+            line = line.strip()
+
+            if line:
+                yield tuple(line[1:-3].split('> <'))
+
+
+def _sorts_unique_bytes(strings):
+    """Sorts and de-duplicates a fixed-width NumPy bytes array. Each string is zero-padded to a multiple of 8 bytes and
+    read as big-endian 64-bit integers, so sorting the rows of integers (np.lexsort) gives the byte order of the strings
+    without comparing them as strings.
+
+    Args:
+        strings (array): A NumPy bytes array.
+
+    Returns:
+        A tuple of two NumPy arrays: the sorted, de-duplicated bytes array and the int32 position of each string in it.
+    """
+
+    width = max(-(-strings.itemsize // 8) * 8, 8)
+    strings = strings.astype('S{}'.format(width))
+    keys = strings.view('>u8').reshape(len(strings), width // 8).astype(np.uint64)
+
+    order = np.lexsort(keys.T[::-1])
+    first = np.ones(len(strings), dtype=bool)
+    first[1:] = (keys[order[1:]] != keys[order[:-1]]).any(axis=1)
+
+    ids = np.empty(len(strings), dtype=np.int32)
+    ids[order] = np.cumsum(first, dtype=np.int32) - 1
+
+    return strings[order[first]], ids
+
+
+def _merges_sorted_tables(tables):
+    """Merges the sorted, de-duplicated NumPy bytes arrays of several chunks into one sorted vocabulary and maps the
+    identifiers of each chunk to positions in it.
+
+    Args:
+        tables (list): A list of sorted NumPy bytes arrays without duplicates.
+
+    Returns:
+        A tuple containing the sorted list of strings and a list of NumPy int32 arrays, one per table, mapping the
+        positions of the table to positions in the sorted list.
+    """
+
+    if not tables:
+        return [], []
+
+    merged, ids = _sorts_unique_bytes(np.concatenate(tables))
+    maps = np.split(ids, np.cumsum([len(table) for table in tables])[:-1])
+
+    return [string.decode('utf-8') for string in merged.tolist()], maps
+
+
+def encodes_triples(triples, chunk_size=1000000):
+    """Assigns integer identifiers to the nodes (subjects and objects) and relations (predicates) of a stream of
+    triples. The triples are read chunk_size at a time and the UTF-8 encoded strings of each chunk are sorted and
+    de-duplicated as fixed-width NumPy bytes arrays (see _sorts_unique_bytes), whose order is the order of the decoded
+    strings. The sorted tables of the chunks are then merged and the chunk identifiers re-labeled, so that each
+    identifier is the position of its string in the sorted vocabulary and each vocabulary is a sorted string table.
+
+    Args:
+        triples (iterable): An RDFLib graph or any iterable of triples.
+        chunk_size (int): The number of triples encoded at a time.
+
+    Returns:
+        A tuple of five items: three NumPy int32 arrays holding the subject, predicate, and object identifier of each
+        triple, a sorted list of node strings, and a sorted list of relation strings.
+    """
+
+    node_tables, relation_tables, chunks = [], [], []
+    triples = iter(tqdm(triples))
+
+    while True:
+        chunk = list(islice(triples, chunk_size))
+        if not chunk:
+            break
+
+        terms = [[str(edge[i]).encode('utf-8') for edge in chunk] for i in range(3)]
+        nodes, node_ids = _sorts_unique_bytes(np.array(terms[0] + terms[2], dtype=bytes))
+        relations, relation_ids = _sorts_unique_bytes(np.array(terms[1], dtype=bytes))
+
+        node_tables.append(nodes)
+        relation_tables.append(relations)
+        chunks.append((node_ids, relation_ids))
+
+    node_list, node_maps = _merges_sorted_tables(node_tables)
+    relation_list, relation_maps = _merges_sorted_tables(relation_tables)
+
+    subjects, predicates, objects = ([np.empty(0, dtype=np.int32)] for _ in range(3))
+    for node_map, relation_map, (node_ids, relation_ids) in zip(node_maps, relation_maps, chunks):
+        subjects.append(node_map[node_ids[:len(relation_ids)]])
+        predicates.append(relation_map[relation_ids])
+        objects.append(node_map[node_ids[len(relation_ids):]])
+
+    subjects, predicates, objects = np.concatenate(subjects), np.concatenate(predicates), np.concatenate(objects)
+
+    return subjects, predicates, objects, node_list, relation_list
+
+
+def writes_encoded_triples(triples, output_prefix):
+    """Encodes a stream of triples (see encodes_triples) and writes the results to disk. The subject, predicate, and
+    object identifiers are saved as memory-mappable NumPy int32 arrays (output_prefix + '_Subjects.npy',
+    '_Predicates.npy', and '_Objects.npy') and the vocabularies as string tables (output_prefix + '_Nodes' and
+    '_Relations').
+
+    Args:
+        triples (iterable): An RDFLib graph or any iterable of triples.
+        output_prefix (str): A string naming the file path prefix to write results to.
+
+    Returns:
+        A tuple of five items: three NumPy int32 arrays holding the subject, predicate, and object identifier of each
+        triple, a sorted list of node strings, and a sorted list of relation strings.
+    """
+
+    subjects, predicates, objects, node_list, relation_list = encodes_triples(triples)
+
+    np.save(output_prefix + '_Subjects.npy', subjects)
+    np.save(output_prefix + '_Predicates.npy', predicates)
+    np.save(output_prefix + '_Objects.npy', objects)
+
+    writes_string_table(node_list, output_prefix + '_Nodes')
+    writes_string_table(relation_list, output_prefix + '_Relations')
+
+    return subjects, predicates, objects, node_list, relation_list
+
+
+def reads_encoded_triples(output_prefix, mmap_mode='r'):
+    """Opens the integer triple arrays and vocabularies written by writes_encoded_triples.
+
+    Args:
+        output_prefix (str): A string naming the file path prefix the results were written to.
+        mmap_mode (str): The NumPy memory-map mode used to open the arrays (None reads them into memory).
+
+    Returns:
+        A tuple of five items: three NumPy int32 arrays holding the subject, predicate, and object identifier of each
+        triple, the node StringTable, and the relation StringTable.
+    """
+
+    return (np.load(output_prefix + '_Subjects.npy', mmap_mode=mmap_mode),
+            np.load(output_prefix + '_Predicates.npy', mmap_mode=mmap_mode),
+            np.load(output_prefix + '_Objects.npy', mmap_mode=mmap_mode),
+            reads_string_table(output_prefix + '_Nodes', mmap_mode),
+            reads_string_table(output_prefix + '_Relations', mmap_mode))
+
+
+def builds_csr(sources, targets, num_nodes=None, undirected=False):
+    """Builds a compressed sparse row (CSR) adjacency structure from integer edge arrays. Edges are de-duplicated and
+    each node's neighbors are sorted.
+
+    Args:
+        sources (array): A NumPy integer array of source node identifiers.
+        targets (array): A NumPy integer array of target node identifiers.
+        num_nodes (int): The number of nodes in the graph (defaults to the largest node identifier plus one).
+        undirected (bool): If True, each edge is added in both directions.
+
+    Returns:
+        A tuple of two NumPy int64 arrays: the offsets (num_nodes + 1 values) and the neighbors of each node.
+    """
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+
+    if undirected:
+        sources, targets = np.concatenate((sources, targets)), np.concatenate((targets, sources))
+
+    if num_nodes is None:
+        num_nodes = int(max(sources.max(initial=-1), targets.max(initial=-1))) + 1
+
+    # sort and de-duplicate edges on a single integer key
+    keys = np.unique(sources * num_nodes + targets)
+    sources, targets = keys // num_nodes, keys % num_nodes
+
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_nodes), out=offsets[1:])
+
+    return offsets, targets
+
+
+def writes_bcsr(sources, targets, output, num_nodes=None, undirected=False):
+    """Builds a CSR graph from integer edge arrays (see builds_csr) and writes it in the binary compressed sparse row
+    (BCSR) layout read by deepwalk-c (https://github.com/xgfs/deepwalk-c): the number of nodes and the number of edges
+    as int64 values, followed by the int32 offset of each node and the int32 neighbors of each node.
+
+    Args:
+        sources (array): A NumPy integer array of source node identifiers.
+        targets (array): A NumPy integer array of target node identifiers.
+        output (str): A string naming the file path to write the BCSR graph to.
+        num_nodes (int): The number of nodes in the graph (defaults to the largest node identifier plus one).
+        undirected (bool): If True, each edge is added in both directions.
+
+    Returns:
+        A tuple of two NumPy int64 arrays: the offsets (num_nodes + 1 values) and the neighbors of each node.
+    """
+
+    offsets, neighbors = builds_csr(sources, targets, num_nodes, undirected)
+
+    with open(output, 'wb') as outfile:
+        outfile.write(np.array([len(offsets) - 1, len(neighbors)], dtype=np.int64).tobytes())
+        outfile.write(offsets[:-1].astype(np.int32).tobytes())
+        outfile.write(neighbors.astype(np.int32).tobytes())
+
+    return offsets, neighbors
+
+
+def reads_bcsr(bcsr_file):
+    """Memory-maps a graph written in the binary compressed sparse row (BCSR) layout (see writes_bcsr).
+
+    Args:
+        bcsr_file (str): A string naming the file path of a BCSR graph.
+
+    Returns:
+        A tuple of two NumPy arrays: the int64 offsets (num_nodes + 1 values) and the int32 neighbors of each node.
+    """
+
+    num_nodes, num_edges = np.fromfile(bcsr_file, dtype=np.int64, count=2)
+    offsets = np.empty(num_nodes + 1, dtype=np.int64)
+    offsets[:-1] = np.memmap(bcsr_file, dtype=np.int32, mode='r', offset=16, shape=(int(num_nodes),))
+    offsets[-1] = num_edges
+    neighbors = np.memmap(bcsr_file, dtype=np.int32, mode='r', offset=16 + 4 * int(num_nodes), shape=(int(num_edges),))
+
+    return offsets, neighbors
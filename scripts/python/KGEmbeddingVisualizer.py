@@ -4,47 +4,266 @@
 
 # import needed libraries
 import json
+import matplotlib.colors as mcolors
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import numpy as np
+import os
 import pandas as pd
+import re
 
 from sklearn.manifold import TSNE
-from sklearn.decomposition import TruncatedSVD
-from tqdm import tqdm
+
+from scripts.python.Checksums import hashes_file, hashes_strings
 
 
 # set environment arguments
 plt.style.use('ggplot')
 
 
-def processes_integer_labeled_embeddings(embedding, node_label_dict, node_list):
-    """Iterates over a list of embeddings and derives a dictionary where the keys are node types and the values are
-    embeddings.
+def reads_embedding_matrix(embedding_file, node_label_map=None):
+    """Reads node embeddings into a float32 NumPy matrix with the label of each row. Reads either the NumPy array
+    written by KnowledgeGraphEmbedder.processes_embedded_nodes (memory-mapped, with its '_Labels.txt' file) or a text
+    embedding file with a header line and one line per node holding the node integer and its vector separated by
+    spaces, which is parsed in one pass by pandas' C reader.
+
+    Args:
+        embedding_file (str): A string naming the NumPy ('.npy') or text embedding file.
+        node_label_map (str): A string naming the json file mapping node labels to node integers (see
+            KnowledgeGraph.maps_str_to_int), only needed for text embedding files.
+
+    Returns:
+        A tuple of a list of node labels and a NumPy float32 array with one row per label.
+
+    Raises:
+        An exception is raised if a text embedding file is given without a node label map.
+    """
+
+    if embedding_file.endswith('.npy'):
+        with open(embedding_file.rsplit('.', 1)[0] + '_Labels.txt', 'r') as infile:
+            labels = infile.read().split('\n')[:-1]
+
+        return labels, np.load(embedding_file, mmap_mode='r')
+
+    if node_label_map is None:
+        raise Exception('ERROR: Reading text embedding file {} needs a node label map'.format(embedding_file))
+
+    data = pd.read_csv(embedding_file, sep=' ', header=None, skiprows=1, engine='c').dropna(axis=1, how='all')
+    embeddings = data.iloc[:, 1:].to_numpy(dtype=np.float32)
+
+    # read map to convert node integers back to labels
+    label_map = json.load(open(node_label_map))
+    node_labels = [None] * len(label_map)
+    for label, node in label_map.items():
+        node_labels[node] = label
+
+    return [node_labels[node] for node in data[0].tolist()], embeddings
+
+
+def classifies_node_types(labels, node_types):
+    """Assigns each node label the first node type (in list order) that occurs in it, using one compiled regular
+    expression whose alternatives are tried in order at the start of each label. Labels are matched without their
+    trailing digits (unless a node type contains digits), so the expression runs once per distinct prefix (e.g.
+    'http://purl.obolibrary.org/obo/HP_') instead of once per node.
+
+    Args:
+        labels (list): A list of node labels.
+        node_types (list): A list of strings identifying node types (e.g. 'HP', 'CHEBI', or 'geneid').
+
+    Returns:
+        A NumPy int16 array holding the position of the node type of each label in node_types, or -1 for labels
+        without a node type.
+    """
+
+    pattern = re.compile('|'.join('(?=.*?({}))'.format(re.escape(node_type)) for node_type in node_types))
+    digits = ''.join(x for x in '0123456789' if not any(x in node_type for node_type in node_types))
+    codes = np.empty(len(labels), dtype=np.int16)
+    prefix_codes = {}
+
+    for row, label in enumerate(labels):
+        prefix = label.rstrip(digits)
+        code = prefix_codes.get(prefix)
+
+        if code is None:
+            match = pattern.match(prefix)
+            code = prefix_codes[prefix] = match.lastindex - 1 if match else -1
+
+        codes[row] = code
+
+    return codes
+
+
+def fits_pca(embeddings, n_components=50, chunk_size=100000):
+    """Fits a principal component analysis of an embedding matrix in one chunked pass: the mean and the covariance
+    matrix (dimensions x dimensions) are accumulated chunk by chunk, so a memory-mapped matrix is never loaded as a
+    whole, and the components are the leading eigenvectors of the covariance matrix.
+
+    Args:
+        embeddings (array): A NumPy array (or memory-mapped array) with one embedding per row.
+        n_components (int): The number of components.
+        chunk_size (int): The number of rows read at a time.
+
+    Returns:
+        A tuple of the NumPy float32 mean vector and the NumPy float32 components (one per row).
+    """
+
+    total = np.zeros(embeddings.shape[1], dtype=np.float64)
+    gram = np.zeros((embeddings.shape[1], embeddings.shape[1]), dtype=np.float64)
+
+    for start in range(0, len(embeddings), chunk_size):
+        chunk = np.asarray(embeddings[start:start + chunk_size], dtype=np.float64)
+        total += chunk.sum(axis=0)
+        gram += chunk.T @ chunk
+
+    mean = total / len(embeddings)
+    values, vectors = np.linalg.eigh(gram / len(embeddings) - np.outer(mean, mean))
+    order = np.argsort(values)[::-1][:n_components]
+
+    return mean.astype(np.float32), vectors[:, order].T.astype(np.float32)
+
+
+def transforms_pca(embeddings, rows, mean, components, chunk_size=100000):
+    """Projects rows of an embedding matrix onto principal components (see fits_pca), chunk by chunk.
+
+    Args:
+        embeddings (array): A NumPy array (or memory-mapped array) with one embedding per row.
+        rows (array): A sorted NumPy integer array of the rows to project.
+        mean (array): The NumPy float32 mean vector.
+        components (array): The NumPy float32 components.
+        chunk_size (int): The number of rows projected at a time.
+
+    Returns:
+        A NumPy float32 array with one projected row per row.
+    """
+
+    projected = np.empty((len(rows), len(components)), dtype=np.float32)
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = np.asarray(embeddings[rows[start:start + chunk_size]], dtype=np.float32)
+        projected[start:start + chunk_size] = (chunk - mean) @ components.T
+
+    return projected
+
+
+def samples_node_types(codes, sample_size, seed=1):
+    """Draws a stratified sample of rows with up to sample_size rows of each node type (see classifies_node_types), so
+    small node types are not swamped by large ones.
+
+    Args:
+        codes (array): A NumPy integer array holding the node type of each row (-1 for rows without a node type).
+        sample_size (int): The maximum number of rows per node type.
+        seed (int): The seed of the sample.
+
+    Returns:
+        A sorted NumPy int64 array of rows.
+    """
+
+    rng = np.random.default_rng(seed)
+    sample = []
+
+    for code in np.unique(codes[codes >= 0]):
+        rows = np.flatnonzero(codes == code)
+        sample.append(rng.choice(rows, min(sample_size, len(rows)), replace=False))
+
+    return np.sort(np.concatenate(sample)) if sample else np.empty(0, dtype=np.int64)
+
+
+def projects_out_of_sample(points, sample_points, sample_coordinates, neighbors=10, chunk_size=10000):
+    """Places points in a projection fitted on a sample (e.g. t-SNE) at the inverse distance weighted mean of the
+    projected coordinates of their nearest sample points, found with blocked matrix products.
+
+    Args:
+        points (array): A NumPy float32 array of the points to place (one per row).
+        sample_points (array): A NumPy float32 array of the sample points the projection was fitted on.
+        sample_coordinates (array): A NumPy float32 array of the projected coordinates of the sample points.
+        neighbors (int): The number of nearest sample points used per point.
+        chunk_size (int): The number of points placed at a time.
+
+    Returns:
+        A NumPy float32 array of projected coordinates, one row per point.
+    """
+
+    neighbors = min(neighbors, len(sample_points))
+    sample_norms = np.sum(sample_points ** 2, axis=1)
+    coordinates = np.empty((len(points), sample_coordinates.shape[1]), dtype=np.float32)
+
+    for start in range(0, len(points), chunk_size):
+        chunk = points[start:start + chunk_size]
+        distances = np.sum(chunk ** 2, axis=1)[:, None] - 2 * chunk @ sample_points.T + sample_norms
+        nearest = np.argpartition(distances, neighbors - 1, axis=1)[:, :neighbors]
+        weights = 1 / (np.sqrt(np.maximum(np.take_along_axis(distances, nearest, axis=1), 0)) + 1e-6)
+        coordinates[start:start + chunk_size] = np.einsum('ij,ijk->ik', weights, sample_coordinates[nearest]) / \
+            weights.sum(axis=1, keepdims=True)
+
+    return coordinates
+
+
+def projects_embeddings(embedding_file, node_types, node_label_map=None, n_components=50, sample_size=5000,
+                        perplexity=50.0, project=False, neighbors=10, seed=1, cache_dir=None):
+    """Projects node embeddings to two dimensions for plotting: the matrix is reduced with a chunked principal
+    component analysis (see fits_pca), t-SNE is fitted on a stratified sample of each node type (see
+    samples_node_types), and, if project is True, every other typed node is placed with its nearest sampled nodes
+    (see projects_out_of_sample). The principal components and the projection are cached under a hash of the embedding
+    file and the parameters, so replotting does not recompute them.
 
     Args:
-        embedding (list): A nested list where each inner list is a vector of embeddings.
-        node_label_dict (dict): A dictionary where keys are strings and values are integers.
-        node_list (list): A list of node types.
+        embedding_file (str): A string naming the NumPy ('.npy') or text embedding file (see reads_embedding_matrix).
+        node_types (list): A list of strings identifying node types (see classifies_node_types).
+        node_label_map (str): A string naming the json file mapping node labels to node integers, only needed for text
+            embedding files.
+        n_components (int): The number of principal components t-SNE is fitted on.
+        sample_size (int): The maximum number of nodes of each node type t-SNE is fitted on.
+        perplexity (float): The t-SNE perplexity.
+        project (bool): If True, all nodes with a node type are projected, not only the sample.
+        neighbors (int): The number of sampled nodes used to place each other node.
+        seed (int): The seed of the sample and of t-SNE.
+        cache_dir (str): A string naming the directory to cache projections in (defaults to the directory of the
+            embedding file).
 
     Returns:
-        A nested list where each inner list contains the node type, node label, and embedding list..
+        A tuple of three NumPy arrays: the projected rows of the embedding matrix, their node types (positions in
+        node_types), and their two-dimensional coordinates.
     """
 
-    print('\n' + '=' * 100)
-    print('Converting Integer Embedding Labels to Strings')
-    print('=' * 100 + '\n')
+    cache_dir = cache_dir or os.path.dirname(os.path.abspath(embedding_file))
+    file_hash = hashes_file(embedding_file)
+    pca_file = os.path.join(cache_dir, '{}_PCA_{}.npz'.format(file_hash[:16], n_components))
+    projection_file = os.path.join(cache_dir, '{}_Projection_{}.npz'.format(file_hash[:16], hashes_strings(
+        file_hash, json.dumps(node_types), n_components, sample_size, perplexity, project, neighbors, seed)[:16]))
+
+    if os.path.exists(projection_file):
+        with np.load(projection_file) as projection:
+            return projection['rows'], projection['codes'], projection['coordinates']
 
-    embedding_info = []
+    labels, embeddings = reads_embedding_matrix(embedding_file, node_label_map)
+    codes = classifies_node_types(labels, node_types)
 
-    for row in tqdm(embedding):
-        node = node_label_dict[int(row.split(' ')[0])]
+    if os.path.exists(pca_file):
+        with np.load(pca_file) as pca:
+            mean, components = pca['mean'], pca['components']
+    else:
+        mean, components = fits_pca(embeddings, n_components)
+        np.savez(pca_file, mean=mean, components=components)
 
-        for node_label in node_list:
-            if node.split('/')[-1].startswith(node_label) or node_label in node:
-                embedding_info.append([node_label, node, [float(x) for x in row.strip('\n').split(' ')[1:]]])
+    sample = samples_node_types(codes, sample_size, seed)
+    sample_points = transforms_pca(embeddings, sample, mean, components)
+    sample_coordinates = TSNE(n_components=2, random_state=seed, verbose=True, init='pca',
+                              perplexity=min(perplexity, (len(sample) - 1) / 3)).fit_transform(sample_points)
+    sample_coordinates = sample_coordinates.astype(np.float32)
 
-    return embedding_info
+    rows, coordinates = sample, sample_coordinates
+    if project:
+        rows = np.flatnonzero(codes >= 0)
+        coordinates = np.empty((len(rows), 2), dtype=np.float32)
+        in_sample = np.isin(rows, sample)
+        coordinates[in_sample] = sample_coordinates
+        coordinates[~in_sample] = projects_out_of_sample(transforms_pca(embeddings, rows[~in_sample], mean,
+                                                                        components),
+                                                         sample_points, sample_coordinates, neighbors)
+
+    np.savez(projection_file, rows=rows, codes=codes[rows], coordinates=coordinates)
+
+    return rows, codes[rows], coordinates
 
 
 def plots_embeddings(colors, names, groups, legend_arg, label_size, tsne_size, title, title_size):
@@ -68,23 +287,98 @@ def plots_embeddings(colors, names, groups, legend_arg, label_size, tsne_size, t
     plt.close()
 
 
-def main():
+def rasterizes_density(coordinates, codes, type_colors, bins=(900, 600), extent=None):
+    """Rasterizes projected points into an RGBA image: the points of each node type are binned into a 2D histogram
+    (all layers with one bincount), each pixel takes the count-weighted mean color of the node types in it, and its
+    opacity grows with the logarithm of its number of points.
+
+    Args:
+        coordinates (array): A NumPy array of two-dimensional coordinates, one row per point.
+        codes (array): A NumPy integer array holding the node type of each point (positions in type_colors).
+        type_colors (list): A list of matplotlib colors, one per node type.
+        bins (tuple): The number of pixels along the x and y axes.
+        extent (tuple): The (x_min, x_max, y_min, y_max) range to rasterize (defaults to the range of the points).
+
+    Returns:
+        A tuple of a NumPy float32 RGBA image (y bins x x bins x 4, first row at the bottom) and its extent.
+    """
+
+    if extent is None:
+        extent = (float(coordinates[:, 0].min()), float(coordinates[:, 0].max()), float(coordinates[:, 1].min()),
+                  float(coordinates[:, 1].max()))
 
-    # CONVERT EMBEDDINGS INTO PANDAS DATAFRAME
-    # read in embedding file and re-generate node labels
-    embedding_file = open('./resources/graphs/out.txt').readlines()[1:]
-    node_labels = json.loads(open('./resources/graphs/KG_triples_ints_map.json').read())
-    node_label_dict = {val: key for (key, val) in node_labels.items()}
-    node_list = ['HP', 'CHEBI', 'VO', 'DOID', 'R-HSA', 'GO', 'geneid']
+    x_bins, y_bins = bins
+    x = ((coordinates[:, 0] - extent[0]) / max(extent[1] - extent[0], 1e-12) * x_bins).astype(np.int64)
+    y = ((coordinates[:, 1] - extent[2]) / max(extent[3] - extent[2], 1e-12) * y_bins).astype(np.int64)
+    inside = (x >= 0) & (x <= x_bins) & (y >= 0) & (y <= y_bins)
+    cells = np.minimum(y[inside], y_bins - 1) * x_bins + np.minimum(x[inside], x_bins - 1)
 
-    # convert embeddings to df
-    embeddings = processes_integer_labeled_embeddings(embedding_file, node_label_dict, node_list)
-    embedding_data = pd.DataFrame(embeddings, columns=['node_type', 'node', 'embedding'])
-    embedding_data.to_pickle('./resources/embeddings/PheKnowLator_embedding_dataframe')
+    layers = np.bincount(codes[inside].astype(np.int64) * (x_bins * y_bins) + cells,
+                         minlength=len(type_colors) * x_bins * y_bins).reshape(len(type_colors), -1)
+    counts = layers.sum(axis=0)
+
+    rgb = np.array([mcolors.to_rgb(color) for color in type_colors], dtype=np.float32)
+    image = np.zeros((x_bins * y_bins, 4), dtype=np.float32)
+    image[:, :3] = (layers.T @ rgb) / np.maximum(counts, 1)[:, None]
+    image[:, 3] = np.log1p(counts) / np.log1p(max(counts.max(), 1))
+
+    return image.reshape(y_bins, x_bins, 4), extent
+
+
+def plots_embedding_density(coordinates, codes, type_colors, legend_arg, label_size, title, title_size,
+                            bins=(900, 600), overlay=0, seed=1, output=None):
+    """Plots projected embeddings as a density image (see rasterizes_density) drawn with a single imshow call, so the
+    time to plot and the size of the figure do not grow with the number of points. A small random sample of the points
+    can be drawn on top.
+
+    Args:
+        coordinates (array): A NumPy array of two-dimensional coordinates, one row per point.
+        codes (array): A NumPy integer array holding the node type of each point (positions in type_colors).
+        type_colors (list): A list of matplotlib colors, one per node type.
+        legend_arg (list): The legend handles, font size, location, and number of columns.
+        label_size (int): The font size of the tick labels.
+        title (str): The title of the plot.
+        title_size (int): The font size of the title.
+        bins (tuple): The number of pixels along the x and y axes.
+        overlay (int): The number of randomly sampled points drawn on top of the image.
+        seed (int): The seed of the overlaid sample.
+        output (str): An optional string naming an image file to save the plot to instead of showing it.
+
+    Returns:
+        None.
+    """
+
+    image, extent = rasterizes_density(coordinates, codes, type_colors, bins)
+
+    fig, ax = plt.subplots(figsize=(15, 10))
+    ax.imshow(image, extent=extent, origin='lower', aspect='auto', interpolation='nearest')
+
+    if overlay:
+        sample = np.random.default_rng(seed).choice(len(coordinates), min(overlay, len(coordinates)), replace=False)
+        ax.scatter(coordinates[sample, 0], coordinates[sample, 1], s=4, linewidths=0, alpha=0.8,
+                   c=[type_colors[code] for code in codes[sample]])
+
+    plt.legend(handles=legend_arg[0], fontsize=legend_arg[1], frameon=False, loc=legend_arg[2], ncol=legend_arg[3])
+
+    ax.tick_params(labelsize=label_size)
+    plt.title(title, fontsize=title_size)
+
+    if output is not None:
+        plt.savefig(output, dpi=100)
+    else:
+        plt.show()
+    plt.close()
+
+    return None
+
+
+def main():
 
     # DIMENSIONALITY REDUCTION
-    x_reduced = TruncatedSVD(n_components=50, random_state=1).fit_transform(list(embedding_data['embeddings']))
-    x_embedded = TSNE(n_components=2, random_state=1, verbose=True, perplexity=50.0).fit_transform(x_reduced)
+    node_types = {'HP': 'Phenotypes', 'CHEBI': 'Chemicals', 'VO': 'Vaccines', 'DOID': 'Diseases',
+                  'R-HSA': 'Pathways', 'GO': 'GO Concepts', 'geneid': 'Genes'}
+    rows, codes, x_embedded = projects_embeddings('./resources/graphs/out.txt', list(node_types),
+                                                  './resources/graphs/KG_triples_ints_map.json', project=True)
     np.save('./resources/graphs/ALL_KG_res_tsne', x_embedded)
 
     # PLOT T-SNE
@@ -94,13 +388,8 @@ def main():
               'GO Concepts': '#F79862',
               'Genes': '#4fb783',
               'Pathways': 'orchid',
-              'Phenotypes': '#A3B14B'}
-
-    names = {key: key for key in colors.keys()}
-
-    # create data frame to use for plotting data by node type
-    df = pd.DataFrame(dict(x=x_embedded[:, 0], y=x_embedded[:, 1], group=list(embedding_data['node_type'])))
-    groups = df.groupby('group')
+              'Phenotypes': '#A3B14B',
+              'Vaccines': '#8C564B'}
 
     # create legend arguments
     dis = mpatches.Patch(color='#009EFA', label='Diseases')
@@ -109,8 +398,10 @@ def main():
     ge = mpatches.Patch(color='#4fb783', label='Genes')
     pat = mpatches.Patch(color='orchid', label='Pathways')
     phe = mpatches.Patch(color='#A3B14B', label='Phenotypes')
+    vac = mpatches.Patch(color='#8C564B', label='Vaccines')
 
-    legend_args = [[dis, drg, go, ge, pat, phe], 14, 'lower center', 3]
+    legend_args = [[dis, drg, go, ge, pat, phe, vac], 14, 'lower center', 4]
     title = 't-SNE: Biological Knowledge Graph'
 
-    plots_embeddings(colors, names, groups, legend_args, 16, 100, title, 20)
+    plots_embedding_density(x_embedded, codes, [colors[name] for name in node_types.values()], legend_args, 16, title,
+                            20, overlay=5000)
@@ -4,46 +4,238 @@
 
 # import needed libraries
 import json
+import multiprocessing
+import numpy as np
+import os
+import shutil
 import subprocess
 import uuid
 
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
 from rdflib import Namespace
 from rdflib import Graph
 from rdflib.namespace import RDF
 from rdflib import URIRef
 from tqdm import tqdm
 
-from external_libraries.deepwalk_c_master.deepwalk.cli import *
+from scripts.python.Checksums import hashes_file, hashes_strings
+from scripts.python.DeductiveClosure import infers_closure_triples
+from scripts.python.GraphEncoding import reads_ntriples, writes_bcsr, writes_encoded_triples
+from scripts.python.Profiler import records_items, runs_profiled_command
+from scripts.python.TripleStore import TripleStore, creates_graph
+
+
+# namespace of the iris created for instances of classes
+class_instance_namespace = 'https://github.com/callahantiff/PheKnowLator/obo/ext/'
+
+# term classification used when stripping metadata nodes
+iri_prefix = 'http'
+type_suffix = 'ns#type'
+metadata_label = 'PheKnowLator'
+ntriple_line = '<{}> <{}> <{}> .\n'
+
+# class instance iri map shared with worker processes
+_metadata_iri_map = {}
+
+
+def plans_ontology_merges(ontology_list, cache_dir):
+    """Plans the merge of a list of ontologies as a balanced binary tree. Each level of the tree pairs up the
+    ontologies (or merged results) of the previous level, so the merges within a level are independent of each other.
+    Every merged result is named after a hash of its inputs: a leaf is keyed on the contents of its file and a merge on
+    the keys of the two results it combines, so a changed ontology only changes the keys on its path to the root.
+
+    Args:
+        ontology_list (list): A list of strings naming ontology file paths.
+        cache_dir (str): A string naming the directory that stores the merged results.
+
+    Returns:
+        A tuple of two items: a list of levels, where each level is a list of (ontology 1, ontology 2, output) tuples,
+        and a string naming the file path of the fully merged ontology.
+
+    Raises:
+        An exception is raised if the list of ontologies is empty.
+    """
+
+    if len(ontology_list) == 0:
+        raise Exception('ERROR: There are no ontologies to merge')
+
+    level = [(hashes_file(ontology), ontology) for ontology in ontology_list]
+    plan = []
+
+    while len(level) > 1:
+        merges, next_level = [], []
+
+        for i in range(0, len(level) - 1, 2):
+            (key1, ont1), (key2, ont2) = level[i], level[i + 1]
+            key = hashes_strings('merge', key1, key2)
+            output = os.path.join(cache_dir, key + '.owl')
+
+            merges.append((ont1, ont2, output))
+            next_level.append((key, output))
 
+        # an unpaired ontology moves up to the next level as-is
+        if len(level) % 2 == 1:
+            next_level.append(level[-1])
 
-def merges_ontologies(ontology_list):
-    """Takes a list of lists, where the each nested list contains a pair of ontologies and a file path. Using the
-    OWLTools API, each pair of ontologies is merged and saved locally to provied file path.
+        plan.append(merges)
+        level = next_level
+
+    return plan, level[0][1]
+
+
+def _merges_ontology_pair(merge):
+    """Uses the OWLTools API to merge a pair of ontologies. The result is written to a temporary file which is only
+    moved to the output location once OWLTools succeeds, so a failed merge never leaves a cached result behind.
 
     Args:
-        ontology_list (list): A nested list
+        merge (tuple): A tuple of three strings: the file paths of the two ontologies and of the merged output.
 
     Returns:
         None.
+
+    Raises:
+        An exception is raised if OWLTools fails to merge the ontologies.
     """
 
-    for ont in tqdm(ontology_list):
-        print('\nMerging Ontologies: {ont1}, {ont2}\n'.format(ont1=ont[0].split('/')[-1],
-                                                              ont2=ont[1].split('/')[-1]))
+    ont1, ont2, output = merge
+    print('\nMerging Ontologies: {ont1}, {ont2}\n'.format(ont1=ont1.split('/')[-1], ont2=ont2.split('/')[-1]))
 
-        try:
-            subprocess.check_call(['./resources/lib/owltools',
-                                   str(ont[0]),
-                                   str(ont[1]),
-                                   '--merge-support-ontologies',
-                                   '-o',
-                                   str(ont[2]) + '_merged.owl'])
+    try:
+        runs_profiled_command(['./resources/lib/owltools',
+                               str(ont1),
+                               str(ont2),
+                               '--merge-support-ontologies',
+                               '-o',
+                               output + '.tmp'], 'owltools merge')
+
+    except subprocess.CalledProcessError as error:
+        print(error.output)
+        raise Exception('ERROR: Unable to merge {ont1} and {ont2}'.format(ont1=ont1, ont2=ont2))
+
+    os.replace(output + '.tmp', output)
 
-        except subprocess.CalledProcessError as error:
-            print(error.output)
+    return None
 
 
-def creates_knowledge_graph_edges(edge_dict, data_type, graph, output_loc, kg_class_iri_map=None):
+def merges_ontologies(ontology_list, output, cache_dir='./resources/ontologies/merged_ontologies/cache/',
+                      processes=None):
+    """Takes a list of ontologies and merges them with the OWLTools API as a balanced binary tree (see
+    plans_ontology_merges). The independent merges within each level of the tree run concurrently. Merged results are
+    cached under a hash of their inputs, so merges whose inputs are unchanged since a previous build are skipped and
+    only the merges on the path from a changed ontology to the root are redone. The fully merged ontology is copied to
+    output.
+
+    Args:
+        ontology_list (list): A list of strings naming ontology file paths.
+        output (str): A string naming the file path to write the merged ontology to.
+        cache_dir (str): A string naming the directory that stores the intermediate merged results.
+        processes (int): The maximum number of concurrent merges (defaults to the number of CPUs).
+
+    Returns:
+        None.
+    """
+
+    os.makedirs(cache_dir, exist_ok=True)
+    plan, merged_ontology = plans_ontology_merges(ontology_list, cache_dir)
+
+    with ThreadPoolExecutor(max_workers=processes or multiprocessing.cpu_count()) as executor:
+        for level in tqdm(plan):
+            merges = [merge for merge in level if not os.path.exists(merge[2])]
+            print('\nMerging {n} ontology pairs ({m} cached)\n'.format(n=len(merges), m=len(level) - len(merges)))
+
+            list(executor.map(_merges_ontology_pair, merges))
+
+    shutil.copyfile(merged_ontology, output)
+
+    return None
+
+
+def counts_nodes(graph):
+    """Counts the distinct subjects and objects of a graph. For graphs backed by a TripleStore the count is computed
+    from the integer encoded triples, without creating a set of every node.
+
+    Args:
+        graph (graph): An RDFlib graph object.
+
+    Returns:
+        An integer.
+    """
+
+    if isinstance(graph.store, TripleStore):
+        return graph.store.counts_nodes()
+
+    return len(set(str(node) for edge in graph for node in edge[0::2]))
+
+
+def creates_class_instance_iri(class_iri, deterministic=False):
+    """Creates the iri for an instance of a class. By default a random uuid (uuid4) is used, so each build produces
+    different iris. When deterministic is True the uuid is derived from the class iri (uuid5), so the same class always
+    gets the same instance iri, across builds and across independently built parts of the knowledge graph.
+
+    Args:
+        class_iri (str): A string containing the iri of a class.
+        deterministic (bool): If True, the instance iri is derived from the class iri.
+
+    Returns:
+        A string containing the iri for the instance of the class.
+    """
+
+    if deterministic:
+        return class_instance_namespace + str(uuid.uuid5(uuid.NAMESPACE_URL, class_iri))
+    else:
+        return class_instance_namespace + str(uuid.uuid4())
+
+
+def generates_edge_triples(edge_info, data_type, kg_class_iri_map=None, deterministic_iris=False):
+    """Generates the triples for the edge list of a single data source.
+
+    If the data_type is 'class' two triples are created for each edge: (1) instance of class and (2) class instance to
+    instance. The instance of the class is also added to a dictionary that maps the class instance to its class.
+
+    If the data_type is not 'class' then a single triple is created for each edge.
+
+    Args:
+        edge_info (dict): A dictionary of edge information for a data source (see EdgeDictionary.EdgeList.source_info)
+        data_type (str): A string naming the data type (i.e. class or other)
+        kg_class_iri_map (dict): A dictionary that is used to store the mapping between a class and its instance
+        deterministic_iris (bool): If True, class instance iris are derived from the class iri instead of being random
+            (see creates_class_instance_iri)
+
+    Returns:
+        A generator of tuples, where each tuple contains the string subject, predicate, and object of a triple.
+    """
+
+    obo = 'http://purl.obolibrary.org/obo/'
+    relation = obo + edge_info['edge_relation']
+
+    if data_type == 'class':
+        class_loc = edge_info['data_type'].split('-').index('class')
+        inst_loc = edge_info['data_type'].split('-').index('instance')
+
+    for edge in edge_info['edge_list']:
+        if data_type == 'class':
+            class_iri = edge_info['uri'][class_loc] + edge[class_loc]
+
+            # add uuid for class-instance to dictionary - but check if one has been created first
+            if class_iri in kg_class_iri_map:
+                ont_class_iri = kg_class_iri_map[class_iri]
+            else:
+                ont_class_iri = creates_class_instance_iri(class_iri, deterministic_iris)
+                kg_class_iri_map[class_iri] = ont_class_iri
+
+            # add instance of class and relation between instance of class and instance
+            yield ont_class_iri, str(RDF.type), class_iri
+            yield ont_class_iri, relation, edge_info['uri'][inst_loc] + edge[inst_loc]
+
+        else:
+            # add instance-instance and class-class edges
+            yield edge_info['uri'][0] + edge[0], relation, edge_info['uri'][1] + edge[1]
+
+
+def creates_knowledge_graph_edges(edge_dict, data_type, graph, output_loc, kg_class_iri_map=None,
+                                  deterministic_iris=False):
     """Takes a nested dictionary of edge lists creates and adds new edges.
 
     If the data_type is 'class' two types of edges are created: (1) instance of class and (2) class instance to
@@ -57,18 +249,16 @@ def creates_knowledge_graph_edges(edge_dict, data_type, graph, output_loc, kg_cl
         graph (class): An rdflib graph
         output_loc (str): Name and file path to write knowledge graph to
         kg_class_iri_map (dict): An empty dictionary that is used to store the mapping between a class and its instance
+        deterministic_iris (bool): If True, class instance iris are derived from the class iri instead of being random
+            (see creates_class_instance_iri)
 
     Returns:
         An rdflib graph is returned and written to the location specified in input arguments
     """
 
-    # define namespaces
-    class_inst_ns = Namespace('https://github.com/callahantiff/PheKnowLator/obo/ext/')
-    obo = Namespace('http://purl.obolibrary.org/obo/')
-
     # get number of starting edges
     start_edges = len(graph)
-    start_nodes = len(set([str(node) for edge in list(graph) for node in edge[0::2]]))
+    start_nodes = counts_nodes(graph)
 
     # print message
     if data_type == 'class':
@@ -82,37 +272,13 @@ def creates_knowledge_graph_edges(edge_dict, data_type, graph, output_loc, kg_cl
 
     # loop over classes to create instances
     for source in tqdm(edge_dict):
-        for edge in edge_dict[source]['edge_list']:
-            if data_type == 'class':
-                class_loc = edge_dict[source]['data_type'].split('-').index('class')
-                inst_loc = edge_dict[source]['data_type'].split('-').index('instance')
-
-                # add uuid for class-instance to dictionary - but check if one has been created first
-                if str(edge_dict[source]['uri'][class_loc] + edge[class_loc]) in kg_class_iri_map.keys():
-                    ont_class_iri = kg_class_iri_map[str(edge_dict[source]['uri'][class_loc] + edge[class_loc])]
-                else:
-                    ont_class_iri = class_inst_ns + str(uuid.uuid4())
-                    kg_class_iri_map[str(edge_dict[source]['uri'][class_loc] + edge[class_loc])] = ont_class_iri
-
-                # add instance of class
-                graph.add((URIRef(ont_class_iri),
-                           RDF.type,
-                           URIRef(str(edge_dict[source]['uri'][class_loc] + edge[class_loc]))))
-
-                # add relation between instance of class and instance
-                graph.add((URIRef(ont_class_iri),
-                           URIRef(str(obo + edge_dict[source]['edge_relation'])),
-                           URIRef(str(edge_dict[source]['uri'][inst_loc] + edge[inst_loc]))))
-
-            else:
-                # add instance-instance and class-class edges
-                graph.add((URIRef(str(edge_dict[source]['uri'][0] + edge[0])),
-                           URIRef(str(obo + edge_dict[source]['edge_relation'])),
-                           URIRef(str(edge_dict[source]['uri'][1] + edge[1]))))
+        for edge in generates_edge_triples(edge_dict[source], data_type, kg_class_iri_map, deterministic_iris):
+            graph.add((URIRef(edge[0]), URIRef(edge[1]), URIRef(edge[2])))
 
     # get node and edge count
     end_edges = len(graph)
-    end_nodes = len(set([str(node) for edge in list(graph) for node in edge[0::2]]))
+    records_items(end_edges - start_edges, 'edges')
+    end_nodes = counts_nodes(graph)
     print('\nKG started with {s1}, {s2} nodes/edges and ended with {s3}, {s4} nodes/edges\n'.format(s1=start_nodes,
                                                                                                     s2=start_edges,
                                                                                                     s3=end_nodes,
@@ -129,10 +295,11 @@ def creates_knowledge_graph_edges(edge_dict, data_type, graph, output_loc, kg_cl
 
 
 def removes_disointness_axioms(graph, output):
-    """Queries an RDFLib graph object to identify and remove all disjoint axioms.
+    """Identifies and removes all disjoint axioms from an RDFLib graph object, using triple pattern lookups so that
+    graphs backed by a TripleStore are not scanned by a SPARQL query.
 
     Args:
-        graph (graph): An RDFlib graph object with disjoint axioms
+        graph (graph): An RDFlib graph object with disjoint axioms (with any store, e.g. TripleStore)
         output (str): A string naming a file path to write out results
 
     Returns:
@@ -143,26 +310,20 @@ def removes_disointness_axioms(graph, output):
     print('Removing Disjointness Axioms')
     print('=' * len('Removing Disjoint Axioms') + '\n')
 
-    # query graph to find disjoint axioms
+    # find disjoint axioms between classes
     owl = Namespace("http://www.w3.org/2002/07/owl#")
 
-    results = graph.query(
-        """SELECT DISTINCT ?source ?c
-           WHERE {
-              ?c rdf:type owl:Class .
-              ?c owl:disjointWith ?source .}
-           """, initNs={"rdf": 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
-                        "owl": 'http://www.w3.org/2002/07/owl#',
-                        "oboInOwl": 'http://www.geneontology.org/formats/oboInOwl#'})
+    results = set((source, c) for c, _, source in graph.triples((None, owl.disjointWith, None))
+                  if (c, RDF.type, owl.Class) in graph)
 
-    print('Identified and Removed {disjoint} Disjointness Axioms\n'.format(disjoint=len(list(results))))
+    print('Identified and Removed {disjoint} Disjointness Axioms\n'.format(disjoint=len(results)))
 
     # remove disjoint axioms
     graph.remove((None, URIRef(str(owl) + 'disjointWith'), None))
 
     # get node and edge count
     edge_count = len(graph)
-    node_count = len(set([str(node) for edge in list(graph) for node in edge[0::2]]))
+    node_count = counts_nodes(graph)
     print('\nKG ended with {node} nodes and {edge} edges\n'.format(node=node_count, edge=edge_count))
 
     # serialize graph
@@ -171,14 +332,21 @@ def removes_disointness_axioms(graph, output):
     return None
 
 
-def closes_knowledge_graph(graph, reasoner, output):
+def closes_knowledge_graph(graph, reasoner, output, backend='rdflib'):
     """Use OWLTools via the command line and to run reasoners to deductively close an input graph. The resulting
     graph is then serialized.
 
+    When the reasoner is 'native', the graph is instead closed in-process with sparse matrices (see
+    DeductiveClosure.infers_closure_triples), which covers subclass transitivity and the inheritance of types by
+    instances. The input triples and the inferred triples are written to output as RDF/XML, the same format as the
+    owltools output, so both reasoners can feed the same downstream steps (e.g. RDFXMLReader.reads_rdfxml).
+
     Args:
         graph (str): A file path/file storing an RDF graph
-        reasoner (str): A string indicating the type of reasoner that should be used
+        reasoner (str): A string indicating the type of reasoner that should be used (e.g. 'elk' or 'native')
         output (str): A string containing the name and file path to write out results
+        backend (str): A string naming the store used to hold the graph for the 'native' reasoner (see
+            TripleStore.creates_graph)
 
     Returns:
         None.
@@ -188,15 +356,28 @@ def closes_knowledge_graph(graph, reasoner, output):
     print('Closing Knowledge Graph using the {reasoner} Reasoner'.format(reasoner=reasoner.upper()))
     print('=' * len('Closing Knowledge Graph using the {reasoner} Reasoner'.format(reasoner=reasoner.upper())))
 
+    if reasoner == 'native':
+        kg = creates_graph(backend).parse(graph)
+        inferred = infers_closure_triples(kg)
+        print('\nInferred {edge} new edges\n'.format(edge=len(inferred)))
+
+        for edge in inferred:
+            kg.add((URIRef(edge[0]), URIRef(edge[1]), URIRef(edge[2])))
+        records_items(len(kg), 'triples')
+
+        kg.serialize(destination=output, format='xml')
+
+        return None
+
     # set command line argument
     try:
-        subprocess.check_call(['./resources/lib/owltools',
+        runs_profiled_command(['./resources/lib/owltools',
                                str(graph),
-                               '--reasoner ' + str(reasoner),
+                               '--reasoner', str(reasoner),
                                '--run-reasoner',
                                '--assert-implied',
                                '-o',
-                               '.' + str(output).split('.')[1] + '_Closed_' + str(reasoner).upper() + '.owl'])
+                               str(output)], 'owltools ' + str(reasoner))
 
     except subprocess.CalledProcessError as error:
         print(error.output)
@@ -204,19 +385,102 @@ def closes_knowledge_graph(graph, reasoner, output):
     return None
 
 
-def removes_metadata_nodes(graph, output, iri_mapper):
-    """Queries the RDFLib graph object to identify only those subjects, objects, and predicates that are
+def _initializes_metadata_worker(iri_map):
+    """Stores the class instance iri-class identifier map in each worker process used by removes_metadata_nodes.
+
+    Args:
+        iri_map (dict): A dictionary mapping class instance iris to class identifiers.
+
+    Returns:
+        None.
+    """
+
+    global _metadata_iri_map
+    _metadata_iri_map = iri_map
+
+    return None
+
+
+def _strips_metadata_triples(triples):
+    """Classifies each term of a chunk of string triples once and converts the eligible triples into N-Triples lines.
+    Triples containing a term that is not an IRI, a '#' IRI node (e.g. owl:Class), an rdf:type predicate, or a
+    PheKnowLator metadata IRI are dropped. Triples with a class instance node are rewritten to use the class identifier.
+
+    Args:
+        triples (list): A list of tuples, where each tuple contains the string subject, predicate, and object.
+
+    Returns:
+        A tuple of two lists of N-Triples lines: the triples kept as-is and the triples rewritten from class instances.
+    """
+
+    kept, rewritten = [], []
+    iri_map = _metadata_iri_map
+
+    for subj, pred, obj in triples:
+        if not (subj.startswith(iri_prefix) and pred.startswith(iri_prefix) and obj.startswith(iri_prefix)):
+            continue
+
+        is_type = pred.endswith(type_suffix)
+
+        if obj in iri_map and not is_type:
+            rewritten.append(ntriple_line.format(subj, pred, iri_map[obj]))
+        elif subj in iri_map:
+            rewritten.append(ntriple_line.format(iri_map[subj], pred, obj))
+        elif obj in iri_map:
+            continue
+        elif '#' in subj or '#' in obj or is_type:
+            continue
+        elif metadata_label in subj or metadata_label in pred or metadata_label in obj:
+            continue
+        else:
+            kept.append(ntriple_line.format(subj, pred, obj))
+
+    return kept, rewritten
+
+
+def _chunks_triples(graph, chunk_size):
+    """Streams the triples of an RDFLib graph (or any iterable of triples) as lists of string triples.
+
+    Args:
+        graph (graph): An RDFlib graph object or an iterable of triples.
+        chunk_size (int): The number of triples in each chunk.
+
+    Returns:
+        A generator of lists, where each list contains at most chunk_size tuples of string triples.
+    """
+
+    triples = iter(graph)
+
+    while True:
+        chunk = [(str(edge[0]), str(edge[1]), str(edge[2])) for edge in islice(triples, chunk_size)]
+
+        if not chunk:
+            break
+
+        yield chunk
+
+
+def removes_metadata_nodes(graph, output, iri_mapper, processes=None, chunk_size=100000):
+    """Streams the triples of an RDFLib graph object to identify only those subjects, objects, and predicates that are
     RDfResources. From this filtered output, the results are further reduced to remove any triples that are: class
-    instance-rdf:Type-owl:NamedIndividual or instance-rdf:Type-owl:Class.
+    instance-rdf:Type-owl:NamedIndividual or instance-rdf:Type-owl:Class. Triples are classified in chunks by a pool of
+    worker processes and the eligible triples are written straight to an N-Triples file, in input order.
+
+    NOTE. A triple can be produced more than once (e.g. a triple rewritten from a class instance which is also
+    asserted for the class itself, or a repeated triple in an N-Triples input), so each line is only written the first
+    time it is produced. Like the graph the triples used to be collected into, the set of written lines grows with the
+    output.
 
     Args:
-        graph (graph): An RDFlib graph object with disjoint axioms.
-        output (str): A string containing the name and file path to write out results.
+        graph (graph): An RDFlib graph object with disjoint axioms or an iterable of triples (e.g. reads_ntriples or
+            RDFXMLReader.reads_rdfxml).
+        output (str): A string containing the name and file path to write out results (N-Triples).
         iri_mapper (str): A string naming the location of the class instance iri-class identifier map.
+        processes (int): The number of worker processes to use (defaults to the number of CPUs).
+        chunk_size (int): The number of triples sent to a worker process at a time.
 
     Returns:
-        An rdflib graph with metadata nodes removed is returned and written to the location specified in input
-        arguments.
+        None.
     """
 
     print('\n\n' + '=' * len('Removing Metadata Nodes'))
@@ -226,46 +490,76 @@ def removes_metadata_nodes(graph, output, iri_mapper):
     # read in and reverse dictionary to map iris back to labels
     iri_map = {val: key for (key, val) in json.load(open(iri_mapper)).items()}
 
-    # from those triples with URI, remove triples that are about instances of classes
-    update_graph = Graph()
+    # classify chunks of triples in parallel and write eligible edges to file in input order
+    written = set()
+    processes = processes or multiprocessing.cpu_count()
 
-    # loop over results and add eligible edges to new graph
-    for edge in tqdm(list(graph)):
-        if not any(str(x) for x in edge if not str(x).startswith('http')):
+    with open(output, 'w') as outfile:
+        if processes > 1:
+            pool = multiprocessing.Pool(processes, initializer=_initializes_metadata_worker, initargs=(iri_map,))
+            results = pool.imap(_strips_metadata_triples, _chunks_triples(graph, chunk_size))
+        else:
+            pool = None
+            _initializes_metadata_worker(iri_map)
+            results = map(_strips_metadata_triples, _chunks_triples(graph, chunk_size))
 
-            if any(x for x in edge[0::2] if str(x) in iri_map.keys()):
-                if str(edge[2]) in iri_map.keys() and 'ns#type' not in str(edge[1]):
-                    update_graph.add((edge[0], edge[1], URIRef(iri_map[str(edge[2])])))
+        try:
+            for kept, rewritten in tqdm(results):
+                for line in kept + rewritten:
+                    if line not in written:
+                        written.add(line)
+                        outfile.write(line)
 
-                else:
-                    update_graph.add((URIRef(iri_map[str(edge[0])]), edge[1], edge[2]))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
 
-            elif not any(str(x) for x in edge[0::2] if '#' in str(x)):
-                if not any(str(x) for x in edge if ('ns#type' in str(x)) or ('PheKnowLator' in str(x))):
-                    update_graph.add(edge)
+    print('\nKG has {edge} edges\n'.format(edge=len(written)))
+    records_items(len(written), 'edges')
 
-            else:
-                pass
+    return None
 
-    # get node and edge count
-    edge_count = len(update_graph)
-    node_count = len(set([str(node) for edge in list(update_graph) for node in edge[0::2]]))
-    print('\nKG has {node} nodes and {edge} edges\n'.format(node=node_count, edge=edge_count))
 
-    # serialize edges
-    update_graph.serialize(destination=output, format='xml')
+def _writes_edge_list(subjects, objects, output, chunk_size=1000000):
+    """Writes an integer edge list as a tab-separated text file, formatting chunk_size edges at a time with a single
+    string format operation (several times faster than numpy.savetxt, which formats every row on its own).
 
-    return update_graph
+    Args:
+        subjects (array): A NumPy integer array of subject identifiers.
+        objects (array): A NumPy integer array of object identifiers.
+        output (str): A string naming the file path to write the edge list to.
+        chunk_size (int): The number of edges formatted at a time.
 
+    Returns:
+        None.
+    """
 
-def maps_str_to_int(graph, output_trip_ints, output_map):
-    """Converts nodes with string labels to integers and saves this mapping to a dictionary. Two text files are saved
-    locally, the original labeled edges and edges with the labels replaced by integers.
+    with open(output, 'w') as outfile:
+        for start in range(0, len(subjects), chunk_size):
+            edges = np.column_stack((subjects[start:start + chunk_size], objects[start:start + chunk_size]))
+            outfile.write('%d\t%d\n' * len(edges) % tuple(edges.ravel().tolist()))
+
+    return None
+
+
+def maps_str_to_int(graph, output_trip_ints, output_map=None, undirected=False, edge_list=True):
+    """Converts nodes and relations with string labels to integers in a single pass over the triples. The subject,
+    predicate, and object integers are saved as memory-mappable NumPy int32 arrays and the node and relation labels as
+    sorted string tables (see GraphEncoding.writes_encoded_triples), using the output_trip_ints file name without its
+    extension as the file prefix. The node-only edge list is written as a de-duplicated binary compressed sparse row
+    graph to the same prefix with a '.bcsr' extension for input to deepwalk-c and, unless edge_list is False, as text
+    to output_trip_ints.
 
     Args:
-        graph (graph): An rdflib graph is returned and written to the location specified in input arguments.
+        graph (graph): An RDFlib graph object or an iterable of triples (e.g. reads_ntriples or
+            RDFXMLReader.reads_rdfxml).
         output_trip_ints (str): A string naming the name and file path to write out results.
-        output_map (str): A string naming the name and file path to write out results.
+        output_map (str): An optional string naming the name and file path to export the node label-integer map to as
+            a json file.
+        undirected (bool): If True, the bcsr graph contains each edge in both directions.
+        edge_list (bool): If False, the text edge list is not written (e.g. when only the bcsr graph and the encoded
+            arrays are used).
 
     Returns:
         None.
@@ -275,52 +569,23 @@ def maps_str_to_int(graph, output_trip_ints, output_map):
     print('Mapping Integer Node Labels to String Label')
     print('=' * len('Mapping Integer Node Labels to String Label') + '\n')
 
-    # create dictionary for mapping and list to write edges to
-    node_map = {}
-    update_graph_ints = []
-
-    # build graph from input file and set int counter
-    node_counter = 0
-
-    # open file to write to
-    out1 = open(output_trip_ints, 'w')
-    out2 = open('_'.join(output_trip_ints.split('_')[:-1]) + '_Labels.txt', 'w')
-
-    for edge in tqdm(graph):
-        if str(edge[0]) not in node_map:
-            node_counter += 1
-            node_map[str(edge[0])] = node_counter
-        if str(edge[1]) not in node_map:
-            node_counter += 1
-            node_map[str(edge[1])] = node_counter
-        if str(edge[2]) not in node_map:
-            node_counter += 1
-            node_map[str(edge[2])] = node_counter
-
-        # convert edge labels to ints
-        update_graph_ints.append([node_map[str(edge[0])], node_map[str(edge[1])], node_map[str(edge[2])]])
-
-        # write edge to text file
-        out1.write('%d' % node_map[str(edge[0])] + '\t' +
-                   # '%d' % node_map[str(edge[1])] + '\t' +
-                   '%d' % node_map[str(edge[2])] + '\n')
-
-        # out2.write(str(edge[0]) + '\t' + str(edge[1]) + '\t' + str(edge[2]) + '\n')
-        out2.write(str(edge[0]) + '\t' + str(edge[2]) + '\n')
-
-    # close file
-    out1.close()
-    out2.close()
-
-    # write bcsr file for input to deepwalk-c
-    process('edgelist', None, 'directed', '\t', output_trip_ints, output_trip_ints.split('.')[0] + '.bcsr')
-
-    # CHECK - verify we get the number of edges that we would expect to get
-    if len(graph) != len(update_graph_ints):
-        raise Exception('ERROR: The number of triples is incorrect!')
-    else:
-        # write string-to-int dictionary to file
+    # encode triples and write integer arrays and label tables
+    output_prefix = output_trip_ints.rsplit('.', 1)[0]
+    subjects, predicates, objects, node_list, relation_list = writes_encoded_triples(graph, output_prefix)
+
+    print('\nKG has {node} nodes, {rel} relations, and {edge} edges\n'.format(node=len(node_list),
+                                                                            rel=len(relation_list),
+                                                                            edge=len(subjects)))
+    records_items(len(subjects), 'triples')
+
+    # write edge list and bcsr file for input to deepwalk-c
+    if edge_list:
+        _writes_edge_list(subjects, objects, output_trip_ints)
+    writes_bcsr(subjects, objects, output_prefix + '.bcsr', len(node_list), undirected)
+
+    # write string-to-int dictionary to file
+    if output_map is not None:
         with open(output_map, 'w') as fp:
-            json.dump(node_map, fp)
+            json.dump(dict(zip(node_list, range(len(node_list)))), fp)
 
     return None
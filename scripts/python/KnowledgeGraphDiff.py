@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import argparse
+import heapq
+import json
+import numpy as np
+import os
+import re
+
+from array import array
+from itertools import count, repeat
+from tqdm import tqdm
+
+from scripts.python.Checksums import hashes_file
+from scripts.python.GraphEncoding import reads_encoded_triples, reads_ntriples, writes_encoded_triples
+from scripts.python.KnowledgeGraph import ntriple_line
+from scripts.python.RDFXMLReader import reads_rdfxml
+
+
+# the namespace of an iri is everything up to its last '/', '#', or '_' (e.g. 'http://purl.obolibrary.org/obo/HP_')
+namespace_pattern = re.compile(r'^(.*[/#_])[^/#_]*$')
+
+
+def gets_namespace(iri):
+    """Gets the namespace of an iri.
+
+    Args:
+        iri (str): A string containing an iri.
+
+    Returns:
+        A string containing the namespace (the iri itself if it has no '/', '#', or '_').
+    """
+
+    match = namespace_pattern.match(iri)
+
+    return match.group(1) if match else iri
+
+
+def reads_build(build, work_dir='./resources/kg_diff/'):
+    """Opens the integer encoding of a knowledge graph build. A build is either the file path prefix (or the
+    output_trip_ints file name) of the files written by KnowledgeGraph.maps_str_to_int or a knowledge graph file, which
+    is encoded once and cached in work_dir under its SHA-256 digest. N-Triples files are expected to contain only iris
+    (e.g. the output of removes_metadata_nodes), all other files are read as RDF/XML.
+
+    Args:
+        build (str): A string naming an encoded knowledge graph or a knowledge graph file.
+        work_dir (str): A string naming the directory to cache encoded knowledge graph files in.
+
+    Returns:
+        A tuple of five items: three NumPy int32 arrays holding the subject, predicate, and object identifier of each
+        triple, the node StringTable, and the relation StringTable.
+
+    Raises:
+        An exception is raised if the build does not exist.
+    """
+
+    for prefix in (build, build.rsplit('.', 1)[0]):
+        if os.path.exists(prefix + '_Subjects.npy'):
+            return reads_encoded_triples(prefix)
+
+    if not os.path.isfile(build):
+        raise Exception('ERROR: {} is neither an encoded knowledge graph nor a knowledge graph file'.format(build))
+
+    prefix = os.path.join(work_dir, hashes_file(build))
+
+    if not os.path.exists(prefix + '_Subjects.npy'):
+        print('Encoding: {}'.format(build))
+        os.makedirs(work_dir, exist_ok=True)
+        writes_encoded_triples(reads_ntriples(build) if build.endswith('.nt') else reads_rdfxml(build), prefix)
+
+    return reads_encoded_triples(prefix)
+
+
+class MergedVocabulary(object):
+    """Class provides read access to the sorted union of two sorted string tables without materializing it: a merged
+    identifier is decoded by finding it in the (increasing) identifier maps of the two tables (see
+    _merges_vocabularies).
+
+    Args:
+        first (StringTable): A sorted string table.
+        second (StringTable): A sorted string table.
+        first_ids (array): A NumPy int64 array mapping the identifiers of the first table to merged identifiers.
+        second_ids (array): A NumPy int64 array mapping the identifiers of the second table to merged identifiers.
+        size (int): The number of strings in the union of both tables.
+
+    """
+
+    def __init__(self, first, second, first_ids, second_ids, size):
+
+        self.first, self.second = first, second
+        self.first_ids, self.second_ids = first_ids, second_ids
+        self.size = size
+
+    def __len__(self):
+
+        return self.size
+
+    def __getitem__(self, index):
+
+        return self.gets_strings([index])[0]
+
+    def __iter__(self):
+
+        previous = None
+
+        for key, _, _ in _streams_merged_keys(self.first, self.second):
+            if key != previous:
+                previous = key
+                yield key.decode('utf-8')
+
+    def gets_strings(self, ids):
+        """Decodes an array of merged identifiers.
+
+        Args:
+            ids (array): A NumPy integer array (or list) of merged identifiers.
+
+        Returns:
+            A list of strings.
+        """
+
+        ids = np.asarray(ids, dtype=np.int64)
+        first = np.minimum(np.searchsorted(self.first_ids, ids), max(len(self.first_ids) - 1, 0))
+        in_first = self.first_ids[first] == ids if len(self.first_ids) else np.zeros(len(ids), dtype=bool)
+        second = np.searchsorted(self.second_ids, ids).tolist()
+
+        return [self.first[f] if found else self.second[s]
+                for f, s, found in zip(first.tolist(), second, in_first.tolist())]
+
+
+def _streams_merged_keys(first, second, chunk_size=100000):
+    """Merges the streams of the strings of two sorted string tables (see StringTable.iterates_bytes) into one sorted
+    stream, where a string held by both tables is yielded once per table, first table first.
+
+    Args:
+        first (StringTable): A sorted string table.
+        second (StringTable): A sorted string table.
+        chunk_size (int): The number of strings read from each table at a time.
+
+    Returns:
+        A generator of tuples holding the UTF-8 encoded string, the table (0 or 1), and the identifier in that table.
+    """
+
+    return heapq.merge(*[zip(table.iterates_bytes(chunk_size), repeat(number), count())
+                         for number, table in enumerate((first, second))])
+
+
+def _merges_vocabularies(first, second, chunk_size=100000):
+    """Merges two sorted string tables into one sorted vocabulary with a streaming two-way merge over the stored bytes,
+    so memory is bounded by chunk_size and the two identifier maps: equal strings of both tables get the same merged
+    identifier.
+
+    Args:
+        first (StringTable): A sorted string table.
+        second (StringTable): A sorted string table.
+        chunk_size (int): The number of strings read from each table at a time.
+
+    Returns:
+        A MergedVocabulary holding two NumPy int64 arrays that map the identifiers of each table to merged identifiers.
+    """
+
+    ids, previous, position = (array('q'), array('q')), None, -1
+
+    for key, table, _ in tqdm(_streams_merged_keys(first, second, chunk_size), total=len(first) + len(second)):
+        if key != previous:
+            previous, position = key, position + 1
+        ids[table].append(position)
+
+    return MergedVocabulary(first, second, np.frombuffer(ids[0], dtype=np.int64),
+                            np.frombuffer(ids[1], dtype=np.int64), position + 1)
+
+
+def _encodes_keys(subjects, predicates, objects, node_ids, relation_ids, num_nodes, chunk_size):
+    """Converts the triples of a build to sorted, de-duplicated 64-bit keys in the shared encoding. Keys are ordered by
+    predicate, then subject, then object.
+
+    Args:
+        subjects (array): A NumPy int32 array of subject identifiers.
+        predicates (array): A NumPy int32 array of predicate identifiers.
+        objects (array): A NumPy int32 array of object identifiers.
+        node_ids (array): A NumPy int64 array mapping the node identifiers of the build to shared identifiers.
+        relation_ids (array): A NumPy int64 array mapping the relation identifiers of the build to shared identifiers.
+        num_nodes (int): The number of shared node identifiers.
+        chunk_size (int): The number of triples converted at a time.
+
+    Returns:
+        A sorted NumPy uint64 array of unique keys.
+    """
+
+    keys = np.empty(len(subjects), dtype=np.uint64)
+    num_nodes = np.uint64(num_nodes)
+
+    for start in range(0, len(subjects), chunk_size):
+        stop = start + chunk_size
+        keys[start:stop] = (relation_ids[predicates[start:stop]].astype(np.uint64) * num_nodes +
+                            node_ids[subjects[start:stop]].astype(np.uint64)) * num_nodes + \
+            node_ids[objects[start:stop]].astype(np.uint64)
+
+    keys.sort()
+
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+
+
+def _decodes_keys(keys, num_nodes):
+    """Converts keys back to shared subject, predicate, and object identifiers.
+
+    Args:
+        keys (array): A NumPy uint64 array of keys.
+        num_nodes (int): The number of shared node identifiers.
+
+    Returns:
+        A tuple of three NumPy int64 arrays holding the subject, predicate, and object identifiers.
+    """
+
+    num_nodes = np.uint64(num_nodes)
+
+    return ((keys // num_nodes) % num_nodes).astype(np.int64), (keys // (num_nodes * num_nodes)).astype(np.int64), \
+        (keys % num_nodes).astype(np.int64)
+
+
+def _subtracts_sorted(keys, other, chunk_size):
+    """Finds the keys missing from another sorted key array with a chunked sorted-array merge: each chunk of keys is
+    located in the slice of the other array spanning the same key range.
+
+    Args:
+        keys (array): A sorted NumPy uint64 array of unique keys.
+        other (array): A sorted NumPy uint64 array of unique keys.
+        chunk_size (int): The number of keys compared at a time.
+
+    Returns:
+        A sorted NumPy uint64 array of the keys which are not in other.
+    """
+
+    missing = [np.empty(0, dtype=np.uint64)]
+
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        window = other[np.searchsorted(other, chunk[0]):np.searchsorted(other, chunk[-1], 'right')]
+
+        if len(window) == 0:
+            missing.append(chunk)
+        else:
+            positions = np.minimum(np.searchsorted(window, chunk), len(window) - 1)
+            missing.append(chunk[window[positions] != chunk])
+
+    return np.concatenate(missing)
+
+
+def _counts_changes(keys, num_nodes, num_relations, node_namespaces, num_namespaces):
+    """Counts changed triples per predicate and per namespace. A triple counts once for each namespace of its subject
+    and object.
+
+    Args:
+        keys (array): A NumPy uint64 array of keys.
+        num_nodes (int): The number of shared node identifiers.
+        num_relations (int): The number of shared relation identifiers.
+        node_namespaces (array): A NumPy int64 array mapping each shared node identifier to a namespace identifier.
+        num_namespaces (int): The number of namespaces.
+
+    Returns:
+        A tuple of two NumPy int64 arrays, the counts per relation and the counts per namespace.
+    """
+
+    subjects, predicates, objects = _decodes_keys(keys, num_nodes)
+    subject_namespaces, object_namespaces = node_namespaces[subjects], node_namespaces[objects]
+
+    by_predicate = np.bincount(predicates, minlength=num_relations)
+    by_namespace = np.bincount(subject_namespaces, minlength=num_namespaces) + \
+        np.bincount(object_namespaces[object_namespaces != subject_namespaces], minlength=num_namespaces)
+
+    return by_predicate, by_namespace
+
+
+def writes_diff_triples(keys, nodes, relations, output):
+    """Writes the triples of a list of keys to an N-Triples file.
+
+    Args:
+        keys (array): A NumPy uint64 array of keys.
+        nodes (MergedVocabulary): The shared node vocabulary.
+        relations (MergedVocabulary): The shared relation vocabulary.
+        output (str): A string naming the N-Triples file to write.
+
+    Returns:
+        None.
+    """
+
+    with open(output, 'w') as outfile:
+        for start in range(0, len(keys), 100000):
+            subjects, predicates, objects = _decodes_keys(keys[start:start + 100000], len(nodes))
+            outfile.writelines(ntriple_line.format(s, p, o) for s, p, o in zip(
+                nodes.gets_strings(subjects), relations.gets_strings(predicates), nodes.gets_strings(objects)))
+
+    return None
+
+
+def _diffs_builds(old_build, new_build, work_dir, chunk_size):
+    """Moves two knowledge graph builds (see reads_build) into a shared integer encoding by merging their sorted node
+    and relation tables, converts each triple to a 64-bit key (predicate, subject, object), and diffs the sorted keys
+    with a chunked merge.
+
+    Args:
+        old_build (str): A string naming the build to compare against.
+        new_build (str): A string naming the build to compare.
+        work_dir (str): A string naming the directory to cache encoded knowledge graph files in.
+        chunk_size (int): The number of triples processed at a time.
+
+    Returns:
+        A dictionary holding the added and removed keys, the shared node and relation vocabularies, and the number of
+        triples
+        and nodes of each build.
+
+    Raises:
+        An exception is raised if the shared encoding does not fit into 64-bit keys.
+    """
+
+    old_subjects, old_predicates, old_objects, old_nodes, old_relations = reads_build(old_build, work_dir)
+    new_subjects, new_predicates, new_objects, new_nodes, new_relations = reads_build(new_build, work_dir)
+
+    # shared encoding
+    nodes, relations = _merges_vocabularies(old_nodes, new_nodes), _merges_vocabularies(old_relations, new_relations)
+
+    if len(relations) * len(nodes) ** 2 >= 2 ** 64:
+        raise Exception('ERROR: {} nodes and {} relations do not fit into 64-bit triple keys'.format(len(nodes),
+                                                                                                 len(relations)))
+
+    old_keys = _encodes_keys(old_subjects, old_predicates, old_objects, nodes.first_ids, relations.first_ids,
+                             len(nodes), chunk_size)
+    new_keys = _encodes_keys(new_subjects, new_predicates, new_objects, nodes.second_ids, relations.second_ids,
+                             len(nodes), chunk_size)
+
+    return {'added': _subtracts_sorted(new_keys, old_keys, chunk_size),
+            'removed': _subtracts_sorted(old_keys, new_keys, chunk_size),
+            'nodes': nodes, 'relations': relations,
+            'old_triples': len(old_keys), 'new_triples': len(new_keys),
+            'old_nodes': len(old_nodes), 'new_nodes': len(new_nodes)}
+
+
+def finds_changed_nodes(old_build, new_build, work_dir='./resources/kg_diff/', chunk_size=1000000):
+    """Finds the nodes whose neighborhood changed between two knowledge graph builds (see reads_build): the subjects
+    and objects of every added or removed triple, which includes every added node.
+
+    Args:
+        old_build (str): A string naming the build to compare against.
+        new_build (str): A string naming the build to compare.
+        work_dir (str): A string naming the directory to cache encoded knowledge graph files in.
+        chunk_size (int): The number of triples processed at a time.
+
+    Returns:
+        A sorted list of node iris.
+    """
+
+    diff = _diffs_builds(old_build, new_build, work_dir, chunk_size)
+    changed = np.zeros(len(diff['nodes']), dtype=bool)
+
+    for keys in (diff['added'], diff['removed']):
+        for start in range(0, len(keys), chunk_size):
+            subjects, _, objects = _decodes_keys(keys[start:start + chunk_size], len(diff['nodes']))
+            changed[subjects], changed[objects] = True, True
+
+    return diff['nodes'].gets_strings(np.flatnonzero(changed))
+
+
+def diffs_knowledge_graphs(old_build, new_build, work_dir='./resources/kg_diff/', triples_dir=None,
+                           chunk_size=1000000):
+    """Compares two knowledge graph builds (see reads_build). Both builds are moved into a shared integer encoding by
+    merging their sorted node and relation tables, each triple becomes a 64-bit key (predicate, subject, object), and
+    the sorted keys are diffed with a chunked merge. Beyond the two key arrays (8 bytes per triple), memory is bounded
+    by chunk_size. The added and removed triples are counted per predicate and per node namespace.
+
+    Args:
+        old_build (str): A string naming the build to compare against.
+        new_build (str): A string naming the build to compare.
+        work_dir (str): A string naming the directory to cache encoded knowledge graph files in.
+        triples_dir (str): An optional string naming a directory to write the added and removed triples to (as
+            Added.nt and Removed.nt).
+        chunk_size (int): The number of triples processed at a time.
+
+    Returns:
+        A dictionary containing the diff report.
+
+    Raises:
+        An exception is raised if the shared encoding does not fit into 64-bit keys.
+    """
+
+    print('\n\n' + '=' * len('Comparing Knowledge Graph Builds'))
+    print('Comparing Knowledge Graph Builds')
+    print('=' * len('Comparing Knowledge Graph Builds') + '\n')
+
+    diff = _diffs_builds(old_build, new_build, work_dir, chunk_size)
+    added, removed, nodes, relations = diff['added'], diff['removed'], diff['nodes'], diff['relations']
+
+    # count changes per predicate and namespace
+    namespaces = {}
+    node_namespaces = np.array([namespaces.setdefault(gets_namespace(node), len(namespaces)) for node in nodes],
+                               dtype=np.int64)
+    added_predicates, added_namespaces = _counts_changes(added, len(nodes), len(relations), node_namespaces,
+                                                         len(namespaces))
+    removed_predicates, removed_namespaces = _counts_changes(removed, len(nodes), len(relations), node_namespaces,
+                                                             len(namespaces))
+
+    report = {'old': old_build,
+              'new': new_build,
+              'triples': {'old': diff['old_triples'], 'new': diff['new_triples'], 'added': len(added),
+                          'removed': len(removed), 'unchanged': diff['old_triples'] - len(removed)},
+              'nodes': {'old': diff['old_nodes'], 'new': diff['new_nodes'],
+                        'added': len(nodes) - diff['old_nodes'], 'removed': len(nodes) - diff['new_nodes']},
+              'predicates': {relations[i]: {'added': int(added_predicates[i]), 'removed': int(removed_predicates[i])}
+                             for i in np.flatnonzero(added_predicates + removed_predicates)},
+              'namespaces': {namespace: {'added': int(added_namespaces[i]), 'removed': int(removed_namespaces[i])}
+                             for namespace, i in namespaces.items() if added_namespaces[i] + removed_namespaces[i]}}
+
+    print('Old build has {old} triples, new build has {new} triples: {add} added, {rem} removed\n'.format(
+        old=diff['old_triples'], new=diff['new_triples'], add=len(added), rem=len(removed)))
+
+    for relation, counts in sorted(report['predicates'].items(), key=lambda x: -(x[1]['added'] + x[1]['removed'])):
+        print('{:<80}{:>12}{:>12}'.format(relation, '+' + str(counts['added']), '-' + str(counts['removed'])))
+
+    if triples_dir is not None:
+        os.makedirs(triples_dir, exist_ok=True)
+        writes_diff_triples(added, nodes, relations, os.path.join(triples_dir, 'Added.nt'))
+        writes_diff_triples(removed, nodes, relations, os.path.join(triples_dir, 'Removed.nt'))
+
+    return report
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Compares two knowledge graph builds.')
+    parser.add_argument('-a', '--old', help='encoded knowledge graph prefix or knowledge graph file to compare against',
+                        required=True)
+    parser.add_argument('-b', '--new', help='encoded knowledge graph prefix or knowledge graph file to compare',
+                        required=True)
+    parser.add_argument('-w', '--work', help='name/path to the directory caching encoded files',
+                        default='./resources/kg_diff/')
+    parser.add_argument('-t', '--triples', help='name/path to a directory to write the added and removed triples to')
+    parser.add_argument('-o', '--out', help='name/path to write the json report to', required=True)
+    args = parser.parse_args()
+
+    report = diffs_knowledge_graphs(args.old, args.new, args.work, args.triples)
+
+    with open(args.out, 'w') as outfile:
+        json.dump(report, outfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,13 +3,28 @@
 
 
 # import needed libraries
+import io
 import json
+import multiprocessing
 import numpy as np
 import re
 import subprocess
 
+from functools import partial
+from gensim.models import Word2Vec
 from tqdm import tqdm
 
+from scripts.python.Checksums import hashes_file
+from scripts.python.EmbeddingStore import EmbeddingStore
+from scripts.python.KnowledgeGraphDiff import finds_changed_nodes
+from scripts.python.KnowledgeGraphQuery import KnowledgeGraphQuery
+from scripts.python.Profiler import records_items, runs_profiled_command
+from scripts.python.RandomWalks import WalkCorpus
+
+
+# node labels shared with the worker processes of processes_embedded_nodes
+_embedding_labels = []
+
 
 def runs_deepwalk(input_file, output_file, threads, dim, nwalks, walklen, window, nprwalks, lr):
     """Performs path embedding of a knowledge graph edge list using the DeepWalk algorithm.
@@ -27,7 +42,7 @@ def runs_deepwalk(input_file, output_file, threads, dim, nwalks, walklen, window
         lr (float): Initial learning rate
 
     Returns:
-        None.
+        A string naming the embedding file.
     """
 
     print('\n\n' + '=' * len('Running DeepWalk Algorithm'))
@@ -36,33 +51,373 @@ def runs_deepwalk(input_file, output_file, threads, dim, nwalks, walklen, window
 
     outputargs = '_{dim}_{nwalks}_{walklen}_{window}_{nprwalks}_{lr}.txt'.format(dim=dim, nwalks=nwalks,
                                                                                  walklen=walklen,
-                                                                                 window=10,
+                                                                                 window=window,
                                                                                  nprwalks=nprwalks,
                                                                                  lr=lr)
 
     # set command line argument
     try:
-        subprocess.check_call(['./deepwalk-c/src/deepwalk',
-                               '-input' + str(input_file),
-                               '-output' + output_file + outputargs,
-                               '-threads' + str(threads),
-                               '-dim' + str(dim),
-                               '-nwalks' + str(nwalks),
-                               '-walklen' + str(walklen),
-                               '-window' + str(window),
-                               '-nprwalks' + str(nprwalks),
-                               '-lr' + str(lr),
-                               '-verbose 2'])
+        runs_profiled_command(['./deepwalk-c/src/deepwalk',
+                               '-input', str(input_file),
+                               '-output', output_file + outputargs,
+                               '-threads', str(threads),
+                               '-dim', str(dim),
+                               '-nwalks', str(nwalks),
+                               '-walklen', str(walklen),
+                               '-window', str(window),
+                               '-nprwalks', str(nprwalks),
+                               '-lr', str(lr),
+                               '-verbose', '2'])
 
     except subprocess.CalledProcessError as error:
         print(error.output)
 
+    return output_file + outputargs
+
+
+def _gets_word2vec_arguments(dim, window, lr, threads, epochs, seed):
+    """Builds the arguments of a skip-gram Word2Vec model with hierarchical softmax (the DeepWalk objective).
+
+    Args:
+        dim (int): An integer specifying the number of dimensions for the resulting embeddings.
+        window (int): An integer specifying the size of the context window.
+        lr (float): Initial learning rate.
+        threads (int): An integer specifying the number of Word2Vec worker threads.
+        epochs (int): The number of passes over the corpus.
+        seed (int): The seed of the model.
+
+    Returns:
+        A dictionary of keyword arguments for Word2Vec.
+    """
+
+    return {'vector_size': dim, 'window': window, 'alpha': lr, 'min_count': 0, 'sg': 1, 'hs': 1, 'negative': 0,
+            'workers': threads, 'epochs': epochs, 'seed': seed}
+
+
+def _names_walk_embedding(output_file, dim, nwalks, walklen, window, lr, weights_file=None, p=1.0, q=1.0):
+    """Builds the name of the embedding file written by runs_walk_embedding and updates_walk_embedding.
+
+    Args:
+        output_file (str): A string containing the name and file path prefix of the embedding file.
+        dim (int): The number of dimensions of the embeddings.
+        nwalks (int): The number of walks per node.
+        walklen (int): The length of the walks.
+        window (int): The size of the context window.
+        lr (float): The initial learning rate.
+        weights_file (str): An optional string naming the edge weight file of the walks, whose checksum is part of
+            the name so embeddings of different weights do not overwrite each other.
+        p (float): The node2vec return parameter.
+        q (float): The node2vec in-out parameter.
+
+    Returns:
+        A string naming the embedding file, without its extension.
+    """
+
+    outputargs = '_{dim}_{nwalks}_{walklen}_{window}_{lr}'.format(dim=dim, nwalks=nwalks, walklen=walklen,
+                                                                  window=window, lr=lr)
+    outputargs += '_weighted_' + hashes_file(weights_file)[:8] if weights_file is not None else ''
+    outputargs += '_p{p}_q{q}'.format(p=p, q=q) if p != 1 or q != 1 else ''
+
+    return output_file + outputargs
+
+
+def trains_word2vec(corpus, num_nodes, dim, window, lr, threads, epochs=1, seed=0):
+    """Trains a skip-gram Word2Vec model with hierarchical softmax (the DeepWalk objective) on a corpus of walks whose
+    tokens are node integers (see _gets_word2vec_arguments).
+
+    Args:
+        corpus (iterable): A re-iterable corpus of walks, each a list of string node integers (e.g. WalkCorpus).
+        num_nodes (int): The number of nodes in the graph.
+        dim (int): An integer specifying the number of dimensions for the resulting embeddings.
+        window (int): An integer specifying the size of the context window.
+        lr (float): Initial learning rate.
+        threads (int): An integer specifying the number of Word2Vec worker threads.
+        epochs (int): The number of passes over the corpus.
+        seed (int): The seed of the model.
+
+    Returns:
+        A NumPy float32 array with one row per node integer (nodes which are not in any walk are zero vectors).
+    """
+
+    model = Word2Vec(corpus, **_gets_word2vec_arguments(dim, window, lr, threads, epochs, seed))
+
+    # the vocabulary tokens are node integers, so the vectors are moved to their rows in a single assignment
+    embeddings = np.zeros((num_nodes, dim), dtype=np.float32)
+    embeddings[np.asarray(model.wv.index_to_key, dtype=np.int64)] = model.wv.vectors
+
+    return embeddings
+
+
+def runs_walk_embedding(input_file, output_file, threads, dim, nwalks, walklen, window, lr, processes=None, seed=0,
+                        walk_dir=None, weights_file=None, p=1.0, q=1.0):
+    """Performs DeepWalk path embedding of a knowledge graph without the deepwalk-c binary: the random walks are
+    generated in-process over the BCSR graph (see RandomWalks.WalkCorpus) and streamed into gensim's Word2Vec. With an
+    edge weight file and/or p and q other than 1 the walks are weighted and/or node2vec biased. The embeddings are
+    written in the same binary layout as deepwalk-c, so they can be converted with processes_embedded_nodes.
+
+    Args:
+        input_file (str): A string naming the BCSR graph (see KnowledgeGraph.maps_str_to_int).
+        output_file (str): A string containing the name and file path to write out results.
+        threads (int): An integer specifying the number of Word2Vec worker threads.
+        dim (int): An integer specifying the number of dimensions for the resulting embeddings.
+        nwalks (int): An integer specifying the number of walks to perform.
+        walklen (int): An integer specifying the length of walks.
+        window (int): An integer specifying the size of the context window.
+        lr (float): Initial learning rate.
+        processes (int): The number of processes generating walks (defaults to the number of CPUs).
+        seed (int): The seed of the walks and the model.
+        walk_dir (str): An optional string naming a directory to save the walks to, so they can be reused.
+        weights_file (str): An optional string naming a NumPy file of edge weights aligned with the neighbors of the
+            BCSR graph (see RandomWalks.aligns_edge_weights).
+        p (float): The node2vec return parameter.
+        q (float): The node2vec in-out parameter.
+
+    Returns:
+        A string naming the embedding file.
+    """
+
+    print('\n\n' + '=' * len('Running DeepWalk Algorithm'))
+    print('Running DeepWalk Algorithm')
+    print('=' * len('Running DeepWalk Algorithm'))
+
+    embedding_file = _names_walk_embedding(output_file, dim, nwalks, walklen, window, lr, weights_file, p, q) + '.bin'
+
+    corpus = WalkCorpus(input_file, nwalks, walklen, processes or multiprocessing.cpu_count(), seed,
+                        walk_dir=walk_dir, weights_file=weights_file, p=p, q=q)
+    embeddings = trains_word2vec(corpus, corpus.num_nodes, dim, window, lr, threads, seed=seed)
+    embeddings.tofile(embedding_file)
+    records_items(len(corpus), 'walks')
+
+    return embedding_file
+
+
+def _aligns_previous_rows(store, labels):
+    """Finds the row of each node label in a previous embedding.
+
+    Args:
+        store (EmbeddingStore): The previous embedding.
+        labels (list): A sorted list of node labels.
+
+    Returns:
+        A NumPy int64 array with the previous row of each label, or -1 for labels without one.
+    """
+
+    rows = np.full(len(labels), -1, dtype=np.int64)
+
+    if not store.is_sorted:
+        for node, label in enumerate(labels):
+            rows[node] = store.label_rows.get(label, -1)
+        return rows
+
+    # both label lists are sorted, so they are aligned in a single linear pass
+    previous, row = store.labels, 0
+    for node, label in enumerate(labels):
+        while row < len(previous) and previous[row] < label:
+            row += 1
+        if row < len(previous) and previous[row] == label:
+            rows[node] = row
+
+    return rows
+
+
+def _initializes_new_nodes(vectors, known, subjects, objects, seed, chunk_size=1000000):
+    """Initializes the vectors of the nodes without a previous embedding with the mean vector of their neighbors that
+    have one (in either direction). Nodes without such neighbors get a small random vector, as Word2Vec does.
+
+    Args:
+        vectors (array): A NumPy float32 array with one row per node, holding the previous vectors.
+        known (array): A NumPy boolean array that is True for the nodes with a previous vector.
+        subjects (array): A NumPy integer array of the subject of each triple.
+        objects (array): A NumPy integer array of the object of each triple.
+        seed (int): The seed of the random vectors.
+        chunk_size (int): The number of triples processed at a time.
+
+    Returns:
+        None.
+    """
+
+    sums = np.zeros_like(vectors)
+    counts = np.zeros(len(vectors), dtype=np.int64)
+
+    for start in range(0, len(subjects), chunk_size):
+        chunk_subjects = np.asarray(subjects[start:start + chunk_size], dtype=np.int64)
+        chunk_objects = np.asarray(objects[start:start + chunk_size], dtype=np.int64)
+
+        for nodes, neighbors in ((chunk_subjects, chunk_objects), (chunk_objects, chunk_subjects)):
+            mask = ~known[nodes] & known[neighbors]
+            np.add.at(sums, nodes[mask], vectors[neighbors[mask]])
+            counts += np.bincount(nodes[mask], minlength=len(vectors))
+
+    new = np.flatnonzero(~known)
+    averaged = new[counts[new] > 0]
+    vectors[averaged] = sums[averaged] / counts[averaged][:, None]
+
+    isolated = new[counts[new] == 0]
+    rng = np.random.default_rng(seed)
+    vectors[isolated] = (rng.random((len(isolated), vectors.shape[1]), dtype=np.float32) - 0.5) / vectors.shape[1]
+
+    return None
+
+
+def updates_walk_embedding(previous_embedding, old_build, new_build, output_file, threads, nwalks, walklen, window, lr,
+                           hops=2, processes=None, seed=0, epochs=1, work_dir='./resources/kg_diff/', walk_dir=None,
+                           weights_file=None, p=1.0, q=1.0):
+    """Updates the embedding of a previous knowledge graph build for a new build instead of retraining it. The nodes
+    whose neighborhood changed (see KnowledgeGraphDiff.finds_changed_nodes) and the nodes within a number of hops of
+    them in the new build form the region to update. Walks are only started from the region (see
+    RandomWalks.WalkCorpus), and Word2Vec continues from the previous vectors: nodes added in the new build start from
+    the mean vector of their previous neighbors, a first pass over a tenth of the walks fits the hierarchical softmax
+    layer (which is not saved with an embedding) while every vector is locked, and the following passes only update
+    the vectors of the region. The embeddings are written in the same layout as runs_walk_embedding.
+
+    Args:
+        previous_embedding (str): A string naming the NumPy embedding file of the previous build (see
+            processes_embedded_nodes).
+        old_build (str): A string naming the previous build (see KnowledgeGraphDiff.reads_build).
+        new_build (str): A string naming the file path prefix (or the output_trip_ints file name) of the new build
+            written by KnowledgeGraph.maps_str_to_int, including its BCSR graph.
+        output_file (str): A string containing the name and file path to write out results.
+        threads (int): An integer specifying the number of Word2Vec worker threads.
+        nwalks (int): An integer specifying the number of walks started from each node of the region.
+        walklen (int): An integer specifying the length of walks.
+        window (int): An integer specifying the size of the context window.
+        lr (float): Initial learning rate.
+        hops (int): The number of hops around the changed nodes whose vectors are updated.
+        processes (int): The number of processes generating walks (defaults to the number of CPUs).
+        seed (int): The seed of the walks and the model.
+        epochs (int): The number of passes over the walks updating the region.
+        work_dir (str): A string naming the directory to cache encoded knowledge graph files in.
+        walk_dir (str): An optional string naming a directory to save the walks to, so they can be reused.
+        weights_file (str): An optional string naming a NumPy file of edge weights aligned with the neighbors of the
+            BCSR graph (see RandomWalks.aligns_edge_weights).
+        p (float): The node2vec return parameter.
+        q (float): The node2vec in-out parameter.
+
+    Returns:
+        A string naming the embedding file.
+    """
+
+    print('\n\n' + '=' * len('Updating DeepWalk Embeddings'))
+    print('Updating DeepWalk Embeddings')
+    print('=' * len('Updating DeepWalk Embeddings'))
+
+    prefix = new_build.rsplit('.', 1)[0] if new_build.endswith('.txt') else new_build
+    graph = KnowledgeGraphQuery(prefix)
+    previous = EmbeddingStore(previous_embedding)
+    dim = previous.embeddings.shape[1]
+
+    # nodes whose neighborhood changed and their k-hop region in the new build
+    changed = []
+    for node in finds_changed_nodes(old_build, prefix, work_dir):
+        try:
+            changed.append(graph.nodes.index(node))
+        except KeyError:
+            continue
+    region = graph.k_hop_nodes(changed, hops) if changed else np.empty(0, dtype=np.int64)
+
+    # previous vectors, with the added nodes initialized from their neighbors
+    previous_rows = _aligns_previous_rows(previous, graph.nodes.to_list())
+    known = previous_rows >= 0
+    vectors = np.zeros((len(graph.nodes), dim), dtype=np.float32)
+    vectors[known] = previous.embeddings[previous_rows[known]]
+    _initializes_new_nodes(vectors, known, graph.subjects, graph.objects, seed)
+
+    print('\n{changed} changed nodes, {region} of {nodes} nodes to update ({new} added)\n'.format(
+        changed=len(changed), region=len(region), nodes=len(graph.nodes), new=int((~known).sum())))
+
+    embedding_file = _names_walk_embedding(output_file, dim, nwalks, walklen, window, lr, weights_file, p, q)
+    embedding_file += '_incremental.bin'
+
+    if len(region) > 0:
+        corpus = WalkCorpus(prefix + '.bcsr', nwalks, walklen, processes or multiprocessing.cpu_count(), seed,
+                            starts=region, walk_dir=walk_dir, weights_file=weights_file, p=p, q=q)
+
+        # the hierarchical softmax tree is built from the node degrees, which are proportional to walk visits
+        model = Word2Vec(**_gets_word2vec_arguments(dim, window, lr, threads, epochs, seed))
+
+        model.build_vocab_from_freq(dict(zip(corpus.tokens, (np.diff(corpus.offsets) + 1).tolist())))
+        order = np.array([model.wv.key_to_index[token] for token in corpus.tokens], dtype=np.int64)
+        model.wv.vectors[order] = vectors
+
+        # a tenth of the walks is enough to fit the hierarchical softmax layer to the locked vectors
+        model.wv.vectors_lockf = np.zeros(len(order), dtype=np.float32)
+        warm_up = WalkCorpus(prefix + '.bcsr', max(1, nwalks // 10), walklen, corpus.processes, seed + 1,
+                             starts=region, weights_file=weights_file, p=p, q=q)
+        model.train(warm_up, total_examples=len(warm_up), epochs=1)
+        model.wv.vectors_lockf[order[region]] = 1.0
+        model.train(corpus, total_examples=len(corpus), epochs=epochs)
+
+        vectors = model.wv.vectors[order]
+        records_items(len(corpus), 'walks')
+
+    vectors.tofile(embedding_file)
+
+    return embedding_file
+
+
+def _initializes_embedding_worker(labels):
+    """Stores the node labels in each worker process used by processes_embedded_nodes.
+
+    Args:
+        labels (list): A list of node labels ordered by node integer.
+
+    Returns:
+        None.
+    """
+
+    global _embedding_labels
+    _embedding_labels = labels
+
     return None
 
 
-def processes_embedded_nodes(file_list, original_edges, kg_node_int_label_map):
-    """Takes a list of file paths that map to embedding files saved in binary compressed sparse row graph format
-    converts them into numpy arrays  and then writes them to the same directory as text files.
+def _converts_embedding_file(file, write_text=False, chunk_size=100000):
+    """Converts a binary deepwalk-c embedding file to a memory-mappable float32 NumPy array ('_formatted.npy'), a label
+    file with one node label per row of the array ('_formatted_Labels.txt'), and optionally a text file with one
+    tab-separated label and comma-separated vector per line ('_formatted.txt').
+
+    Args:
+        file (str): A string naming the embedding file.
+        write_text (bool): If True, the text file is written as well.
+        chunk_size (int): The number of rows formatted at a time when writing the text file.
+
+    Returns:
+        A string naming the NumPy array file.
+
+    Raises:
+        An exception is raised if the embedding file does not have one row per node.
+    """
+
+    labels = _embedding_labels
+    dim = int(re.search(r'\d{2,3}_', file.split('/')[-1]).group(0).strip('_'))
+    embeddings = np.memmap(file, dtype=np.float32, mode='r')
+
+    if len(embeddings) != len(labels) * dim:
+        raise Exception('ERROR: {} does not hold {} embeddings of {} dimensions'.format(file, len(labels), dim))
+
+    # deepwalk-c writes one row per node integer, in node integer order
+    embeddings = embeddings.reshape(len(labels), dim)
+    out_loc = file.rsplit('.', 1)[0] + '_formatted'
+
+    np.save(out_loc + '.npy', embeddings)
+    with open(out_loc + '_Labels.txt', 'w') as outfile:
+        outfile.write('\n'.join(labels) + '\n')
+
+    if write_text:
+        with open(out_loc + '.txt', 'w') as outfile:
+            for start in range(0, len(labels), chunk_size):
+                rows = io.StringIO()
+                np.savetxt(rows, embeddings[start:start + chunk_size], fmt='%.8g', delimiter=', ')
+                outfile.writelines(label + '\t' + row + '\n'
+                                   for label, row in zip(labels[start:start + chunk_size], rows.getvalue().split('\n')))
+
+    return out_loc + '.npy'
+
+
+def processes_embedded_nodes(file_list, kg_node_int_label_map, write_text=False, processes=None):
+    """Takes a list of file paths that map to binary embedding files written by deepwalk-c, converts each of them into
+    a float32 NumPy array with a matching node label file (see _converts_embedding_file), and writes them to the same
+    directory. The node label map is read once and the files are converted in parallel.
 
     ASSUMPTION: A filename must have the following ordering:
         file_name_128_100_20_10_100_001.out, where:
@@ -75,39 +430,36 @@ def processes_embedded_nodes(file_list, original_edges, kg_node_int_label_map):
             001 - learning rate (with '.' removed)
     Args:
         file_list (lst): A list of file paths.
-        original_edges (str): A string naming the filepath to the original edge list.
-        kg_node_int_label_map (str): A string naming the name and file path to write out results.
+        kg_node_int_label_map (str): A string naming the json file mapping node labels to node integers (see
+            KnowledgeGraph.maps_str_to_int).
+        write_text (bool): If True, each embedding is also written as a text file.
+        processes (int): The number of worker processes to use (defaults to one per file, up to the number of CPUs).
 
     Returns:
-        None.
+        A list of strings naming the NumPy array files.
     """
 
     print('\n' + '=' * 75)
 
-    # iterate over the embedding files and convert the data to numpy array
-    for file in tqdm(file_list):
-        print(file)
-
-        print('\nProcessing Embedding File: {0}'.format(file.split('/')[-1]))
+    # read map to convert node integers back to labels, ordered by node integer
+    label_map = json.load(open(kg_node_int_label_map))
+    labels = [None] * len(label_map)
+    for label, node in label_map.items():
+        labels[node] = label
 
-        # read map to convert node integers back to labels
-        node_labeler = dict(map(reversed, json.loads(open(kg_node_int_label_map).read()).items()))
+    processes = min(processes or multiprocessing.cpu_count(), len(file_list))
+    convert = partial(_converts_embedding_file, write_text=write_text)
 
-        # read in data and reverse mapping created by deepwalk-c
-        original_nodes = set(x for y in [line.strip('\n').split('\t') for line in open(original_edges, 'r')] for x in y)
+    if processes > 1:
+        with multiprocessing.Pool(processes, initializer=_initializes_embedding_worker, initargs=(labels,)) as pool:
+            outputs = list(tqdm(pool.imap(convert, file_list), total=len(file_list)))
+    else:
+        _initializes_embedding_worker(labels)
+        outputs = [convert(file) for file in tqdm(file_list)]
 
-        # read in embedding data
-        dim = int(re.search(r'\d{2,3}_', file).group(0).strip('_'))
-        original_embeddings = np.fromfile(file, np.float32).reshape(len(original_nodes), dim)
-
-        # re-order embeddings and write to drive
-        out_loc = open('./' + file.split('.')[1] + '_formatted.txt', 'w')
-
-        for nodes in sorted(list(dict(zip(sorted(map(int, original_nodes)), range(len(original_nodes)))).items())):
-            out_loc.write(node_labeler[nodes[0]] + '\t' + str(list(original_embeddings[nodes[1]])).strip('[|]') + '\n')
-
-        out_loc.close()
+    for output in outputs:
+        print('\nProcessed Embedding File: {0}'.format(output.split('/')[-1]))
 
     print('=' * 75 + '\n')
 
-    return None
+    return outputs
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import argparse
+import numpy as np
+
+from scripts.python.GraphEncoding import reads_encoded_triples
+from scripts.python.KnowledgeGraph import ntriple_line
+
+
+def _sorts_edges(keys, num_keys):
+    """Groups edge indices by a key (e.g. the subject of each edge) in compressed sparse row form.
+
+    Args:
+        keys (array): A NumPy integer array holding the key of each edge.
+        num_keys (int): The number of possible keys.
+
+    Returns:
+        A tuple of two NumPy int64 arrays: the offsets (num_keys + 1 values) and the edge indices sorted by key.
+    """
+
+    edges = np.argsort(keys, kind='stable').astype(np.int64)
+    offsets = np.zeros(num_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=num_keys), out=offsets[1:])
+
+    return offsets, edges
+
+
+def _gathers_ranges(offsets, keys):
+    """Gets the positions of all entries of several keys of a compressed sparse row structure, without a Python loop.
+
+    Args:
+        offsets (array): A NumPy integer array of offsets (see _sorts_edges).
+        keys (array): A NumPy integer array of keys.
+
+    Returns:
+        A NumPy int64 array of positions.
+    """
+
+    starts, ends = offsets[keys], offsets[keys + 1]
+    lengths = ends - starts
+
+    if lengths.sum() == 0:
+        return np.empty(0, dtype=np.int64)
+
+    return np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum(), dtype=np.int64)
+
+
+class KnowledgeGraphQuery(object):
+    """Class loads a knowledge graph encoded by KnowledgeGraph.maps_str_to_int once and indexes it for fast subgraph
+    extraction: the sorted node table gives each namespace a contiguous range of node identifiers, and the edges are
+    grouped by subject, by object, and by predicate in compressed sparse row form. Queries return NumPy arrays of node
+    or edge indices, which can be combined with NumPy set operations and decoded or written to N-Triples when needed.
+
+    Args:
+        output_prefix (str): A string naming the file path prefix the encoded triples were written to (e.g. the
+            output_trip_ints file name without its extension).
+        mmap_mode (str): The NumPy memory-map mode used to open the arrays (None reads them into memory).
+
+    """
+
+    def __init__(self, output_prefix, mmap_mode='r'):
+
+        self.subjects, self.predicates, self.objects, self.nodes, self.relations = \
+            reads_encoded_triples(output_prefix, mmap_mode)
+
+        self.out_offsets, self.out_edges = _sorts_edges(self.subjects, len(self.nodes))
+        self.in_offsets, self.in_edges = _sorts_edges(self.objects, len(self.nodes))
+        self.predicate_offsets, self.predicate_edges = _sorts_edges(self.predicates, len(self.relations))
+
+    def __len__(self):
+
+        return len(self.subjects)
+
+    def encodes_nodes(self, nodes):
+        """Converts node iris to node identifiers. Integers are passed through.
+
+        Args:
+            nodes (list): A list of node iris and/or node identifiers (or a single one).
+
+        Returns:
+            A NumPy int64 array of node identifiers.
+
+        Raises:
+            A KeyError is raised if an iri is not a node of the graph.
+        """
+
+        nodes = [nodes] if isinstance(nodes, (str, int, np.integer)) else nodes
+
+        return np.array([self.nodes.index(node) if isinstance(node, str) else node for node in nodes], dtype=np.int64)
+
+    def encodes_predicates(self, predicates):
+        """Converts predicate iris to relation identifiers. Integers are passed through.
+
+        Args:
+            predicates (list): A list of predicate iris and/or relation identifiers (or a single one).
+
+        Returns:
+            A NumPy int64 array of relation identifiers.
+
+        Raises:
+            A KeyError is raised if an iri is not a predicate of the graph.
+        """
+
+        predicates = [predicates] if isinstance(predicates, (str, int, np.integer)) else predicates
+
+        return np.array([self.relations.index(x) if isinstance(x, str) else x for x in predicates], dtype=np.int64)
+
+    def namespace_nodes(self, prefix):
+        """Gets the nodes whose iri starts with a prefix (e.g. 'http://purl.uniprot.org/geneid/').
+
+        Args:
+            prefix (str): A string containing an iri prefix.
+
+        Returns:
+            A NumPy int64 array of node identifiers.
+        """
+
+        start, end = self.nodes.prefix_range(prefix)
+
+        return np.arange(start, end, dtype=np.int64)
+
+    def namespace_edges(self, prefix, position='any'):
+        """Gets the edges touching the nodes of a namespace. A namespace is a contiguous range of node identifiers, so
+        its edges are contiguous in the subject and object indexes.
+
+        Args:
+            prefix (str): A string containing an iri prefix.
+            position (str): A string indicating whether the 'subject', the 'object', or 'any' end of an edge must be
+                in the namespace.
+
+        Returns:
+            A sorted NumPy int64 array of edge indices.
+        """
+
+        start, end = self.nodes.prefix_range(prefix)
+        edges = []
+
+        if position in ('subject', 'any'):
+            edges.append(self.out_edges[self.out_offsets[start]:self.out_offsets[end]])
+        if position in ('object', 'any'):
+            edges.append(self.in_edges[self.in_offsets[start]:self.in_offsets[end]])
+
+        return np.unique(np.concatenate(edges))
+
+    def predicate_edges_of(self, predicates):
+        """Gets the edges with one of a list of predicates.
+
+        Args:
+            predicates (list): A list of predicate iris or relation identifiers (or a single one).
+
+        Returns:
+            A sorted NumPy int64 array of edge indices.
+        """
+
+        return np.sort(self.predicate_edges[_gathers_ranges(self.predicate_offsets,
+                                                            self.encodes_predicates(predicates))])
+
+    def node_edges(self, nodes, direction='both', predicates=None):
+        """Gets the edges leaving ('out'), entering ('in'), or touching ('both') a list of nodes.
+
+        Args:
+            nodes (list): A list of node iris or node identifiers (or a single one).
+            direction (str): A string naming the direction of the edges: 'out', 'in', or 'both'.
+            predicates (list): An optional list of predicate iris or relation identifiers to restrict the edges to.
+
+        Returns:
+            A sorted NumPy int64 array of edge indices.
+        """
+
+        nodes, edges = self.encodes_nodes(nodes), []
+
+        if direction in ('out', 'both'):
+            edges.append(self.out_edges[_gathers_ranges(self.out_offsets, nodes)])
+        if direction in ('in', 'both'):
+            edges.append(self.in_edges[_gathers_ranges(self.in_offsets, nodes)])
+
+        edges = np.unique(np.concatenate(edges))
+
+        if predicates is not None:
+            edges = edges[np.isin(self.predicates[edges], self.encodes_predicates(predicates))]
+
+        return edges
+
+    def neighbors(self, nodes, direction='both', predicates=None):
+        """Gets the neighbors of a list of nodes.
+
+        Args:
+            nodes (list): A list of node iris or node identifiers (or a single one).
+            direction (str): A string naming the direction of the edges to follow: 'out', 'in', or 'both'.
+            predicates (list): An optional list of predicate iris or relation identifiers to restrict the edges to.
+
+        Returns:
+            A sorted NumPy int64 array of node identifiers.
+        """
+
+        nodes = self.encodes_nodes(nodes)
+        edges = self.node_edges(nodes, direction, predicates)
+        neighbors = []
+
+        if direction in ('out', 'both'):
+            neighbors.append(self.objects[edges][np.isin(self.subjects[edges], nodes)])
+        if direction in ('in', 'both'):
+            neighbors.append(self.subjects[edges][np.isin(self.objects[edges], nodes)])
+
+        return np.unique(np.concatenate(neighbors).astype(np.int64))
+
+    def k_hop_nodes(self, nodes, k, direction='both', predicates=None):
+        """Gets the nodes within k hops of a list of nodes (including the nodes themselves), expanding one frontier of
+        nodes at a time.
+
+        Args:
+            nodes (list): A list of node iris or node identifiers (or a single one).
+            k (int): The number of hops.
+            direction (str): A string naming the direction of the edges to follow: 'out', 'in', or 'both'.
+            predicates (list): An optional list of predicate iris or relation identifiers to restrict the edges to.
+
+        Returns:
+            A sorted NumPy int64 array of node identifiers.
+        """
+
+        visited = np.zeros(len(self.nodes), dtype=bool)
+        frontier = np.unique(self.encodes_nodes(nodes))
+        visited[frontier] = True
+
+        for _ in range(k):
+            if len(frontier) == 0:
+                break
+
+            frontier = self.neighbors(frontier, direction, predicates)
+            frontier = frontier[~visited[frontier]]
+            visited[frontier] = True
+
+        return np.flatnonzero(visited)
+
+    def subgraph_edges(self, nodes=None, predicates=None):
+        """Gets the edges of the subgraph induced by a list of nodes (both ends in the list) and/or restricted to a
+        list of predicates.
+
+        Args:
+            nodes (list): An optional list of node iris or node identifiers.
+            predicates (list): An optional list of predicate iris or relation identifiers.
+
+        Returns:
+            A sorted NumPy int64 array of edge indices.
+        """
+
+        if predicates is not None:
+            edges = self.predicate_edges_of(predicates)
+        elif nodes is not None:
+            edges = self.node_edges(nodes, 'out')
+        else:
+            edges = np.arange(len(self), dtype=np.int64)
+
+        if nodes is not None:
+            in_nodes = np.zeros(len(self.nodes), dtype=bool)
+            in_nodes[self.encodes_nodes(nodes)] = True
+            edges = edges[in_nodes[self.subjects[edges]] & in_nodes[self.objects[edges]]]
+
+        return edges
+
+    def k_hop_subgraph(self, nodes, k, direction='both', predicates=None):
+        """Gets the edges of the subgraph induced by the nodes within k hops of a list of nodes.
+
+        Args:
+            nodes (list): A list of node iris or node identifiers (or a single one).
+            k (int): The number of hops.
+            direction (str): A string naming the direction of the edges to follow: 'out', 'in', or 'both'.
+            predicates (list): An optional list of predicate iris or relation identifiers to restrict the edges to.
+
+        Returns:
+            A sorted NumPy int64 array of edge indices.
+        """
+
+        return self.subgraph_edges(self.k_hop_nodes(nodes, k, direction, predicates), predicates)
+
+    def decodes_edges(self, edges):
+        """Converts edge indices to triples of iris.
+
+        Args:
+            edges (array): A NumPy integer array of edge indices.
+
+        Returns:
+            A list of tuples, where each tuple contains the string subject, predicate, and object of a triple.
+        """
+
+        return [(self.nodes[s], self.relations[p], self.nodes[o])
+                for s, p, o in zip(self.subjects[edges].tolist(), self.predicates[edges].tolist(),
+                                   self.objects[edges].tolist())]
+
+    def writes_edges(self, edges, output):
+        """Writes the triples of a list of edges to an N-Triples file.
+
+        Args:
+            edges (array): A NumPy integer array of edge indices.
+            output (str): A string naming the file path to write the triples to.
+
+        Returns:
+            None.
+        """
+
+        with open(output, 'w') as outfile:
+            for start in range(0, len(edges), 100000):
+                triples = self.decodes_edges(edges[start:start + 100000])
+                outfile.writelines(ntriple_line.format(*triple) for triple in triples)
+
+        return None
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Extracts subgraphs from a knowledge graph encoded by '
+                                                 'maps_str_to_int.')
+    parser.add_argument('-g', '--graph', help='name/path prefix of the encoded knowledge graph', required=True)
+    parser.add_argument('-n', '--namespace', help='keep edges touching nodes with this iri prefix')
+    parser.add_argument('-s', '--seeds', help='seed node iris for a k-hop neighborhood', nargs='+')
+    parser.add_argument('-k', '--hops', help='number of hops around the seed nodes', type=int, default=1)
+    parser.add_argument('-p', '--predicates', help='predicate iris to restrict the edges to', nargs='+')
+    parser.add_argument('-o', '--out', help='name/path to write the subgraph to (N-Triples)', required=True)
+    args = parser.parse_args()
+
+    query = KnowledgeGraphQuery(args.graph)
+
+    if args.seeds:
+        edges = query.k_hop_subgraph(args.seeds, args.hops, predicates=args.predicates)
+    elif args.predicates:
+        edges = query.subgraph_edges(predicates=args.predicates)
+    else:
+        edges = np.arange(len(query), dtype=np.int64)
+
+    if args.namespace:
+        edges = np.intersect1d(edges, query.namespace_edges(args.namespace))
+
+    query.writes_edges(edges, args.out)
+    print('Wrote {edge} of {total} edges to {out}'.format(edge=len(edges), total=len(query), out=args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,45 +3,377 @@
 
 
 # import needed libraries
-import glob
+import argparse
+import asyncio
+import hashlib
 import json
 import os
+import requests
+import shutil
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
-from urllib.error import HTTPError
 
 
-def gets_json_results_from_api_call(url):
-    """Function makes API requests and returns results as a json file. API documentation can be found here:
-    http://data.bioontology.org/documentation.
+# base url of the BioPortal REST API (http://data.bioontology.org/documentation)
+api_url = 'http://data.bioontology.org'
+
+# BioPortal rate limits clients to 15 requests per second
+api_rate_limit = 15
+
+# HTTP codes that are retried (rate limiting and transient server errors)
+retried_codes = {429, 500, 502, 503, 504}
+
+
+def reads_api_key(key_file='resources/bioportal_api_key.txt'):
+    """Reads a BioPortal API key.
 
     Args:
-        url (str): A string containing a URL to be run against an API.
+        key_file (str): A string naming the file holding the API key.
+
+    Returns:
+        A string containing the API key.
+    """
 
-    Return:
-        A json-formatted file of API results.
+    with open(key_file, 'r') as infile:
+        return infile.read().strip()
+
+
+class TokenBucket(object):
+    """Class is an asyncio token bucket rate limiter: tokens are added at a fixed rate up to a capacity (the largest
+    burst), and each request takes one token, waiting for it if the bucket is empty.
+
+    Args:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens (defaults to rate, i.e. at most one second worth of requests).
 
-    Raises:
-        An exception is raised if a 500 HTTP server-side code is raised.
     """
 
-    try:
-        # to ease rate limiting sleep for random amount of time between 10-60 seconds
-        opener = urllib.request.build_opener()
+    def __init__(self, rate, capacity=None):
+
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = None
+
+    def _refills(self):
+        """Adds the tokens accumulated since the last update.
+
+        Returns:
+            None.
+        """
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        return None
+
+    async def acquires(self):
+        """Takes a token, waiting until one is available.
+
+        Returns:
+            None.
+        """
+
+        # the lock is created lazily, so it belongs to the event loop that uses the bucket
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+
+        async with self.lock:
+            self._refills()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refills()
+
+            self.tokens -= 1
+
+        return None
+
+    def pauses(self, seconds):
+        """Empties the bucket and holds back new tokens for a number of seconds (e.g. after the server answered 429).
+
+        Args:
+            seconds (float): The number of seconds without tokens.
+
+        Returns:
+            None.
+        """
+
+        self._refills()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+        return None
+
+
+class MappingFetcher(object):
+    """Class fetches the mappings of an ontology from the BioPortal REST API. Pages are requested concurrently
+    through one keep-alive connection pool, the requests are rate limited with a token bucket, and rate limited or
+    failed requests are retried with exponential backoff (honoring Retry-After). Every fetched page is saved to an
+    on-disk cache, so an interrupted extraction resumes with the pages that are missing.
+
+    Cached pages are only reused to resume an interrupted run: each run records the page count and a hash of the
+    first page (which is always fetched again) with its start time. A run that completed, is older than max_age, or
+    whose first page differs from the current one (i.e. the mappings changed) is not resumed, and its pages are
+    discarded, so a run never mixes pages of different states of the API.
+
+    Args:
+        base_url (str): A string containing the base url of the API (e.g. a local stand-in server for testing).
+        api_key (str): A string containing the API key (defaults to the key read from key_file).
+        key_file (str): A string naming the file holding the API key.
+        cache_dir (str): A string naming the directory to cache pages in.
+        concurrency (int): The maximum number of requests in flight.
+        rate (float): The maximum number of requests per second.
+        retries (int): The number of times a failed request is retried.
+        timeout (float): The number of seconds to wait for a response.
+        max_age (float): The number of seconds after its start during which an interrupted run may be resumed.
+
+    """
+
+    def __init__(self, base_url=api_url, api_key=None, key_file='resources/bioportal_api_key.txt',
+                 cache_dir='resources/data_maps/cache/', concurrency=8, rate=api_rate_limit, retries=5, timeout=60,
+                 max_age=86400):
+
+        self.base_url = base_url.rstrip('/')
+        self.cache_dir = os.path.join(cache_dir, urllib.parse.urlparse(self.base_url).netloc.replace(':', '_'))
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate)
+        self.retries = retries
+        self.timeout = timeout
+        self.max_age = max_age
+
+        self.session = requests.Session()
+        self.session.mount(self.base_url, HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+        self.session.headers['Authorization'] = 'apikey token=' + (api_key or reads_api_key(key_file))
+
+    def _gets(self, url):
+        """Sends a GET request (in a worker thread).
+
+        Args:
+            url (str): A string containing the url.
+
+        Returns:
+            A requests Response.
+        """
+
+        return self.session.get(url, timeout=self.timeout)
+
+    async def fetches_json(self, url, executor):
+        """Fetches a url and parses its json content, retrying rate limited and failed requests.
+
+        Args:
+            url (str): A string containing the url.
+            executor (ThreadPoolExecutor): The executor running the requests.
+
+        Returns:
+            The parsed json content.
+
+        Raises:
+            An exception is raised if the server answers with an error that is not retried, or if the request still
+            fails after all retries.
+        """
+
+        loop, failure = asyncio.get_running_loop(), None
+
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquires()
+
+            try:
+                response = await loop.run_in_executor(executor, partial(self._gets, url))
+            except requests.RequestException as error:
+                failure, wait = error, 2 ** attempt
+            else:
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code not in retried_codes:
+                    raise Exception('ERROR: {} returned HTTP {}'.format(url, response.status_code))
+
+                failure, wait = 'HTTP {}'.format(response.status_code), 2 ** attempt
+                if response.headers.get('Retry-After', '').isdigit():
+                    wait = int(response.headers['Retry-After'])
+                if response.status_code == 429:
+                    self.bucket.pauses(wait)
+
+            await asyncio.sleep(wait)
+
+        raise Exception('ERROR: {} failed after {} attempts: {}'.format(url, self.retries + 1, failure))
+
+    def _page_file(self, source, page):
+        """Names the cache file of a page of the mappings of an ontology.
+
+        Args:
+            source (str): A string containing the BioPortal acronym of the ontology.
+            page (int): The page number.
+
+        Returns:
+            A string naming the cache file.
+        """
+
+        return os.path.join(self.cache_dir, source, 'page_{}.json'.format(page))
 
-    except HTTPError:
-        # pause for 1 minutes and try again
-        time.sleep(30)
-        opener = urllib.request.build_opener()
+    def _state_file(self, source):
+        """Names the file holding the state of the run over the pages of the mappings of an ontology.
 
-    # fetch data
-    opener.addheaders = [('Authorization', 'apikey token=' + open('resources/bioportal_api_key.txt').read())]
+        Args:
+            source (str): A string containing the BioPortal acronym of the ontology.
 
-    return json.loads(opener.open(url).read())
+        Returns:
+            A string naming the state file.
+        """
+
+        return os.path.join(self.cache_dir, source, 'run.json')
+
+    def _page_url(self, source, page):
+        """Builds the url of a page of the mappings of an ontology.
+
+        Args:
+            source (str): A string containing the BioPortal acronym of the ontology.
+            page (int): The page number.
+
+        Returns:
+            A string containing the url.
+        """
+
+        return '{url}/ontologies/{source}/mappings?page={page}'.format(url=self.base_url,
+                                                                      source=urllib.parse.quote(source), page=page)
+
+    @staticmethod
+    def _writes_json(filepath, content):
+        """Writes json content atomically, so an interrupted write is never read back as a complete file.
+
+        Args:
+            filepath (str): A string naming the file path to write to.
+            content: The json content.
+
+        Returns:
+            None.
+        """
+
+        with open(filepath + '.tmp', 'w') as outfile:
+            json.dump(content, outfile)
+        os.replace(filepath + '.tmp', filepath)
+
+        return None
+
+    def starts_run(self, source, first_page):
+        """Starts a run over the pages of the mappings of an ontology. The run state stored in the cache (page count,
+        hash of the first page, start time, and whether it completed) decides whether the cached pages belong to an
+        interrupted run of the same state of the API, in which case the run resumes with them. Otherwise the cached
+        pages are discarded and a new run state is recorded.
+
+        Args:
+            source (str): A string containing the BioPortal acronym of the ontology.
+            first_page (dict): A dictionary containing the first page, fetched for this run.
+
+        Returns:
+            True if the run resumes an interrupted run, otherwise False.
+        """
+
+        source_dir, state_file = os.path.dirname(self._page_file(source, 1)), self._state_file(source)
+        fingerprint = hashlib.sha256(json.dumps(first_page, sort_keys=True).encode('utf-8')).hexdigest()
+        state = None
+
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as infile:
+                state = json.load(infile)
+
+        resumed = (state is not None and not state['complete'] and state['first_page'] == fingerprint and
+                   state['page_count'] == first_page['pageCount'] and time.time() - state['started'] <= self.max_age)
+
+        if not resumed:
+            shutil.rmtree(source_dir, ignore_errors=True)
+            os.makedirs(source_dir)
+            self._writes_json(state_file, {'page_count': first_page['pageCount'], 'first_page': fingerprint,
+                                           'started': time.time(), 'complete': False})
+            self._writes_json(self._page_file(source, 1), first_page)
+
+        return resumed
+
+    def completes_run(self, source):
+        """Marks the run over the pages of the mappings of an ontology as complete, so the next run starts over.
+
+        Args:
+            source (str): A string containing the BioPortal acronym of the ontology.
+
+        Returns:
+            None.
+        """
+
+        with open(self._state_file(source), 'r') as infile:
+            state = json.load(infile)
+
+        state['complete'] = True
+        self._writes_json(self._state_file(source), state)
+
+        return None
+
+    async def fetches_page(self, source, page, executor):
+        """Gets a page of the mappings of an ontology, from the cache if the current run (see starts_run) fetched it
+        before.
+
+        Args:
+            source (str): A string containing the BioPortal acronym of the ontology (e.g. 'MESH').
+            page (int): The page number (starting from 1).
+            executor (ThreadPoolExecutor): The executor running the requests.
+
+        Returns:
+            A dictionary containing the page.
+        """
+
+        page_file = self._page_file(source, page)
+
+        if os.path.exists(page_file):
+            with open(page_file, 'r') as infile:
+                return json.load(infile)
+
+        content = await self.fetches_json(self._page_url(source, page), executor)
+        self._writes_json(page_file, content)
+
+        return content
+
+    async def fetches_mappings(self, source1, source2):
+        """Fetches every page of the mappings of an ontology and keeps the mappings to a second ontology. The first
+        page is always fetched, to decide whether the cached pages of an interrupted run can be reused (see
+        starts_run).
+
+        Args:
+            source1 (str): A string containing the BioPortal acronym of the ontology to get the mappings of.
+            source2 (str): A string the ontology link of the mapped class must contain (e.g. 'CHEBI').
+
+        Returns:
+            A set of tuples, where each tuple holds the iris of the mapped classes of source1 and source2.
+        """
+
+        unique_edges = set()
+
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            first_page = await self.fetches_json(self._page_url(source1, 1), executor)
+            resumed = self.starts_run(source1, first_page)
+            pages = list(range(1, first_page['pageCount'] + 1))
+            cached = sum(os.path.exists(self._page_file(source1, page)) for page in pages)
+            print('{} pages of mappings, {} already cached{}'.format(len(pages), cached,
+                                                                    ' (resuming)' if resumed else ''))
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def fetches(page):
+                async with semaphore:
+                    return await self.fetches_page(source1, page, executor)
+
+            for task in tqdm(asyncio.as_completed([fetches(page) for page in pages]), total=len(pages)):
+                content = await task
+                for result in content['collection']:
+                    if source2 in result['classes'][1]['links']['ontology']:
+                        unique_edges.add((result['classes'][0]['@id'], result['classes'][1]['@id']))
+
+        self.completes_run(source1)
+
+        return unique_edges
 
 
 def writes_data_to_file(file_out, results):
@@ -68,84 +400,70 @@ def writes_data_to_file(file_out, results):
     outfile.close()
 
 
-def extracts_mapping_data(source1, source2, file_out):
-    """Function uses the BioPortal API to retrieve mappings between two sources. The function batch processes the
-    results in chunks of 1000, writes the data to a temporary directory and then once all batches have been
-    processed, the data is concatenated into a single file.
+def extracts_mapping_data(source1, source2, file_out, base_url=api_url, cache_dir='resources/data_maps/cache/',
+                          concurrency=8, rate=api_rate_limit, api_key=None):
+    """Function uses the BioPortal API to retrieve mappings between two sources (see MappingFetcher) and writes them
+    to a text file. Pages fetched by an interrupted run are read from the cache, if the mappings did not change since.
 
     Args:
         source1 (str): An ontology.
         source2 (str): An ontology.
         file_out (str): File path for location to write data to.
+        base_url (str): A string containing the base url of the API.
+        cache_dir (str): A string naming the directory to cache pages in.
+        concurrency (int): The maximum number of requests in flight.
+        rate (float): The maximum number of requests per second.
+        api_key (str): A string containing the API key (defaults to the key read from resources/bioportal_api_key.txt).
 
     Returns:
-        None.
+        A set of tuples, where each tuple represents a mapping between two identifiers.
     """
 
     print('\n' + '=' * 50)
     print('Running REST API to map {source1} to {source2}'.format(source1=source1, source2=source2))
     print('=' * 50 + '\n')
 
-    # get the available resources for mappings to source
-    ont_source = 'http://data.bioontology.org/ontologies/{source}/mappings/'.format(source=source1)
-    api_results = gets_json_results_from_api_call(ont_source)
-
-    # enable batch processing
-    total_pages = list(range(1, api_results['pageCount'] + 1))
-    n = 500 if len(total_pages) > 5000 else 100
-    batches = [total_pages[i:i + n] for i in range(0, len(total_pages), n)]
-
-    for batch in tqdm(range(0, len(batches))):
-        unique_edges = set()
-
-        # iterate over each page of results
-        for page in tqdm(batches[batch]):
-            time.sleep(5)
-            content = gets_json_results_from_api_call(ont_source + '?page={page}'.format(page=page))
-
-            for result in content['collection']:
-                if source2 in result['classes'][1]['links']['ontology']:
-                    unique_edges.add((result['classes'][0]['@id'], result['classes'][1]['@id']))
+    fetcher = MappingFetcher(base_url, api_key, cache_dir=cache_dir, concurrency=concurrency, rate=rate)
+    unique_edges = asyncio.run(fetcher.fetches_mappings(source1, source2))
+    writes_data_to_file(file_out, unique_edges)
 
-        writes_data_to_file(file_out + '_{batch_num}'.format(batch_num=batch) + '.txt', unique_edges)
-
-    return None
+    return unique_edges
 
 
 def main():
 
+    parser = argparse.ArgumentParser(description='Retrieves the mappings between two ontologies from BioPortal.')
+    parser.add_argument('-u', '--url', help='base url of the BioPortal REST API', default=api_url)
+    parser.add_argument('-j', '--concurrency', help='maximum number of requests in flight', type=int, default=8)
+    parser.add_argument('-r', '--rate', help='maximum number of requests per second', type=float,
+                        default=api_rate_limit)
+    args = parser.parse_args()
+
     # get user info for sources to map
     source1 = input('Enter ontology source 1: ')
     source2 = input('Enter ontology source 2: ')
 
-    # run API call in batches + save data
+    # run API calls + save data
     file_path = 'resources/data_maps/'
     file_name = '{source1}_{source2}_MAP'.format(source1=source1.upper(), source2=source2.upper())
-    temp_directory = file_path + 'temp'
-
-    # create temp directory to store batches
-    os.mkdir(temp_directory)
+    os.makedirs(file_path, exist_ok=True)
 
     # run program to map identifiers between source1 and source2
-    extracts_mapping_data(source1, source2, temp_directory + '/' + file_name)
+    mappings = extracts_mapping_data(source1, source2, file_path + file_name + '_Raw.txt', args.url,
+                                     concurrency=args.concurrency, rate=args.rate)
 
-    # concatenate batch data into single file
+    # reformat identifiers
     print('\n' + '=' * 50)
-    print('Concatenating Batch-Processed Data')
+    print('Reformatting Mapped Identifiers')
     print('=' * 50 + '\n')
 
     write_location = file_path + file_name + '.txt'
 
     with open(write_location, 'w') as outfile:
-        for filename in glob.glob(temp_directory + '/*.txt'):
-            file_data = list(filter(None, open(filename, 'r').read().split('\n')))
-
-            for line in file_data:
-                mesh = '_'.join(line.split('\t')[0].split('/')[-2:])
-                chebi = line.split('\t')[1].split('/')[-1]
-                outfile.write(mesh + '\t' + chebi + '\n')
-
-    outfile.close()
+        for source1_iri, source2_iri in sorted(mappings):
+            mesh = '_'.join(source1_iri.split('/')[-2:])
+            chebi = source2_iri.split('/')[-1]
+            outfile.write(mesh + '\t' + chebi + '\n')
 
 
 if __name__ == '__main__':
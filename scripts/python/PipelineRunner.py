@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import json
+import multiprocessing
+import os
+import time
+import traceback
+
+from multiprocessing.connection import wait
+
+from scripts.python.Checksums import hashes_file, hashes_strings
+from scripts.python.Profiler import Profiler, writes_run_report
+
+
+class Stage(object):
+    """Class describes a single stage of a pipeline: a function, the arguments it is called with, and the files it
+    reads and writes. Stages are connected through their files, so a stage depends on the stages that write its
+    inputs.
+
+    Args:
+        name (str): A string naming the stage.
+        function (function): The function to run.
+        args (tuple): The positional arguments passed to the function.
+        kwargs (dict): The keyword arguments passed to the function.
+        inputs (list): A list of strings naming the files the stage reads.
+        outputs (list): A list of strings naming the files the stage writes. A stage without outputs always runs.
+        after (list): A list of names of stages that must finish first, in addition to those writing the inputs.
+        in_process (bool): If True the stage runs in the runner process (e.g. stages prompting for input), otherwise
+            it runs in its own child process.
+
+    """
+
+    def __init__(self, name, function, args=(), kwargs=None, inputs=(), outputs=(), after=(), in_process=False):
+
+        self.name = name
+        self.function = function
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.after = list(after)
+        self.in_process = in_process
+
+
+def _profiles_stage_function(function, args, kwargs, name, record_file=None, cprofile_output=None):
+    """Runs a stage function and, if record_file is given, profiles it (see Profiler) and writes the measurements to
+    record_file as json, whether or not the function succeeds.
+
+    Args:
+        function (function): The function to run.
+        args (tuple): The positional arguments passed to the function.
+        kwargs (dict): The keyword arguments passed to the function.
+        name (str): A string naming the stage.
+        record_file (str): An optional string naming the json file to write the measurements to.
+        cprofile_output (str): An optional string naming a file to write cProfile statistics to.
+
+    Returns:
+        None.
+    """
+
+    if record_file is None:
+        function(*args, **kwargs)
+        return None
+
+    profiler = Profiler(name, cprofile_output=cprofile_output)
+
+    try:
+        with profiler:
+            function(*args, **kwargs)
+    finally:
+        with open(record_file, 'w') as outfile:
+            json.dump(profiler.results, outfile)
+
+    return None
+
+
+def _runs_stage_function(function, args, kwargs, name, record_file=None, cprofile_output=None):
+    """Runs a stage function in a child process (see _profiles_stage_function), exiting with a non-zero code if it
+    raises an exception.
+
+    Args:
+        function (function): The function to run.
+        args (tuple): The positional arguments passed to the function.
+        kwargs (dict): The keyword arguments passed to the function.
+        name (str): A string naming the stage.
+        record_file (str): An optional string naming the json file to write the measurements to.
+        cprofile_output (str): An optional string naming a file to write cProfile statistics to.
+
+    Returns:
+        None.
+    """
+
+    try:
+        _profiles_stage_function(function, args, kwargs, name, record_file, cprofile_output)
+    except BaseException:
+        traceback.print_exc()
+        os._exit(1)
+
+    return None
+
+
+class PipelineRunner(object):
+    """Class runs a pipeline defined as a directed acyclic graph of stages (see Stage). Each stage that finishes is
+    recorded in a checkpoint file with a signature computed from its function, its arguments, and the contents of its
+    input files. On later runs a stage is skipped if its outputs exist and its signature is unchanged, so a run
+    resumes after the last stage that succeeded and only redoes the stages whose inputs changed. Stages whose
+    dependencies are done run concurrently.
+
+    Args:
+        stages (list): A list of Stage objects.
+        checkpoint_file (str): A string naming the json file that stores the checkpoints.
+        jobs (int): The maximum number of stages to run at the same time.
+        report_dir (str): An optional string naming a directory to write a json report of each run to, with the wall
+            and CPU time, peak memory, I/O, and throughput of every stage that ran (see Profiler).
+        cprofile (bool): If True (and report_dir is given), cProfile statistics of each stage are also written.
+
+    Raises:
+        An exception is raised if two stages share a name or write the same file, or if the stages contain a cycle.
+    """
+
+    def __init__(self, stages, checkpoint_file, jobs=1, report_dir=None, cprofile=False):
+
+        self.stages = {}
+        self.checkpoint_file = checkpoint_file
+        self.jobs = jobs
+        self.report_dir = report_dir
+        self.cprofile = cprofile
+        self.run_dir = None
+
+        writers = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise Exception('ERROR: There is more than one stage named {}'.format(stage.name))
+            for output in stage.outputs:
+                if os.path.normpath(output) in writers:
+                    raise Exception('ERROR: More than one stage writes {}'.format(output))
+                writers[os.path.normpath(output)] = stage.name
+            self.stages[stage.name] = stage
+
+        # a stage depends on the stages writing its inputs and on the stages it is declared to run after
+        self.dependencies = {}
+        for stage in stages:
+            inputs = [writers[os.path.normpath(x)] for x in stage.inputs if os.path.normpath(x) in writers]
+            self.dependencies[stage.name] = set(inputs + stage.after)
+
+        self.order = self.orders_stages()
+
+        if os.path.exists(checkpoint_file):
+            with open(checkpoint_file, 'r') as infile:
+                self.checkpoints = json.load(infile)
+        else:
+            self.checkpoints = {'stages': {}, 'files': {}}
+
+    def orders_stages(self):
+        """Orders the stages so that each stage comes after all of its dependencies.
+
+        Returns:
+            A list of stage names.
+
+        Raises:
+            An exception is raised if the stages contain a cycle.
+        """
+
+        order, visiting, visited = [], set(), set()
+
+        def visits(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise Exception('ERROR: The pipeline has a cycle through stage {}'.format(name))
+
+            visiting.add(name)
+            for dependency in sorted(self.dependencies[name]):
+                visits(dependency)
+            visiting.remove(name)
+            visited.add(name)
+            order.append(name)
+
+        for stage_name in self.stages:
+            visits(stage_name)
+
+        return order
+
+    def _hashes_input(self, filepath):
+        """Hashes the contents of a file, reusing the previous hash if the size and modification time of the file are
+        unchanged.
+
+        Args:
+            filepath (str): A string naming a file path.
+
+        Returns:
+            A string containing the hexadecimal digest or None if the file does not exist.
+        """
+
+        if not os.path.exists(filepath):
+            return None
+
+        stat = os.stat(filepath)
+        cached = self.checkpoints['files'].get(filepath)
+
+        if cached is not None and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime_ns:
+            return cached['hash']
+
+        digest = hashes_file(filepath)
+        self.checkpoints['files'][filepath] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest}
+
+        return digest
+
+    def computes_signature(self, name):
+        """Computes the signature of a stage from its function, its arguments, and the contents of its inputs.
+
+        Args:
+            name (str): A string naming a stage.
+
+        Returns:
+            A string containing the hexadecimal signature.
+        """
+
+        stage = self.stages[name]
+        function_name = getattr(stage.function, '__module__', '') + '.' + getattr(stage.function, '__qualname__', '')
+
+        return hashes_strings(function_name, repr(stage.args), repr(sorted(stage.kwargs.items())),
+                              *[x + ':' + str(self._hashes_input(x)) for x in sorted(stage.inputs)])
+
+    def is_up_to_date(self, name):
+        """Checks whether a stage can be skipped: it has outputs, they all exist, and its signature is unchanged since
+        it last finished.
+
+        Args:
+            name (str): A string naming a stage.
+
+        Returns:
+            True if the stage is up to date, otherwise False.
+        """
+
+        stage = self.stages[name]
+        checkpoint = self.checkpoints['stages'].get(name)
+
+        if not stage.outputs or checkpoint is None or not all(os.path.exists(x) for x in stage.outputs):
+            return False
+
+        return checkpoint['signature'] == self.computes_signature(name)
+
+    def _writes_checkpoints(self):
+        """Writes the checkpoints to the checkpoint file.
+
+        Returns:
+            None.
+        """
+
+        with open(self.checkpoint_file + '.tmp', 'w') as outfile:
+            json.dump(self.checkpoints, outfile, indent=2, sort_keys=True)
+        os.replace(self.checkpoint_file + '.tmp', self.checkpoint_file)
+
+        return None
+
+    def _starts_stage(self, name):
+        """Starts a stage in its own child process, or runs it in the runner process if it is an in-process stage.
+
+        Args:
+            name (str): A string naming a stage.
+
+        Returns:
+            The multiprocessing.Process running the stage or None if the stage already ran in the runner process.
+        """
+
+        stage = self.stages[name]
+        print('\n' + '#' * 100 + '\nRunning Stage: {}\n'.format(name) + '#' * 100 + '\n')
+
+        record_file, cprofile_output = None, None
+        if self.run_dir is not None:
+            record_file = os.path.join(self.run_dir, name + '.json')
+            cprofile_output = os.path.join(self.run_dir, name + '.prof') if self.cprofile else None
+
+        if stage.in_process:
+            _profiles_stage_function(stage.function, stage.args, stage.kwargs, name, record_file, cprofile_output)
+            return None
+
+        # child processes are started from the main thread, as forking from other threads is not safe
+        process = multiprocessing.Process(target=_runs_stage_function, args=(stage.function, stage.args, stage.kwargs,
+                                                                             name, record_file, cprofile_output))
+        process.start()
+
+        return process
+
+    def _finishes_stage(self, name, start, exitcode=0):
+        """Checks that a stage succeeded and records its checkpoint.
+
+        Args:
+            name (str): A string naming a stage.
+            start (float): The time the stage started.
+            exitcode (int): The exit code of the process that ran the stage.
+
+        Returns:
+            None.
+
+        Raises:
+            An exception is raised if the stage failed or did not write all of its outputs.
+        """
+
+        stage = self.stages[name]
+
+        if exitcode != 0:
+            raise Exception('ERROR: Stage {} failed with exit code {}'.format(name, exitcode))
+
+        missing = [x for x in stage.outputs if not os.path.exists(x)]
+        if missing:
+            raise Exception('ERROR: Stage {} did not write {}'.format(name, ', '.join(missing)))
+
+        # the signature is computed after the run, since the hashes of its inputs are needed downstream anyway
+        self.checkpoints['stages'][name] = {'signature': self.computes_signature(name), 'seconds': time.time() - start,
+                                            'finished': time.strftime('%Y-%m-%d %H:%M:%S')}
+        self._writes_checkpoints()
+
+        return None
+
+    def selects_stages(self, targets=None):
+        """Selects the stages needed to build a set of target stages.
+
+        Args:
+            targets (list): A list of stage names (defaults to all stages).
+
+        Returns:
+            A list of stage names, ordered so that each stage comes after its dependencies.
+
+        Raises:
+            An exception is raised if a target is not a stage of the pipeline.
+        """
+
+        if not targets:
+            return list(self.order)
+
+        selected, pending = set(), list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise Exception('ERROR: {} is not a stage of the pipeline'.format(name))
+            if name not in selected:
+                selected.add(name)
+                pending += list(self.dependencies[name])
+
+        return [name for name in self.order if name in selected]
+
+    def runs(self, targets=None, force=False):
+        """Runs the pipeline. Stages that are up to date are skipped (unless force is True), stages whose
+        dependencies are done are run concurrently, and the stages depending on a failed stage are not run.
+
+        Args:
+            targets (list): A list of stage names to build, with their dependencies (defaults to all stages).
+            force (bool): If True, all selected stages are run even if they are up to date.
+
+        Returns:
+            A dictionary mapping each selected stage name to its status ('skipped', 'done', 'failed', or 'blocked').
+
+        Raises:
+            An exception is raised if any stage failed.
+        """
+
+        selected = self.selects_stages(targets)
+        status = {name: None for name in selected}
+        running = {}
+
+        if self.report_dir is not None:
+            self.run_dir = os.path.join(self.report_dir, 'run_' + time.strftime('%Y%m%d_%H%M%S'))
+            os.makedirs(self.run_dir, exist_ok=True)
+
+        while True:
+            for name in selected:
+                if status[name] is not None or name in running or len(running) >= self.jobs:
+                    continue
+
+                dependency_status = [status.get(x, 'skipped') for x in self.dependencies[name]]
+                if any(x in ('failed', 'blocked') for x in dependency_status):
+                    status[name] = 'blocked'
+                elif all(x in ('skipped', 'done') for x in dependency_status):
+                    if not force and self.is_up_to_date(name):
+                        status[name] = 'skipped'
+                        print('Skipping Up-To-Date Stage: {}'.format(name))
+                        continue
+
+                    start = time.time()
+                    try:
+                        process = self._starts_stage(name)
+                        if process is None:
+                            self._finishes_stage(name, start)
+                            status[name] = 'done'
+                        else:
+                            running[name] = (process, start)
+                    except Exception as error:
+                        print('\nStage {} failed: {}\n'.format(name, error))
+                        status[name] = 'failed'
+
+            if not running:
+                if any(x is None for x in status.values()):
+                    continue
+                break
+
+            finished = wait([process.sentinel for process, _ in running.values()])
+            for name in [x for x in running if running[x][0].sentinel in finished]:
+                process, start = running.pop(name)
+                process.join()
+                try:
+                    self._finishes_stage(name, start, process.exitcode)
+                    status[name] = 'done'
+                except Exception as error:
+                    print('\nStage {} failed: {}\n'.format(name, error))
+                    status[name] = 'failed'
+
+        print('\n' + '=' * 50)
+        for name in selected:
+            print('{name}: {status}'.format(name=name, status=status[name]))
+        print('=' * 50 + '\n')
+
+        if self.run_dir is not None:
+            records = []
+            for name in selected:
+                if os.path.exists(os.path.join(self.run_dir, name + '.json')):
+                    with open(os.path.join(self.run_dir, name + '.json'), 'r') as infile:
+                        records.append(json.load(infile))
+
+            writes_run_report(records, self.run_dir + '.json', status)
+            print('Run report written to: {}\n'.format(self.run_dir + '.json'))
+
+        failed = [name for name in selected if status[name] == 'failed']
+        if failed:
+            raise Exception('ERROR: Stages failed: {}'.format(', '.join(failed)))
+
+        return status
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import cProfile
+import datetime
+import json
+import os
+import platform
+import psutil
+import subprocess
+import threading
+import time
+
+
+# profilers that are currently running in this process, outermost first (see records_items)
+_active_profilers = []
+
+
+class Profiler(object):
+    """Class is a context manager that measures a block of code (e.g. a pipeline stage or a subprocess): wall time,
+    CPU time, peak resident memory, bytes read and written, and the number of items processed, from which throughput
+    is derived. Memory and I/O include child processes (e.g. owltools or deepwalk), which are sampled by a background
+    thread. The measurements of profilers nested inside another profiler are added to the outer profiler's results.
+
+    Args:
+        name (str): A string naming the profiled block.
+        interval (float): The number of seconds between memory samples.
+        cprofile_output (str): An optional string naming a file to write cProfile statistics of the block to.
+
+    Attributes:
+        results (dict): A dictionary of the measurements, which is filled in when the block exits.
+    """
+
+    def __init__(self, name, interval=0.1, cprofile_output=None):
+
+        self.name = name
+        self.interval = interval
+        self.cprofile_output = cprofile_output
+        self.process = psutil.Process()
+        self.items = {}
+        self.nested = []
+        self.results = {}
+
+    def _samples_process_tree(self):
+        """Samples the resident memory of the process and its children and the I/O of the children.
+
+        Returns:
+            None.
+        """
+
+        try:
+            children = self.process.children(recursive=True)
+        except psutil.Error:
+            children = []
+
+        rss = 0
+        for process in [self.process] + children:
+            try:
+                rss += process.memory_info().rss
+
+                if process.pid != self.process.pid and hasattr(process, 'io_counters'):
+                    io = process.io_counters()
+                    self.children_io[process.pid] = (io.read_bytes, io.write_bytes)
+            except psutil.Error:
+                # the process finished between listing and sampling it
+                continue
+
+        self.peak_rss = max(self.peak_rss, rss)
+
+        return None
+
+    def _runs_sampler(self):
+        """Samples the process tree every interval seconds until the profiler stops.
+
+        Returns:
+            None.
+        """
+
+        while not self.stopped.wait(self.interval):
+            self._samples_process_tree()
+
+        return None
+
+    def _reads_io(self):
+        """Reads the number of bytes read and written by the process, if the platform supports it.
+
+        Returns:
+            A tuple of the bytes read and the bytes written.
+        """
+
+        try:
+            io = self.process.io_counters()
+        except (AttributeError, psutil.Error):
+            return 0, 0
+
+        return io.read_bytes, io.write_bytes
+
+    def counts(self, items, unit='items'):
+        """Adds to the number of items processed by the block.
+
+        Args:
+            items (int): The number of items.
+            unit (str): A string naming the kind of item (e.g. 'triples' or 'edges').
+
+        Returns:
+            None.
+        """
+
+        self.items[unit] = self.items.get(unit, 0) + items
+
+        return None
+
+    def __enter__(self):
+
+        self.peak_rss, self.children_io = 0, {}
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self._runs_sampler, daemon=True)
+        self.cprofile = cProfile.Profile() if self.cprofile_output else None
+
+        _active_profilers.append(self)
+        self._samples_process_tree()
+        self.sampler.start()
+
+        self.start_io = self._reads_io()
+        self.start_cpu = os.times()
+        self.start_wall = time.perf_counter()
+
+        if self.cprofile is not None:
+            self.cprofile.enable()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_output)
+
+        wall = time.perf_counter() - self.start_wall
+        cpu = os.times()
+        end_io = self._reads_io()
+
+        self.stopped.set()
+        self.sampler.join()
+        self._samples_process_tree()
+        _active_profilers.remove(self)
+
+        # finished child processes are included in the cpu times of the process once they have been waited for
+        cpu_self = (cpu.user - self.start_cpu.user) + (cpu.system - self.start_cpu.system)
+        cpu_children = (cpu.children_user - self.start_cpu.children_user) + \
+                       (cpu.children_system - self.start_cpu.children_system)
+        read_bytes = end_io[0] - self.start_io[0] + sum(x[0] for x in self.children_io.values())
+        write_bytes = end_io[1] - self.start_io[1] + sum(x[1] for x in self.children_io.values())
+
+        self.results = {'name': self.name,
+                        'status': 'failed' if exc_type is not None else 'done',
+                        'wall_seconds': round(wall, 4),
+                        'cpu_seconds': round(cpu_self + cpu_children, 4),
+                        'cpu_children_seconds': round(cpu_children, 4),
+                        'peak_rss_bytes': self.peak_rss,
+                        'read_bytes': read_bytes,
+                        'write_bytes': write_bytes,
+                        'items': dict(self.items),
+                        'throughput': {unit + '_per_second': round(count / wall, 2) if wall > 0 else None
+                                       for unit, count in self.items.items()},
+                        'nested': self.nested}
+
+        if self.cprofile_output:
+            self.results['cprofile'] = self.cprofile_output
+        if _active_profilers:
+            _active_profilers[-1].nested.append(self.results)
+
+        return False
+
+
+def records_items(items, unit='items'):
+    """Adds to the number of items processed by every profiler running in this process, which is how instrumented
+    functions report their throughput. Does nothing if no profiler is running.
+
+    Args:
+        items (int): The number of items.
+        unit (str): A string naming the kind of item (e.g. 'triples' or 'edges').
+
+    Returns:
+        None.
+    """
+
+    for profiler in _active_profilers:
+        profiler.counts(items, unit)
+
+    return None
+
+
+def runs_profiled_command(command, name=None):
+    """Runs a command like subprocess.check_call, profiling it (see Profiler) when a profiler is running in this
+    process, so the command shows up as a nested measurement of the enclosing stage.
+
+    Args:
+        command (list): A list of strings holding the command and its arguments.
+        name (str): An optional string naming the measurement (defaults to the name of the executable).
+
+    Returns:
+        The return code of the command.
+
+    Raises:
+        subprocess.CalledProcessError: If the command exits with a non-zero code.
+    """
+
+    if not _active_profilers:
+        return subprocess.check_call(command)
+
+    with Profiler(name or os.path.basename(command[0])):
+        return subprocess.check_call(command)
+
+
+def gets_git_commit():
+    """Gets the commit of the git repository in the working directory.
+
+    Returns:
+        A string containing the commit hash or None if it is not available.
+    """
+
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def writes_run_report(stage_results, output, statuses=None):
+    """Writes the measurements of a run to a json file, together with the information needed to compare runs (the
+    git commit, the host, and the Python version).
+
+    Args:
+        stage_results (list): A list of Profiler.results dictionaries.
+        output (str): A string naming the json file to write the report to.
+        statuses (dict): An optional dictionary mapping each stage of the run to its status (e.g. 'skipped').
+
+    Returns:
+        A dictionary containing the report.
+    """
+
+    report = {'created': datetime.datetime.now().isoformat(timespec='seconds'),
+              'commit': gets_git_commit(),
+              'host': platform.node(),
+              'python': platform.python_version(),
+              'cpus': os.cpu_count(),
+              'total_wall_seconds': round(sum(x['wall_seconds'] for x in stage_results), 4),
+              'max_peak_rss_bytes': max([x['peak_rss_bytes'] for x in stage_results] or [0]),
+              'statuses': statuses or {},
+              'stages': stage_results}
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as outfile:
+        json.dump(report, outfile, indent=2)
+
+    return report
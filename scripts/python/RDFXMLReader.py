@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import pathlib
+import re
+import xml.etree.ElementTree as ET
+
+from rdflib import BNode, Literal, URIRef
+from rdflib.namespace import RDF
+from urllib.parse import urljoin
+
+
+# qualified names of the RDF/XML syntax attributes and elements (as reported by ElementTree)
+rdf_ns = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}'
+xml_ns = '{http://www.w3.org/XML/1998/namespace}'
+rdf_root, rdf_description, rdf_li = rdf_ns + 'RDF', rdf_ns + 'Description', rdf_ns + 'li'
+rdf_about, rdf_id, rdf_node_id, rdf_resource = rdf_ns + 'about', rdf_ns + 'ID', rdf_ns + 'nodeID', rdf_ns + 'resource'
+rdf_datatype, rdf_parse_type, rdf_type_attr = rdf_ns + 'datatype', rdf_ns + 'parseType', rdf_ns + 'type'
+xml_base, xml_lang = xml_ns + 'base', xml_ns + 'lang'
+syntax_attributes = {rdf_about, rdf_id, rdf_node_id, rdf_resource, rdf_datatype, rdf_parse_type, xml_base, xml_lang}
+
+# characters escaped in N-Triples literals (as by the rdflib N-Triples serializer)
+literal_escapes = str.maketrans({'\\': '\\\\', '\n': '\\n', '"': '\\"', '\r': '\\r'})
+
+# iris starting with a scheme do not need to be resolved against the base iri
+absolute_iri = re.compile(r'^[A-Za-z][A-Za-z0-9+.\-]*:')
+
+
+def _resolves_iri(iri, base):
+    """Resolves a (possibly relative) iri against the base iri of the document.
+
+    Args:
+        iri (str): A string containing an iri.
+        base (str): A string containing the base iri.
+
+    Returns:
+        An rdflib URIRef.
+    """
+
+    return URIRef(iri if absolute_iri.match(iri) else urljoin(base, iri))
+
+
+def _expands_tag(tag, iris):
+    """Converts an ElementTree tag ('{namespace}name') to an iri, caching the iris of the (few) distinct tags.
+
+    Args:
+        tag (str): A string containing an ElementTree tag.
+        iris (dict): A dictionary mapping tags to rdflib URIRefs.
+
+    Returns:
+        An rdflib URIRef.
+
+    Raises:
+        An exception is raised if the element is not in a namespace.
+    """
+
+    iri = iris.get(tag)
+
+    if iri is None:
+        if not tag.startswith('{'):
+            raise Exception('ERROR: RDF/XML element {} has no namespace'.format(tag))
+
+        iri = iris[tag] = URIRef(tag[1:].replace('}', '', 1))
+
+    return iri
+
+
+def reads_rdfxml(filepath):
+    """Streams the triples of an RDF/XML file (e.g. an ontology or a knowledge graph written by owltools or rdflib)
+    with an incremental XML parser, so the triples are available as soon as they are read and the document is never
+    held in memory as a whole. Each top-level element is discarded once its triples have been produced.
+
+    The reader covers the RDF/XML written by the OWL API and rdflib: typed and rdf:Description node elements
+    identified by rdf:about, rdf:ID, or rdf:nodeID (or anonymous), nested node elements, property attributes,
+    rdf:resource and rdf:nodeID objects, typed and language-tagged literals (including inherited xml:lang and
+    xml:base), and rdf:parseType 'Resource' and 'Collection'. rdf:li, reification with rdf:ID on property elements,
+    property attributes on property elements, and rdf:parseType 'Literal' are not supported.
+
+    Args:
+        filepath (str): A string naming the RDF/XML file to read.
+
+    Returns:
+        A generator of tuples, where each tuple contains the rdflib subject, predicate, and object of a triple.
+
+    Raises:
+        An exception is raised if the file uses RDF/XML syntax the reader does not support.
+    """
+
+    iris, node_ids = {}, {}
+    root = None
+
+    # the stack alternates between node frames (whose children are properties) and property frames
+    stack = [{'kind': 'root', 'base': pathlib.Path(filepath).absolute().as_uri(), 'lang': None}]
+
+    for event, element in ET.iterparse(filepath, events=('start', 'end')):
+        if event == 'start':
+            frame, attrib = stack[-1], element.attrib
+            base = urljoin(frame['base'], attrib[xml_base]) if xml_base in attrib else frame['base']
+            lang = attrib.get(xml_lang, frame['lang'])
+
+            if element.tag == rdf_root and root is None:
+                root = element
+                stack.append({'kind': 'root', 'base': base, 'lang': lang})
+
+            elif frame['kind'] in ('root', 'property', 'collection'):
+                # node element
+                if rdf_about in attrib:
+                    subject = _resolves_iri(attrib[rdf_about], base)
+                elif rdf_id in attrib:
+                    subject = _resolves_iri('#' + attrib[rdf_id], base)
+                elif rdf_node_id in attrib:
+                    subject = node_ids.setdefault(attrib[rdf_node_id], BNode())
+                else:
+                    subject = BNode()
+
+                if frame['kind'] == 'property':
+                    if frame['object'] is not None:
+                        raise Exception('ERROR: Property element {} has more than one object'.format(frame['tag']))
+
+                    frame['object'] = subject
+                    yield frame['subject'], frame['predicate'], subject
+                elif frame['kind'] == 'collection':
+                    frame['items'].append(subject)
+
+                if element.tag != rdf_description:
+                    yield subject, RDF.type, _expands_tag(element.tag, iris)
+
+                for key, value in attrib.items():
+                    if key == rdf_type_attr:
+                        yield subject, RDF.type, _resolves_iri(value, base)
+                    elif key not in syntax_attributes:
+                        yield subject, _expands_tag(key, iris), Literal(value, lang=lang)
+
+                stack.append({'kind': 'node', 'subject': subject, 'base': base, 'lang': lang})
+
+            elif frame['kind'] == 'node':
+                # property element
+                predicate, parse_type = _expands_tag(element.tag, iris), attrib.get(rdf_parse_type)
+
+                if element.tag == rdf_li or rdf_id in attrib or parse_type not in (None, 'Resource', 'Collection') \
+                        or any(key not in syntax_attributes for key in attrib):
+                    raise Exception('ERROR: Unsupported RDF/XML syntax in property element {}'.format(element.tag))
+
+                if rdf_resource in attrib:
+                    yield frame['subject'], predicate, _resolves_iri(attrib[rdf_resource], base)
+                    stack.append({'kind': 'empty', 'base': base, 'lang': lang})
+                elif rdf_node_id in attrib:
+                    yield frame['subject'], predicate, node_ids.setdefault(attrib[rdf_node_id], BNode())
+                    stack.append({'kind': 'empty', 'base': base, 'lang': lang})
+                elif parse_type == 'Resource':
+                    node = BNode()
+                    yield frame['subject'], predicate, node
+                    stack.append({'kind': 'node', 'subject': node, 'base': base, 'lang': lang})
+                elif parse_type == 'Collection':
+                    stack.append({'kind': 'collection', 'subject': frame['subject'], 'predicate': predicate,
+                                  'items': [], 'base': base, 'lang': lang})
+                else:
+                    stack.append({'kind': 'property', 'tag': element.tag, 'subject': frame['subject'],
+                                  'predicate': predicate, 'object': None, 'datatype': attrib.get(rdf_datatype),
+                                  'base': base, 'lang': lang})
+
+            else:
+                raise Exception('ERROR: Unexpected RDF/XML element {} inside an empty property'.format(element.tag))
+
+        else:
+            frame = stack.pop()
+
+            if frame['kind'] == 'property' and frame['object'] is None:
+                text = element.text or ''
+
+                if frame['datatype'] is not None:
+                    yield frame['subject'], frame['predicate'], Literal(text, datatype=_resolves_iri(frame['datatype'],
+                                                                                                  frame['base']))
+                else:
+                    yield frame['subject'], frame['predicate'], Literal(text, lang=frame['lang'])
+
+            elif frame['kind'] == 'collection':
+                head = RDF.nil
+
+                for item in reversed(frame['items']):
+                    node = BNode()
+                    yield node, RDF.first, item
+                    yield node, RDF.rest, head
+                    head = node
+
+                yield frame['subject'], frame['predicate'], head
+
+            # free the elements of a top-level node once its triples have been produced
+            if frame['kind'] == 'node' and stack[-1]['kind'] == 'root' and root is not None:
+                root.clear()
+
+    return None
+
+
+def _formats_nt_term(term):
+    """Formats an rdflib term for an N-Triples file. Iris and blank nodes use their N3 form, while literals are quoted
+    and escaped like the rdflib N-Triples serializer does, followed by their language tag or datatype.
+
+    Args:
+        term (Node): An rdflib term.
+
+    Returns:
+        A string containing the N-Triples form of the term.
+    """
+
+    if not isinstance(term, Literal):
+        return term.n3()
+
+    quoted = '"{}"'.format(str(term).translate(literal_escapes))
+
+    if term.language:
+        return '{}@{}'.format(quoted, term.language)
+    elif term.datatype:
+        return '{}^^<{}>'.format(quoted, term.datatype)
+    else:
+        return quoted
+
+
+def writes_ntriples(triples, output):
+    """Writes a stream of rdflib triples (e.g. from reads_rdfxml) to an N-Triples file, one triple at a time.
+
+    Args:
+        triples (iterable): An iterable of tuples of rdflib terms.
+        output (str): A string naming the N-Triples file to write.
+
+    Returns:
+        The number of triples written.
+    """
+
+    count = 0
+
+    with open(output, 'w', encoding='utf-8') as outfile:
+        for triple in triples:
+            outfile.write('{} {} {} .\n'.format(triple[0].n3(), triple[1].n3(), _formats_nt_term(triple[2])))
+            count += 1
+
+    return count
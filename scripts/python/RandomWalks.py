@@ -0,0 +1,565 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import argparse
+import json
+import multiprocessing
+import numpy as np
+import os
+import tempfile
+
+from collections import deque
+from itertools import islice
+from tqdm import tqdm
+
+from scripts.python.GraphEncoding import reads_bcsr, reads_string_table
+
+
+# graph, start nodes, and walk parameters shared with worker processes
+_walk_graph = None
+
+
+def _initializes_walk_worker(offsets, neighbors, starts, alias_tables=None, p=1.0, q=1.0):
+    """Stores the CSR graph, the start nodes, and the walk parameters in each worker process used to generate walks.
+
+    Args:
+        offsets (array): A NumPy int64 array of offsets (num_nodes + 1 values).
+        neighbors (array): A NumPy integer array of the neighbors of each node.
+        starts (array): A NumPy int64 array of the start nodes of the walks.
+        alias_tables (tuple): An optional tuple of the alias probabilities and indices (see builds_alias_tables).
+        p (float): The node2vec return parameter.
+        q (float): The node2vec in-out parameter.
+
+    Returns:
+        None.
+    """
+
+    global _walk_graph
+    _walk_graph = (offsets, neighbors, starts, alias_tables, p, q)
+
+    return None
+
+
+def searches_neighbors(offsets, neighbors, nodes, targets):
+    """Finds the position of each target in the neighbors of the matching node, with a binary search over every node's
+    sorted neighbor list at once (see GraphEncoding.builds_csr).
+
+    Args:
+        offsets (array): A NumPy int64 array of offsets (num_nodes + 1 values).
+        neighbors (array): A NumPy integer array of the sorted neighbors of each node.
+        nodes (array): A NumPy integer array of nodes.
+        targets (array): A NumPy integer array of nodes to search for, one per node.
+
+    Returns:
+        A NumPy int64 array holding the position of each target in neighbors, or -1 if it is not a neighbor.
+    """
+
+    low, high, end = offsets[nodes], offsets[np.asarray(nodes) + 1], offsets[np.asarray(nodes) + 1]
+
+    while True:
+        searching = low < high
+        if not searching.any():
+            break
+
+        middle = np.where(searching, (low + high) // 2, 0)
+        right = searching & (neighbors[middle] < targets)
+        low, high = np.where(right, middle + 1, low), np.where(searching & ~right, middle, high)
+
+    found = low < end
+    found[found] = neighbors[low[found]] == np.asarray(targets)[found]
+
+    return np.where(found, low, -1)
+
+
+def aligns_edge_weights(offsets, neighbors, sources, targets, weights, default=1.0):
+    """Builds an array of edge weights aligned with the neighbors of a CSR graph from weighted edges (e.g. evidence
+    scores), for weighted walks (see builds_alias_tables). Edges without a weight get the default weight.
+
+    Args:
+        offsets (array): A NumPy int64 array of offsets (num_nodes + 1 values).
+        neighbors (array): A NumPy integer array of the sorted neighbors of each node.
+        sources (array): A NumPy integer array of the source node of each weighted edge.
+        targets (array): A NumPy integer array of the target node of each weighted edge.
+        weights (array): A NumPy array of the weight of each weighted edge.
+        default (float): The weight of the edges without a weight.
+
+    Returns:
+        A NumPy float32 array with one weight per neighbor.
+
+    Raises:
+        An exception is raised if a weighted edge is not in the graph.
+    """
+
+    positions = searches_neighbors(offsets, neighbors, np.asarray(sources, dtype=np.int64),
+                                   np.asarray(targets, dtype=np.int64))
+
+    if (positions < 0).any():
+        raise Exception('ERROR: {} weighted edges are not in the graph'.format(int((positions < 0).sum())))
+
+    edge_weights = np.full(len(neighbors), default, dtype=np.float32)
+    edge_weights[positions] = weights
+
+    return edge_weights
+
+
+def writes_edge_weights(bcsr_file, edges_file, output, score_column=2, default=1.0, undirected=False):
+    """Turns the evidence scores of a set of edges (e.g. the STRING combined score of gene-gene edges) into an edge
+    weight file aligned with the neighbors of a BCSR graph (see aligns_edge_weights), for weighted walks. The edges are
+    read from a tab-delimited file holding the subject and object IRIs in the first two columns and the score in
+    score_column, and are mapped to integers with the node table written next to the graph by
+    KnowledgeGraph.maps_str_to_int. Edges which are not in the graph (e.g. removed by the evidence filters of the
+    build) are skipped.
+
+    Args:
+        bcsr_file (str): A string naming the BCSR graph (see KnowledgeGraph.maps_str_to_int).
+        edges_file (str): A string naming the tab-delimited file of scored edges.
+        output (str): A string naming the NumPy file to write the edge weights to.
+        score_column (int): The column of edges_file holding the score.
+        default (float): The weight of the edges without a score.
+        undirected (bool): If True, each scored edge also weights the edge in the other direction (for graphs built
+            with undirected=True).
+
+    Returns:
+        A NumPy float32 array with one weight per neighbor.
+    """
+
+    print('\n\n' + '=' * len('Writing Edge Weights'))
+    print('Writing Edge Weights')
+    print('=' * len('Writing Edge Weights') + '\n')
+
+    offsets, neighbors = reads_bcsr(bcsr_file)
+    nodes = reads_string_table(bcsr_file.rsplit('.', 1)[0] + '_Nodes')
+
+    # each distinct IRI is looked up once in the sorted node table
+    integers, sources, targets, scores = {}, [], [], []
+    with open(edges_file, 'r') as infile:
+        for line in tqdm(infile):
+            cols = line.rstrip('\n').split('\t')
+
+            for iri in cols[:2]:
+                if iri not in integers:
+                    try:
+                        integers[iri] = nodes.index(iri)
+                    except KeyError:
+                        integers[iri] = -1
+
+            sources.append(integers[cols[0]])
+            targets.append(integers[cols[1]])
+            scores.append(float(cols[score_column]))
+
+    sources, targets = np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+    scores = np.array(scores, dtype=np.float32)
+    if undirected:
+        sources, targets, scores = np.concatenate((sources, targets)), np.concatenate((targets, sources)), \
+            np.concatenate((scores, scores))
+
+    known = (sources >= 0) & (targets >= 0)
+    known[known] = searches_neighbors(offsets, neighbors, sources[known], targets[known]) >= 0
+    print('{} of {} scored edges are in the graph'.format(int(known.sum()), len(known)))
+
+    edge_weights = aligns_edge_weights(offsets, neighbors, sources[known], targets[known], scores[known], default)
+    np.save(output, edge_weights)
+
+    return edge_weights
+
+
+def builds_alias_tables(offsets, weights):
+    """Builds an alias table (Vose's method) over the weighted neighbors of every node, so a neighbor can be sampled in
+    constant time: draw a neighbor uniformly, keep it with its alias probability, otherwise take its alias. Nodes whose
+    neighbors all have the same weight keep the uniform table (probability 1) and are not processed.
+
+    Args:
+        offsets (array): A NumPy int64 array of offsets (num_nodes + 1 values).
+        weights (array): A NumPy array with one non-negative weight per neighbor (see aligns_edge_weights).
+
+    Returns:
+        A tuple of two NumPy arrays with one entry per neighbor: the float32 alias probabilities and the int32 aliases
+        (positions within the node's neighbors).
+
+    Raises:
+        An exception is raised if a weight is negative.
+    """
+
+    weights = np.asarray(weights, dtype=np.float64)
+    probabilities, aliases = np.ones(len(weights), dtype=np.float32), np.zeros(len(weights), dtype=np.int32)
+
+    if (weights < 0).any():
+        raise Exception('ERROR: Edge weights must not be negative')
+
+    nodes = np.flatnonzero(np.diff(offsets) > 1)
+    if len(nodes) == 0:
+        return probabilities, aliases
+
+    # the segments of nodes with at least one neighbor are contiguous, so they can be reduced together
+    non_empty = np.flatnonzero(np.diff(offsets) > 0)
+    maximum = np.maximum.reduceat(weights, offsets[non_empty])
+    minimum = np.minimum.reduceat(weights, offsets[non_empty])
+    weighted = non_empty[maximum != minimum]
+
+    for node in tqdm(weighted.tolist()):
+        start, end = int(offsets[node]), int(offsets[node + 1])
+        scaled = (weights[start:end] * ((end - start) / weights[start:end].sum())).tolist()
+        probability, alias = [1.0] * len(scaled), list(range(len(scaled)))
+        small, large = [i for i, x in enumerate(scaled) if x < 1.0], [i for i, x in enumerate(scaled) if x >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            probability[less], alias[less] = scaled[less], more
+            scaled[more] += scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        probabilities[start:end], aliases[start:end] = probability, alias
+
+    return probabilities, aliases
+
+
+def reads_alias_tables(weights_file, offsets):
+    """Loads the alias tables of an edge weight file (a NumPy array aligned with the neighbors of a BCSR graph),
+    building and caching them next to the weight file when they are missing or older than it.
+
+    Args:
+        weights_file (str): A string naming the NumPy edge weight file.
+        offsets (array): A NumPy int64 array of offsets (num_nodes + 1 values).
+
+    Returns:
+        A tuple of the memory-mapped alias probabilities and aliases (see builds_alias_tables).
+    """
+
+    prefix = weights_file.rsplit('.', 1)[0]
+    cached = [prefix + '_Alias_Probabilities.npy', prefix + '_Alias_Indices.npy']
+
+    if not all(os.path.exists(x) and os.path.getmtime(x) >= os.path.getmtime(weights_file) for x in cached):
+        print('Building alias tables: {}'.format(weights_file))
+        for array, filepath in zip(builds_alias_tables(offsets, np.load(weights_file, mmap_mode='r')), cached):
+            np.save(filepath, array)
+
+    return tuple(np.load(filepath, mmap_mode='r') for filepath in cached)
+
+
+def _samples_positions(offsets, current, degrees, rng, alias_tables=None):
+    """Samples one neighbor of each walker, uniformly or, with alias tables, proportionally to the edge weights.
+
+    Args:
+        offsets (array): A NumPy int64 array of offsets (num_nodes + 1 values).
+        current (array): A NumPy int64 array of the current node of each walker.
+        degrees (array): A NumPy int64 array of the (non-zero) number of neighbors of each current node.
+        rng (Generator): A NumPy random generator.
+        alias_tables (tuple): An optional tuple of the alias probabilities and indices (see builds_alias_tables).
+
+    Returns:
+        A NumPy int64 array of positions in the neighbors array.
+    """
+
+    local = (rng.random(len(current)) * degrees).astype(np.int64)
+
+    if alias_tables is not None:
+        probabilities, aliases = alias_tables
+        positions = offsets[current] + local
+        local = np.where(rng.random(len(current)) < probabilities[positions], local, aliases[positions])
+
+    return offsets[current] + local
+
+
+def _samples_biased_positions(offsets, neighbors, previous, current, degrees, rng, alias_tables, p, q):
+    """Samples one neighbor of each walker with the node2vec second-order bias (1/p to return to the previous node,
+    1 to move to a neighbor of the previous node, and 1/q to move further away) on top of the edge weights. Instead of
+    second-order alias tables, which need memory quadratic in the node degrees, candidates drawn from the first-order
+    tables are accepted with probability bias / max(1/p, 1, 1/q) and redrawn otherwise, which gives the exact
+    node2vec transition probabilities.
+
+    Args:
+        offsets (array): A NumPy int64 array of offsets (num_nodes + 1 values).
+        neighbors (array): A NumPy integer array of the sorted neighbors of each node.
+        previous (array): A NumPy int64 array of the previous node of each walker.
+        current (array): A NumPy int64 array of the current node of each walker.
+        degrees (array): A NumPy int64 array of the (non-zero) number of neighbors of each current node.
+        rng (Generator): A NumPy random generator.
+        alias_tables (tuple): An optional tuple of the alias probabilities and indices (see builds_alias_tables).
+        p (float): The node2vec return parameter.
+        q (float): The node2vec in-out parameter.
+
+    Returns:
+        A NumPy int64 array of positions in the neighbors array.
+    """
+
+    positions = np.empty(len(current), dtype=np.int64)
+    waiting = np.arange(len(current))
+    upper = max(1.0 / p, 1.0, 1.0 / q)
+
+    while len(waiting):
+        candidates = _samples_positions(offsets, current[waiting], degrees[waiting], rng, alias_tables)
+        targets = neighbors[candidates]
+        bias = np.where(targets == previous[waiting], 1.0 / p,
+                        np.where(searches_neighbors(offsets, neighbors, previous[waiting], targets) >= 0, 1.0, 1.0 / q))
+
+        accepted = rng.random(len(waiting)) * upper < bias
+        positions[waiting[accepted]] = candidates[accepted]
+        waiting = waiting[~accepted]
+
+    return positions
+
+
+def generates_walks(offsets, neighbors, starts, walk_length, rng, alias_tables=None, p=1.0, q=1.0):
+    """Generates one random walk from each start node, advancing all walkers together: at every step each walker moves
+    to a neighbor of its current node, chosen uniformly at random, in proportion to the edge weights if alias tables
+    are given (see builds_alias_tables), and with the node2vec return (p) and in-out (q) bias if either is not 1. A
+    walker that reaches a node without neighbors stops.
+
+    Args:
+        offsets (array): A NumPy int64 array of offsets (num_nodes + 1 values).
+        neighbors (array): A NumPy integer array of the sorted neighbors of each node.
+        starts (array): A NumPy integer array of start nodes, one per walk.
+        walk_length (int): The number of nodes in each walk (including the start node).
+        rng (Generator): A NumPy random generator.
+        alias_tables (tuple): An optional tuple of the alias probabilities and indices (see builds_alias_tables).
+        p (float): The node2vec return parameter.
+        q (float): The node2vec in-out parameter.
+
+    Returns:
+        A NumPy int32 array with one row per walk, where the nodes after the end of a stopped walk are -1.
+    """
+
+    walks = np.full((len(starts), walk_length), -1, dtype=np.int32)
+    walks[:, 0] = starts
+    active = np.arange(len(starts))
+    current = np.asarray(starts, dtype=np.int64)
+    previous = None
+
+    for step in range(1, walk_length):
+        degrees = offsets[current + 1] - offsets[current]
+        moving = degrees > 0
+        active, current, degrees = active[moving], current[moving], degrees[moving]
+
+        if len(active) == 0:
+            break
+
+        if previous is None or (p == 1 and q == 1):
+            positions = _samples_positions(offsets, current, degrees, rng, alias_tables)
+        else:
+            positions = _samples_biased_positions(offsets, neighbors, previous[moving], current, degrees, rng,
+                                                  alias_tables, p, q)
+
+        previous, current = current, neighbors[positions].astype(np.int64)
+        walks[active, step] = current
+
+    return walks
+
+
+def _generates_walk_shard(shard):
+    """Generates the walks of a shard in a worker process. Walk i starts from start node i modulo the number of start
+    nodes, so a shard only needs its range of walks. Each shard has its own random generator, so the walks do not
+    depend on the number of processes.
+
+    Args:
+        shard (tuple): A tuple of the shard index, the first and the end walk of the shard, the walk length, and the
+            seed.
+
+    Returns:
+        A tuple of the shard index and a NumPy int32 array of walks (see generates_walks).
+    """
+
+    index, first, end, walk_length, seed = shard
+    offsets, neighbors, starts, alias_tables, p, q = _walk_graph
+
+    return index, generates_walks(offsets, neighbors, starts[np.arange(first, end) % len(starts)], walk_length,
+                                  np.random.default_rng([seed, index]), alias_tables, p, q)
+
+
+class WalkCorpus(object):
+    """Class is a re-iterable corpus of random walks over a BCSR graph (see GraphEncoding.writes_bcsr), which can be
+    streamed into gensim's Word2Vec. Walks are uniform (DeepWalk), weighted by an edge weight file, and/or biased with
+    the node2vec p and q parameters (see generates_walks). The walks are generated shard by shard by a pool of worker
+    processes while they are consumed, so the corpus is never held in memory. Each shard is seeded on its own, so every
+    pass over the corpus (e.g. one per Word2Vec epoch) yields the same walks. If walk_dir is given, each shard is saved
+    there the first time it is generated and read back afterwards, so the walks can be reused and inspected.
+
+    Args:
+        bcsr_file (str): A string naming the file path of a BCSR graph.
+        num_walks (int): The number of walks started from each start node.
+        walk_length (int): The number of nodes in each walk.
+        processes (int): The number of worker processes used to generate walks.
+        seed (int): The seed of the random walks.
+        starts (array): An optional NumPy integer array of start nodes (defaults to every node).
+        shard_size (int): The number of walks per shard.
+        walk_dir (str): An optional string naming a directory to save the walk shards to.
+        weights_file (str): An optional string naming a NumPy file of edge weights aligned with the neighbors of the
+            graph (see aligns_edge_weights).
+        p (float): The node2vec return parameter.
+        q (float): The node2vec in-out parameter.
+
+    Raises:
+        An exception is raised if walk_dir holds walks generated with other parameters.
+    """
+
+    def __init__(self, bcsr_file, num_walks, walk_length, processes=1, seed=0, starts=None, shard_size=100000,
+                 walk_dir=None, weights_file=None, p=1.0, q=1.0):
+
+        self.offsets, self.neighbors = reads_bcsr(bcsr_file)
+        self.num_nodes = len(self.offsets) - 1
+        self.starts = np.arange(self.num_nodes, dtype=np.int64) if starts is None else np.asarray(starts, np.int64)
+        self.num_walks, self.walk_length, self.seed = num_walks, walk_length, seed
+        self.processes, self.shard_size, self.walk_dir = processes, shard_size, walk_dir
+        self.tokens = [str(node) for node in range(self.num_nodes)]
+        self.weights_file, self.p, self.q = weights_file, p, q
+        self.alias_tables = None if weights_file is None else reads_alias_tables(weights_file, self.offsets)
+
+        if walk_dir is not None:
+            self._checks_walk_dir()
+
+    def _checks_walk_dir(self):
+        """Records the parameters of the walks in walk_dir, or checks them against the recorded ones.
+
+        Returns:
+            None.
+
+        Raises:
+            An exception is raised if walk_dir holds walks generated with other parameters.
+        """
+
+        parameters = {'num_nodes': self.num_nodes, 'num_edges': len(self.neighbors), 'num_walks': self.num_walks,
+                      'walk_length': self.walk_length, 'seed': self.seed, 'shard_size': self.shard_size,
+                      'num_starts': len(self.starts), 'starts_checksum': int(self.starts.sum()),
+                      'weights_file': self.weights_file, 'p': self.p, 'q': self.q}
+        parameter_file = os.path.join(self.walk_dir, 'walks.json')
+
+        if os.path.exists(parameter_file):
+            with open(parameter_file, 'r') as infile:
+                if json.load(infile) != parameters:
+                    raise Exception('ERROR: {} holds walks generated with other parameters'.format(self.walk_dir))
+        else:
+            # written through a unique temporary file, so a process sharing walk_dir never reads a partial file
+            os.makedirs(self.walk_dir, exist_ok=True)
+            handle, temp_file = tempfile.mkstemp(suffix='.tmp', dir=self.walk_dir)
+            with os.fdopen(handle, 'w') as outfile:
+                json.dump(parameters, outfile)
+            os.replace(temp_file, parameter_file)
+
+        return None
+
+    def __len__(self):
+
+        return self.num_walks * len(self.starts)
+
+    def _shard_file(self, index):
+
+        return os.path.join(self.walk_dir, 'walks_{:06d}.npy'.format(index))
+
+    def _saves_shard(self, index, walks):
+        """Saves the walks of a shard atomically through a temporary file with a unique name, so several processes
+        (e.g. the runs of a sweep sharing a walk directory) can save the same shard at once. Walks only depend on the
+        seed, so a shard already saved by another process is kept as it is.
+
+        Args:
+            index (int): The index of the shard.
+            walks (ndarray): A NumPy int32 array of walks.
+
+        Returns:
+            None.
+        """
+
+        if os.path.exists(self._shard_file(index)):
+            return None
+
+        handle, temp_file = tempfile.mkstemp(suffix='.tmp', dir=self.walk_dir)
+
+        try:
+            with os.fdopen(handle, 'wb') as outfile:
+                np.save(outfile, walks)
+            os.replace(temp_file, self._shard_file(index))
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+        return None
+
+    def shards(self):
+        """Lists the shards of the corpus as ranges of walks (see _generates_walk_shard), so the start nodes of the
+        walks are only computed by the process generating each shard.
+
+        Returns:
+            A list of tuples of the shard index, the first and the end walk of the shard, the walk length, and the seed.
+        """
+
+        num_walks = len(self)
+
+        return [(index, first, min(first + self.shard_size, num_walks), self.walk_length, self.seed)
+                for index, first in enumerate(range(0, num_walks, self.shard_size))]
+
+    def iterates_shards(self):
+        """Generates (or reads) the walks of every shard, in shard order. At most two shards per process are generated
+        ahead of the consumer, so memory does not grow when the consumer is slower than the workers.
+
+        Returns:
+            A generator of NumPy int32 arrays of walks (see generates_walks).
+        """
+
+        shards = self.shards()
+        missing = [shard for shard in shards if self.walk_dir is None or not os.path.exists(self._shard_file(shard[0]))]
+        missing_ids, tasks, pending = {shard[0] for shard in missing}, iter(missing), deque()
+
+        if self.processes > 1 and len(missing) > 1:
+            pool = multiprocessing.Pool(self.processes, initializer=_initializes_walk_worker,
+                                        initargs=(self.offsets, self.neighbors, self.starts, self.alias_tables,
+                                                  self.p, self.q))
+
+            for shard in islice(tasks, 2 * self.processes):
+                pending.append(pool.apply_async(_generates_walk_shard, (shard,)))
+        else:
+            pool = None
+            _initializes_walk_worker(self.offsets, self.neighbors, self.starts, self.alias_tables, self.p, self.q)
+
+        try:
+            for shard in shards:
+                if shard[0] not in missing_ids:
+                    yield np.load(self._shard_file(shard[0]))
+                    continue
+
+                if pool is not None:
+                    index, walks = pending.popleft().get()
+                    pending.extend(pool.apply_async(_generates_walk_shard, (task,)) for task in islice(tasks, 1))
+                else:
+                    index, walks = _generates_walk_shard(next(tasks))
+
+                if self.walk_dir is not None:
+                    self._saves_shard(index, walks)
+
+                yield walks
+
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def __iter__(self):
+
+        tokens = self.tokens
+
+        for walks in self.iterates_shards():
+            lengths = (walks >= 0).sum(axis=1).tolist()
+
+            for walk, length in zip(walks.tolist(), lengths):
+                yield [tokens[node] for node in walk[:length]]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Writes an edge weight file for weighted walks from the evidence '
+                                                 'scores of a set of edges.')
+    parser.add_argument('-g', '--graph', help='name/path to the BCSR graph', required=True)
+    parser.add_argument('-e', '--edges', help='name/path to the tab-delimited file of subject IRIs, object IRIs, and '
+                                              'scores', required=True)
+    parser.add_argument('-o', '--output', help='name/path to the NumPy edge weight file', required=True)
+    parser.add_argument('-c', '--column', help='column of the edge file holding the score', type=int, default=2)
+    parser.add_argument('-d', '--default', help='weight of the edges without a score', type=float, default=1.0)
+    parser.add_argument('-u', '--undirected', help='the graph holds each edge in both directions',
+                        action='store_true')
+    args = parser.parse_args()
+
+    writes_edge_weights(args.graph, args.edges, args.output, args.column, args.default, args.undirected)
+
+
+if __name__ == '__main__':
+    main()
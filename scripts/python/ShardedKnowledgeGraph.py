@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import argparse
+import glob
+import heapq
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+from tqdm import tqdm
+
+from scripts.python.KnowledgeGraph import generates_edge_triples, ntriple_line
+from scripts.python.Profiler import records_items
+
+
+# NOTE: the work queue is a directory with 'pending', 'claimed', and 'done' sub-directories holding one json file per
+#  task. A worker claims a task by renaming its file from 'pending' to 'claimed', which is atomic on a single file
+#  system (including shared file systems), so any number of local or remote workers can share a queue. While a task
+#  is built, its worker touches the claimed file every heartbeat_interval seconds, so a claimed file that has not been
+#  modified for longer than the re-queue timeout belongs to a worker that died.
+
+# seconds between two touches of a claimed task file (re-queue timeouts should be several times longer)
+heartbeat_interval = 30
+
+
+def _writes_atomically(filepath, lines):
+    """Writes lines to a temporary file which is then renamed to filepath, so readers never see a partial file.
+
+    Args:
+        filepath (str): A string naming the file path to write to.
+        lines (iterable): An iterable of strings.
+
+    Returns:
+        None.
+    """
+
+    temp_file = '{path}.{host}.{pid}.tmp'.format(path=filepath, host=socket.gethostname(), pid=os.getpid())
+
+    with open(temp_file, 'w') as outfile:
+        outfile.writelines(lines)
+
+    os.replace(temp_file, filepath)
+
+    return None
+
+
+def creates_shard_tasks(edge_dict, queue_dir, edge_groups=None):
+    """Creates a file-based work queue with one task per edge type, or per group of edge types. Each task file holds
+    all of the edge information needed to build its shard, so a worker does not need anything else from the build.
+
+    Args:
+        edge_dict (dict): A nested dictionary of edge lists by data source (see EdgeDictionary.EdgeList.source_info).
+        queue_dir (str): A string naming the directory of the work queue.
+        edge_groups (dict): An optional dictionary mapping a shard name to a list of edge types to build together
+            (defaults to one shard per edge type).
+
+    Returns:
+        A list of the shard names.
+    """
+
+    for status in ('pending', 'claimed', 'done'):
+        os.makedirs(os.path.join(queue_dir, status), exist_ok=True)
+
+    edge_groups = edge_groups or {edge_type: [edge_type] for edge_type in edge_dict}
+
+    for shard, edge_types in sorted(edge_groups.items()):
+        task = {'shard': shard, 'edges': {edge_type: edge_dict[edge_type] for edge_type in edge_types}}
+        _writes_atomically(os.path.join(queue_dir, 'pending', shard + '.json'), [json.dumps(task)])
+
+    return sorted(edge_groups)
+
+
+def claims_shard_task(queue_dir):
+    """Claims the next pending task of a work queue.
+
+    Args:
+        queue_dir (str): A string naming the directory of the work queue.
+
+    Returns:
+        A string naming the file path of the claimed task or None if there are no pending tasks.
+    """
+
+    for task in sorted(os.listdir(os.path.join(queue_dir, 'pending'))):
+        pending, claimed = os.path.join(queue_dir, 'pending', task), os.path.join(queue_dir, 'claimed', task)
+
+        try:
+            # record the claim time before the claim is published (rename keeps the modification time, so a task
+            # re-queued earlier would otherwise look stale as soon as it is claimed)
+            os.utime(pending, None)
+            os.rename(pending, claimed)
+        except OSError:
+            # another worker claimed the task first
+            continue
+
+        return claimed
+
+    return None
+
+
+def requeues_stale_tasks(queue_dir, timeout):
+    """Moves claimed tasks whose worker has not sent a heartbeat (see processes_shard_tasks) for more than timeout
+    seconds back to pending.
+
+    Args:
+        queue_dir (str): A string naming the directory of the work queue.
+        timeout (float): The number of seconds without a heartbeat after which a claimed task is considered
+            abandoned (several times heartbeat_interval).
+
+    Returns:
+        A list of the names of the re-queued tasks.
+    """
+
+    requeued = []
+
+    for task in sorted(os.listdir(os.path.join(queue_dir, 'claimed'))):
+        claimed = os.path.join(queue_dir, 'claimed', task)
+
+        try:
+            if time.time() - os.path.getmtime(claimed) > timeout:
+                os.rename(claimed, os.path.join(queue_dir, 'pending', task))
+                requeued.append(task)
+        except OSError:
+            continue
+
+    return requeued
+
+
+def builds_edge_shard(task_file, shard_dir):
+    """Builds the triples of a single task and writes them to shard_dir as a sorted, de-duplicated N-Triples file
+    (named after the shard) and its class instance iri map as a json file. Class instance iris are derived from the
+    class iri (see KnowledgeGraph.creates_class_instance_iri), so shards built independently agree on them.
+
+    Args:
+        task_file (str): A string naming the file path of a task.
+        shard_dir (str): A string naming the directory to write the shard to.
+
+    Returns:
+        A string naming the file path of the N-Triples shard.
+    """
+
+    with open(task_file, 'r') as infile:
+        task = json.load(infile)
+
+    triples, kg_class_iri_map = set(), {}
+
+    for edge_type, edge_info in sorted(task['edges'].items()):
+        data_type = 'class' if edge_info['data_type'] in ('class-instance', 'instance-class') else 'other'
+        triples.update(generates_edge_triples(edge_info, data_type, kg_class_iri_map, deterministic_iris=True))
+
+    shard_file = os.path.join(shard_dir, task['shard'] + '.nt')
+    _writes_atomically(os.path.join(shard_dir, task['shard'] + '_ClassInstanceMap.json'),
+                       [json.dumps(kg_class_iri_map, sort_keys=True)])
+    _writes_atomically(shard_file, sorted(ntriple_line.format(*edge) for edge in triples))
+    records_items(len(triples), 'edges')
+
+    return shard_file
+
+
+def _heartbeats(task_file, stopped, interval):
+    """Touches a claimed task file every interval seconds until stopped is set or the file is gone (i.e. the task was
+    re-queued).
+
+    Args:
+        task_file (str): A string naming the file path of a claimed task.
+        stopped (threading.Event): An event set when the task is finished.
+        interval (float): The number of seconds between two touches.
+
+    Returns:
+        None.
+    """
+
+    while not stopped.wait(interval):
+        try:
+            os.utime(task_file, None)
+        except OSError:
+            return None
+
+    return None
+
+
+def processes_shard_tasks(queue_dir, shard_dir):
+    """Runs a worker that claims and builds tasks from a work queue until no pending tasks are left. A heartbeat
+    thread keeps the claimed task fresh while it is built. A task that was re-queued in the meantime (e.g. after a long
+    pause of the worker) is left to the worker that claims it again, which builds the same shard.
+
+    Args:
+        queue_dir (str): A string naming the directory of the work queue.
+        shard_dir (str): A string naming the directory to write the shards to.
+
+    Returns:
+        A list of the names of the shards built by the worker.
+    """
+
+    os.makedirs(shard_dir, exist_ok=True)
+    built = []
+
+    while True:
+        task_file = claims_shard_task(queue_dir)
+
+        if task_file is None:
+            return built
+
+        stopped = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeats, args=(task_file, stopped, heartbeat_interval), daemon=True)
+        heartbeat.start()
+
+        try:
+            shard_file = builds_edge_shard(task_file, shard_dir)
+        finally:
+            stopped.set()
+            heartbeat.join()
+
+        try:
+            os.rename(task_file, os.path.join(queue_dir, 'done', os.path.basename(task_file)))
+        except FileNotFoundError:
+            print('Task {} was re-queued while it was built'.format(os.path.basename(task_file)))
+            continue
+
+        built.append(os.path.basename(shard_file))
+
+
+def runs_shard_workers(queue_dir, shard_dir, processes=None):
+    """Runs several local workers on a work queue (see processes_shard_tasks) and waits for them to finish.
+
+    Args:
+        queue_dir (str): A string naming the directory of the work queue.
+        shard_dir (str): A string naming the directory to write the shards to.
+        processes (int): The number of worker processes (defaults to the number of CPUs).
+
+    Returns:
+        A list of the names of the shards that were built.
+    """
+
+    processes = processes or multiprocessing.cpu_count()
+
+    with multiprocessing.Pool(processes) as pool:
+        built = pool.starmap(processes_shard_tasks, [(queue_dir, shard_dir)] * processes)
+
+    return sorted(shard for shards in built for shard in shards)
+
+
+def _sorts_triple_file(triple_file, sorted_file):
+    """Makes sure a N-Triples file is sorted and de-duplicated (like the shards written by builds_edge_shard). A file
+    that already is (e.g. a shard) is used as it is, otherwise (e.g. the ontology) its sorted, de-duplicated lines are
+    written to sorted_file.
+
+    Args:
+        triple_file (str): A string naming a N-Triples file.
+        sorted_file (str): A string naming the file path to write the sorted lines to, if needed.
+
+    Returns:
+        A string naming the sorted file: triple_file or sorted_file.
+    """
+
+    previous = None
+
+    with open(triple_file, 'r') as infile:
+        for line in infile:
+            if not line.endswith('\n') or (previous is not None and line <= previous):
+                break
+            previous = line
+        else:
+            return triple_file
+
+    with open(triple_file, 'r') as infile:
+        lines = {line if line.endswith('\n') else line + '\n' for line in infile}
+    _writes_atomically(sorted_file, sorted(lines))
+
+    return sorted_file
+
+
+def merges_edge_shards(triple_files, output, shard_dir=None, class_map_output=None):
+    """Combines N-Triples files (e.g. the ontology and the edge shards) into a single sorted N-Triples file without
+    repeated triples. Shards are sorted and de-duplicated when they are built and other files (e.g. the ontology) are
+    sorted first (see _sorts_triple_file), so the files are combined with an exact k-way merge that drops adjacent
+    repeated lines, holding one line per file in memory. The same inputs always produce a byte-identical output. The
+    class instance iri maps of the shards can also be combined.
+
+    Args:
+        triple_files (list): A list of strings naming N-Triples files.
+        output (str): A string naming the file path to write the combined triples to.
+        shard_dir (str): An optional string naming the directory holding the class instance iri maps of the shards.
+        class_map_output (str): An optional string naming the file path to write the combined iri map to.
+
+    Returns:
+        None.
+    """
+
+    print('\n\n' + '=' * len('Merging Knowledge Graph Shards'))
+    print('Merging Knowledge Graph Shards')
+    print('=' * len('Merging Knowledge Graph Shards') + '\n')
+
+    sorted_files = [_sorts_triple_file(triple_file, '{}.{}.sorted.tmp'.format(output, i))
+                    for i, triple_file in enumerate(tqdm(triple_files))]
+    infiles = [open(sorted_file, 'r') for sorted_file in sorted_files]
+    previous, edge_count = None, 0
+
+    try:
+        with open(output, 'w') as outfile:
+            for line in heapq.merge(*infiles):
+                if line != previous:
+                    outfile.write(line)
+                    edge_count += 1
+                    previous = line
+    finally:
+        for infile in infiles:
+            infile.close()
+        for sorted_file, triple_file in zip(sorted_files, triple_files):
+            if sorted_file != triple_file:
+                os.remove(sorted_file)
+
+    if shard_dir is not None and class_map_output is not None:
+        kg_class_iri_map = {}
+
+        for map_file in sorted(glob.glob(os.path.join(shard_dir, '*_ClassInstanceMap.json'))):
+            with open(map_file, 'r') as infile:
+                kg_class_iri_map.update(json.load(infile))
+
+        with open(class_map_output, 'w') as outfile:
+            json.dump(kg_class_iri_map, outfile, sort_keys=True)
+
+    print('\nKG has {edge} edges\n'.format(edge=edge_count))
+    records_items(edge_count, 'edges')
+
+    return None
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Builds knowledge graph edge shards from a file-based work queue.')
+    parser.add_argument('action', choices=['queue', 'work', 'merge'], help='create a queue, run a worker, or merge')
+    parser.add_argument('-q', '--queue', help='name/path to the work queue directory', required=True)
+    parser.add_argument('-s', '--shards', help='name/path to the shard directory', required=True)
+    parser.add_argument('-e', '--edges', help='name/path to the master edge dictionary json (queue)')
+    parser.add_argument('-p', '--processes', help='number of local workers (work)', type=int, default=1)
+    parser.add_argument('-t', '--timeout', help='seconds before a claimed task is re-queued (work)', type=float)
+    parser.add_argument('-g', '--ontology', help='name/path to the ontology as N-Triples (merge)')
+    parser.add_argument('-o', '--out', help='name/path to write the merged knowledge graph to (merge)')
+    args = parser.parse_args()
+
+    if args.action == 'queue':
+        with open(args.edges, 'r') as infile:
+            creates_shard_tasks(json.load(infile), args.queue)
+
+    elif args.action == 'work':
+        if args.timeout is not None:
+            requeues_stale_tasks(args.queue, args.timeout)
+        runs_shard_workers(args.queue, args.shards, args.processes)
+
+    else:
+        shard_files = sorted(glob.glob(os.path.join(args.shards, '*.nt')))
+        merges_edge_shards(([args.ontology] if args.ontology else []) + shard_files, args.out, args.shards,
+                           args.out.rsplit('.', 1)[0] + '_ClassInstanceMap.json')
+
+
+if __name__ == '__main__':
+    main()
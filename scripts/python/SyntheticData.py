@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import argparse
+import json
+import os
+import random
+
+from tqdm import tqdm
+
+
+# resource_info.txt rows for the synthetic sources, written in the same format as ./resources/resource_info.txt. The
+# GAF identifier map points to a text file instead of the UniProt API so the data can be processed without network
+# access.
+resource_info_rows = [
+    'chemical-gene|;MESH_;|class-instance|RO_0002434|http://purl.obolibrary.org/obo/|http://purl.uniprot.org/geneid/|'
+    '#|t|1;4|0:./maps/MESH_CHEBI_MAP.txt|None|7;==;9606',
+    'gene-gobp|;;|instance-class|BFO_0000056|http://purl.uniprot.org/geneid/|http://purl.obolibrary.org/obo/|!|t|1;4|'
+    '0:./maps/UNIPROT_ENTREZ_MAP.txt|None|8;==;P::12;==;taxon:9606',
+    'gene-phenotype|;;|instance-class|RO_0002200|http://purl.uniprot.org/geneid/|http://purl.obolibrary.org/obo/|n|t|'
+    '0;3|None|None|None',
+    'disease-phenotype|;;|class-class|RO_0002452|http://purl.obolibrary.org/obo/|http://purl.obolibrary.org/obo/|n|t|'
+    '0;3|0:disease-dbxref-map|None|None',
+    'gene-gene|.;;|instance-instance|RO_0002434|http://purl.uniprot.org/geneid/|http://purl.uniprot.org/geneid/|n|'
+    "' '|0;1|0:./maps/STRING_ENTREZ_MAP.txt;1:./maps/STRING_ENTREZ_MAP.txt|2;>=;700|None"]
+
+owl_header = '''<?xml version="1.0"?>
+<rdf:RDF xmlns="http://purl.obolibrary.org/obo/{name}.owl#"
+     xml:base="http://purl.obolibrary.org/obo/{name}.owl"
+     xmlns:obo="http://purl.obolibrary.org/obo/"
+     xmlns:owl="http://www.w3.org/2002/07/owl#"
+     xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+     xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"
+     xmlns:oboInOwl="http://www.geneontology.org/formats/oboInOwl#">
+    <owl:Ontology rdf:about="http://purl.obolibrary.org/obo/{name}.owl"/>
+'''
+
+owl_class = '''    <owl:Class rdf:about="http://purl.obolibrary.org/obo/{iri}">
+        <rdfs:subClassOf rdf:resource="http://purl.obolibrary.org/obo/{parent}"/>
+        <oboInOwl:hasDbXref rdf:datatype="http://www.w3.org/2001/XMLSchema#string">{xref}</oboInOwl:hasDbXref>
+        <rdfs:label rdf:datatype="http://www.w3.org/2001/XMLSchema#string">{label}</rdfs:label>
+    </owl:Class>
+'''
+
+
+class SyntheticIdentifiers(object):
+    """Class creates the identifier pools shared by the synthetic sources, so the edge files, identifier maps, and
+    ontologies refer to the same entities. Pool sizes grow with the number of rows, so the number of edges per entity
+    is roughly the same at every scale.
+
+    Args:
+        rows (int): The number of rows written to each edge file.
+        seed (int): The seed of the random number generator.
+
+    """
+
+    def __init__(self, rows, seed=0):
+
+        self.random = random.Random(seed)
+        size = max(100, rows // 20)
+
+        self.genes = ['{}'.format(100 + i) for i in range(size)]
+        self.proteins = ['P{:05d}'.format(i) for i in range(size)]
+        self.string_proteins = ['ENSP{:011d}'.format(i) for i in range(size)]
+        self.chemicals = ['D{:06d}'.format(i) for i in range(max(50, size // 4))]
+        self.diseases = ['{:06d}'.format(100000 + i) for i in range(max(50, size // 4))]
+        self.phenotypes = ['{:07d}'.format(i + 1) for i in range(max(50, size // 2))]
+        self.go_terms = ['{:07d}'.format(i + 1) for i in range(max(50, size // 2))]
+
+    def picks(self, pool):
+        """Picks an identifier from a pool, skewed towards the start of the pool like the degrees of real sources.
+
+        Args:
+            pool (list): A list of identifiers.
+
+        Returns:
+            A string containing an identifier.
+        """
+
+        return pool[min(int(self.random.paretovariate(1.2)) - 1, len(pool) - 1) if self.random.random() < 0.5
+                    else self.random.randrange(len(pool))]
+
+
+def _writes_lines(filepath, header, lines):
+    """Writes a header followed by lines to a file, streaming the lines so large files are never held in memory.
+
+    Args:
+        filepath (str): A string naming the file path to write to.
+        header (str): A string written before the lines.
+        lines (iterable): An iterable of strings, each without its line break.
+
+    Returns:
+        None.
+    """
+
+    with open(filepath, 'w') as outfile:
+        outfile.write(header)
+
+        for line in lines:
+            outfile.write(line + '\n')
+
+    return None
+
+
+def writes_ctd_file(ids, filepath, rows):
+    """Writes a CTD chemical-gene interaction style file ('#' comment header, tab-separated).
+
+    Args:
+        ids (SyntheticIdentifiers): The identifier pools.
+        filepath (str): A string naming the file path to write to.
+        rows (int): The number of rows to write.
+
+    Returns:
+        None.
+    """
+
+    header = '# Comparative Toxicogenomics Database (synthetic)\n# Fields:\n# ChemicalName\tChemicalID\tCasRN\t' \
+             'GeneSymbol\tGeneID\tGeneForms\tOrganism\tOrganismID\tInteraction\tInteractionActions\tPubMedIDs\n#\n'
+
+    def lines():
+        for _ in range(rows):
+            chemical, gene = ids.picks(ids.chemicals), ids.picks(ids.genes)
+            organism = ('Homo sapiens', '9606') if ids.random.random() < 0.8 else ('Mus musculus', '10090')
+            yield '\t'.join(['chem' + chemical, chemical, '', 'GENE' + gene, gene, 'protein', organism[0],
+                             organism[1], 'chem' + chemical + ' affects GENE' + gene, 'affects^expression',
+                             str(ids.random.randrange(10000000, 30000000))])
+
+    _writes_lines(filepath, header, lines())
+
+    return None
+
+
+def writes_gaf_file(ids, filepath, rows):
+    """Writes a GO annotation file (GAF 2.1) style file ('!' comment header, tab-separated).
+
+    Args:
+        ids (SyntheticIdentifiers): The identifier pools.
+        filepath (str): A string naming the file path to write to.
+        rows (int): The number of rows to write.
+
+    Returns:
+        None.
+    """
+
+    header = '!gaf-version: 2.1\n!generated-by: synthetic\n'
+
+    def lines():
+        for _ in range(rows):
+            protein = ids.picks(ids.proteins)
+            taxon = 'taxon:9606' if ids.random.random() < 0.9 else 'taxon:10090'
+            yield '\t'.join(['UniProtKB', protein, 'SYM' + protein, '', 'GO:' + ids.picks(ids.go_terms),
+                             'PMID:' + str(ids.random.randrange(10000000, 30000000)), 'IDA', '',
+                             ids.random.choice('PFC'), '', '', 'protein', taxon, '20190101', 'UniProt', '', ''])
+
+    _writes_lines(filepath, header, lines())
+
+    return None
+
+
+def writes_hpo_gene_file(ids, filepath, rows):
+    """Writes an HPO genes_to_phenotype style file (one header line, tab-separated).
+
+    Args:
+        ids (SyntheticIdentifiers): The identifier pools.
+        filepath (str): A string naming the file path to write to.
+        rows (int): The number of rows to write.
+
+    Returns:
+        None.
+    """
+
+    header = '#Format: entrez-gene-id<tab>entrez-gene-symbol<tab>HPO-Term-Name<tab>HPO-Term-ID\n'
+
+    def lines():
+        for _ in range(rows):
+            gene, phenotype = ids.picks(ids.genes), ids.picks(ids.phenotypes)
+            yield '\t'.join([gene, 'GENE' + gene, 'phenotype ' + phenotype, 'HP:' + phenotype])
+
+    _writes_lines(filepath, header, lines())
+
+    return None
+
+
+def writes_hpo_disease_file(ids, filepath, rows):
+    """Writes an HPO diseases_to_genes_to_phenotypes style file (one header line, tab-separated).
+
+    Args:
+        ids (SyntheticIdentifiers): The identifier pools.
+        filepath (str): A string naming the file path to write to.
+        rows (int): The number of rows to write.
+
+    Returns:
+        None.
+    """
+
+    header = '#Format: diseaseId<tab>gene-symbol<tab>gene-id<tab>HPO-ID<tab>HPO-term-name\n'
+
+    def lines():
+        for _ in range(rows):
+            disease, gene, phenotype = ids.picks(ids.diseases), ids.picks(ids.genes), ids.picks(ids.phenotypes)
+            yield '\t'.join(['OMIM:' + disease, 'GENE' + gene, gene, 'HP:' + phenotype, 'phenotype ' + phenotype])
+
+    _writes_lines(filepath, header, lines())
+
+    return None
+
+
+def writes_string_file(ids, filepath, rows):
+    """Writes a STRING protein links style file (one header line, space-separated).
+
+    Args:
+        ids (SyntheticIdentifiers): The identifier pools.
+        filepath (str): A string naming the file path to write to.
+        rows (int): The number of rows to write.
+
+    Returns:
+        None.
+    """
+
+    def lines():
+        for _ in range(rows):
+            yield ' '.join(['9606.' + ids.picks(ids.string_proteins), '9606.' + ids.picks(ids.string_proteins),
+                            str(ids.random.randrange(150, 1000))])
+
+    _writes_lines(filepath, 'protein1 protein2 combined_score\n', lines())
+
+    return None
+
+
+def writes_identifier_maps(ids, map_dir):
+    """Writes the text identifier maps used by the synthetic sources (see EdgeList.queries_txt_file). About one in
+    twenty identifiers is left unmapped and some identifiers map to two targets, as in the real maps.
+
+    Args:
+        ids (SyntheticIdentifiers): The identifier pools.
+        map_dir (str): A string naming the directory to write the maps to.
+
+    Returns:
+        None.
+    """
+
+    maps = [('MESH_CHEBI_MAP.txt', ['MESH_' + x for x in ids.chemicals], None),
+            ('UNIPROT_ENTREZ_MAP.txt', ids.proteins, ids.genes),
+            ('STRING_ENTREZ_MAP.txt', ids.string_proteins, ids.genes)]
+
+    for filename, sources, targets in maps:
+        def lines():
+            for source in sources:
+                if ids.random.random() < 0.05:
+                    continue
+
+                mapped = [ids.random.choice(targets) if targets else 'CHEBI_' + str(ids.random.randrange(1, 99999))
+                          for _ in range(1 if ids.random.random() < 0.9 else 2)]
+                yield source + '\t' + '|'.join(mapped)
+
+            # the last line of a map is not read (see EdgeList.queries_txt_file)
+            yield ''
+
+        _writes_lines(os.path.join(map_dir, filename), '', lines())
+
+    return None
+
+
+def writes_ontology(ids, filepath, name, prefix, classes, xref_prefix, xrefs):
+    """Writes a small OWL (RDF/XML) ontology with a subclass hierarchy and one database cross-reference per class.
+
+    Args:
+        ids (SyntheticIdentifiers): The identifier pools.
+        filepath (str): A string naming the file path to write to.
+        name (str): A string naming the ontology (e.g. 'doid').
+        prefix (str): A string containing the class identifier prefix (e.g. 'DOID_').
+        classes (list): A list of class identifiers (without prefix).
+        xref_prefix (str): A string containing the cross-reference prefix (e.g. 'OMIM:').
+        xrefs (list): A list of identifiers to cross-reference, one per class.
+
+    Returns:
+        None.
+    """
+
+    def lines():
+        for index, class_id in enumerate(classes):
+            parent = prefix + classes[ids.random.randrange(index)] if index > 0 else 'BFO_0000001'
+            yield owl_class.format(iri=prefix + class_id, parent=parent, xref=xref_prefix + xrefs[index],
+                                   label=name + ' class ' + class_id).rstrip('\n')
+        yield '</rdf:RDF>'
+
+    _writes_lines(filepath, owl_header.format(name=name), lines())
+
+    return None
+
+
+def generates_synthetic_data(output_dir, rows, seed=0):
+    """Writes a deterministic synthetic copy of the inputs of the edge list step: CTD, GAF, HPO, and STRING style edge
+    files, their identifier maps, a disease and a phenotype ontology with database cross-references, a
+    resource_info.txt file, and a json file mapping each source to its file (as DataSources.Data.data_files). All
+    paths are relative to output_dir, which must be the working directory when the data are processed.
+
+    Args:
+        output_dir (str): A string naming the directory to write the data to.
+        rows (int): The number of rows written to each edge file (e.g. 10,000 to 50,000,000).
+        seed (int): The seed of the random number generator, the same seed and rows always give the same files.
+
+    Returns:
+        A dictionary mapping each source to its file path, relative to output_dir.
+    """
+
+    print('\n\n' + '=' * len('Generating Synthetic Data: {} Rows per Source'.format(rows)))
+    print('Generating Synthetic Data: {} Rows per Source'.format(rows))
+    print('=' * len('Generating Synthetic Data: {} Rows per Source'.format(rows)) + '\n')
+
+    for directory in ('edge_data', 'maps', 'ontologies'):
+        os.makedirs(os.path.join(output_dir, directory), exist_ok=True)
+
+    ids = SyntheticIdentifiers(rows, seed)
+    data_files = {'chemical-gene': './edge_data/chemical-gene_ctd_class_data.txt',
+                  'gene-gobp': './edge_data/gene-go_gaf_class_data.txt',
+                  'gene-phenotype': './edge_data/gene-phenotype_hpo_class_data.txt',
+                  'disease-phenotype': './edge_data/disease-phenotype_hpo_class_data.txt',
+                  'gene-gene': './edge_data/gene-gene_string_instance_data.txt',
+                  'disease': './ontologies/doid.owl',
+                  'phenotype': './ontologies/hp.owl'}
+
+    writers = [(writes_ctd_file, 'chemical-gene'), (writes_gaf_file, 'gene-gobp'),
+               (writes_hpo_gene_file, 'gene-phenotype'), (writes_hpo_disease_file, 'disease-phenotype'),
+               (writes_string_file, 'gene-gene')]
+
+    for writer, source in tqdm(writers):
+        writer(ids, os.path.join(output_dir, data_files[source]), rows)
+
+    writes_identifier_maps(ids, os.path.join(output_dir, 'maps'))
+    writes_ontology(ids, os.path.join(output_dir, data_files['disease']), 'doid', 'DOID_',
+                    [str(i + 1) for i in range(len(ids.diseases))], 'OMIM:', ids.diseases)
+    writes_ontology(ids, os.path.join(output_dir, data_files['phenotype']), 'hp', 'HP_', ids.phenotypes, 'UMLS:C',
+                    [str(1000000 + i) for i in range(len(ids.phenotypes))])
+
+    # EdgeList reads every line of resource_info.txt, so the file has no trailing line break
+    with open(os.path.join(output_dir, 'resource_info.txt'), 'w') as outfile:
+        outfile.write('\n'.join(resource_info_rows))
+
+    with open(os.path.join(output_dir, 'data_files.json'), 'w') as outfile:
+        json.dump(data_files, outfile, indent=2)
+
+    return data_files
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Generates deterministic synthetic inputs for the edge list step.')
+    parser.add_argument('-o', '--out', help='name/path to the directory to write the data to', required=True)
+    parser.add_argument('-r', '--rows', help='number of rows per edge file', type=int, default=10000)
+    parser.add_argument('-s', '--seed', help='seed of the random number generator', type=int, default=0)
+    args = parser.parse_args()
+
+    generates_synthetic_data(args.out, args.rows, args.seed)
+
+
+if __name__ == '__main__':
+    main()
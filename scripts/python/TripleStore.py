@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import numpy as np
+
+from array import array
+from rdflib import Graph
+from rdflib.store import Store
+
+
+# orders of the subject (0), predicate (1), and object (2) columns in the spo, pos, and osp indexes
+spo_order, pos_order, osp_order = (0, 1, 2), (1, 2, 0), (2, 0, 1)
+
+
+class TripleStore(Store):
+    """Class is a compact in-memory rdflib store. Every term is stored once and encoded as an integer, and triples are
+    held as three sorted int32 NumPy arrays (subject, predicate, object), with predicate-object-subject and
+    object-subject-predicate permutations built when a pattern needs them. A triple costs 12 bytes per index instead
+    of the hundreds of bytes of Python objects in rdflib's default store.
+
+    The class implements the rdflib Store interface, so a Graph backed by it (see creates_graph) supports everything
+    an ordinary Graph does (parse, add, remove, triples, serialize, and SPARQL queries) and can be passed to the
+    functions in KnowledgeGraph in place of Graph(). Added triples are buffered and merged into the sorted arrays (and
+    de-duplicated) the next time the store is read, so bulk loading is fast but interleaving single adds with reads is
+    not.
+
+    Args:
+        configuration (str): Not used, part of the rdflib Store interface.
+        identifier (Identifier): Not used, part of the rdflib Store interface.
+
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, configuration=None, identifier=None):
+
+        super(TripleStore, self).__init__(configuration, identifier)
+
+        self.terms = []
+        self.term_ids = {}
+        self.pending = array('i')
+        self.columns = tuple(np.empty(0, dtype=np.int32) for _ in range(3))
+        self.indexes = {}
+        self.namespace_map = {}
+        self.prefix_map = {}
+
+    def encodes_term(self, term):
+        """Gets the integer of a term, adding the term to the dictionary if it is new.
+
+        Args:
+            term (Identifier): An rdflib term.
+
+        Returns:
+            An integer identifying the term.
+        """
+
+        term_id = self.term_ids.get(term)
+
+        if term_id is None:
+            term_id = len(self.terms)
+            self.term_ids[term] = term_id
+            self.terms.append(term)
+
+        return term_id
+
+    def _flushes(self):
+        """Merges the buffered triples into the sorted arrays, dropping repeated triples.
+
+        Returns:
+            None.
+        """
+
+        if not self.pending:
+            return None
+
+        added = np.frombuffer(self.pending, dtype=np.int32).reshape(-1, 3)
+        columns = [np.concatenate((self.columns[i], added[:, i])) for i in range(3)]
+        self.pending = array('i')
+
+        order = np.lexsort((columns[2], columns[1], columns[0]))
+        columns = [column[order] for column in columns]
+
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = (columns[0][1:] != columns[0][:-1]) | (columns[1][1:] != columns[1][:-1]) | \
+                   (columns[2][1:] != columns[2][:-1])
+
+        self.columns = tuple(np.ascontiguousarray(column[keep]) for column in columns)
+        self.indexes = {spo_order: self.columns}
+
+        return None
+
+    def gets_index(self, order):
+        """Gets the triples sorted in the given column order, building the permutation the first time it is needed.
+
+        Args:
+            order (tuple): A tuple of the column positions (e.g. pos_order).
+
+        Returns:
+            A tuple of three contiguous int32 arrays, one per column of the order.
+        """
+
+        self._flushes()
+
+        if order not in self.indexes:
+            columns = [self.columns[i] for i in order]
+            permutation = np.lexsort((columns[2], columns[1], columns[0]))
+            self.indexes[order] = tuple(np.ascontiguousarray(column[permutation]) for column in columns)
+
+        return self.indexes[order]
+
+    def matches(self, pattern_ids):
+        """Finds the triples matching a pattern of term integers with binary searches on the index whose leading
+        columns are the bound positions of the pattern.
+
+        Args:
+            pattern_ids (tuple): A tuple of three integers, or None for unbound positions.
+
+        Returns:
+            A tuple of three int32 arrays holding the subjects, predicates, and objects of the matching triples.
+        """
+
+        bound = tuple(x is not None for x in pattern_ids)
+        order = pos_order if bound in ((False, True, True), (False, True, False)) else \
+            osp_order if bound in ((True, False, True), (False, False, True)) else spo_order
+
+        index = self.gets_index(order)
+        start, end = 0, len(index[0])
+
+        for position, column in zip(order, index):
+            if pattern_ids[position] is None:
+                break
+
+            values = column[start:end]
+            start, end = start + np.searchsorted(values, pattern_ids[position], 'left'), \
+                start + np.searchsorted(values, pattern_ids[position], 'right')
+
+        rows = [column[start:end] for column in index]
+
+        return tuple(rows[order.index(i)] for i in range(3))
+
+    def add(self, triple, context=None, quoted=False):
+        """Adds a triple to the store.
+
+        Args:
+            triple (tuple): A tuple of three rdflib terms.
+            context (Graph): Not used, the store is not context aware.
+            quoted (bool): Not used, the store is not formula aware.
+
+        Returns:
+            None.
+        """
+
+        self.pending.extend([self.encodes_term(triple[0]), self.encodes_term(triple[1]), self.encodes_term(triple[2])])
+
+        return None
+
+    def addN(self, quads):
+        """Adds triples to the store from quads, ignoring the context.
+
+        Args:
+            quads (iterable): An iterable of tuples of a subject, predicate, object, and context.
+
+        Returns:
+            None.
+        """
+
+        for s, p, o, _ in quads:
+            self.pending.extend([self.encodes_term(s), self.encodes_term(p), self.encodes_term(o)])
+
+        return None
+
+    def remove(self, triple_pattern, context=None):
+        """Removes every triple matching a pattern, where None matches any term.
+
+        Args:
+            triple_pattern (tuple): A tuple of three rdflib terms or None.
+            context (Graph): Not used, the store is not context aware.
+
+        Returns:
+            None.
+        """
+
+        self._flushes()
+
+        if any(term is not None and term not in self.term_ids for term in triple_pattern):
+            return None
+
+        remove = np.ones(len(self.columns[0]), dtype=bool)
+        for column, term in zip(self.columns, triple_pattern):
+            if term is not None:
+                remove &= column == self.term_ids[term]
+
+        if remove.any():
+            self.columns = tuple(np.ascontiguousarray(column[~remove]) for column in self.columns)
+            self.indexes = {spo_order: self.columns}
+
+        return None
+
+    def triples(self, triple_pattern, context=None):
+        """Finds the triples matching a pattern, where None matches any term. The matches are taken from a snapshot,
+        so the store can be changed while iterating over them.
+
+        Args:
+            triple_pattern (tuple): A tuple of three rdflib terms or None.
+            context (Graph): Not used, the store is not context aware.
+
+        Returns:
+            A generator of tuples of a triple and an (empty) iterator of its contexts.
+        """
+
+        if any(term is not None and term not in self.term_ids for term in triple_pattern):
+            return
+
+        rows = self.matches(tuple(None if term is None else self.term_ids[term] for term in triple_pattern))
+        terms = self.terms
+
+        for start in range(0, len(rows[0]), 100000):
+            for s, p, o in zip(*[column[start:start + 100000].tolist() for column in rows]):
+                yield (terms[s], terms[p], terms[o]), iter(())
+
+    def __len__(self, context=None):
+
+        self._flushes()
+
+        return len(self.columns[0])
+
+    def counts_nodes(self):
+        """Counts the distinct terms used as a subject or an object.
+
+        Returns:
+            An integer.
+        """
+
+        self._flushes()
+
+        return len(np.unique(np.concatenate((self.columns[0], self.columns[2]))))
+
+    def nbytes(self):
+        """Gets the number of bytes used by the triple arrays and indexes (the term dictionary is not included).
+
+        Returns:
+            An integer.
+        """
+
+        return sum(column.nbytes for index in self.indexes.values() for column in index) + \
+            self.pending.itemsize * len(self.pending)
+
+    def contexts(self, triple=None):
+
+        return iter(())
+
+    def bind(self, prefix, namespace, override=True):
+
+        bound_namespace = self.namespace_map.get(prefix)
+        bound_prefix = self.prefix_map.get(namespace, self.prefix_map.get(bound_namespace))
+
+        if override:
+            if bound_prefix is not None:
+                del self.namespace_map[bound_prefix]
+            if bound_namespace is not None:
+                del self.prefix_map[bound_namespace]
+            self.prefix_map[namespace] = prefix
+            self.namespace_map[prefix] = namespace
+        else:
+            self.prefix_map[namespace if bound_namespace is None else bound_namespace] = \
+                prefix if bound_prefix is None else bound_prefix
+            self.namespace_map[prefix if bound_prefix is None else bound_prefix] = \
+                namespace if bound_namespace is None else bound_namespace
+
+    def namespace(self, prefix):
+
+        return self.namespace_map.get(prefix)
+
+    def prefix(self, namespace):
+
+        return self.prefix_map.get(namespace)
+
+    def namespaces(self):
+
+        for prefix, namespace in list(self.namespace_map.items()):
+            yield prefix, namespace
+
+
+def creates_graph(backend='rdflib'):
+    """Creates an empty rdflib graph backed by either rdflib's default in-memory store or a TripleStore.
+
+    Args:
+        backend (str): A string naming the store, either 'rdflib' or 'triplestore'.
+
+    Returns:
+        An rdflib Graph.
+
+    Raises:
+        An exception is raised if the backend is not recognized.
+    """
+
+    if backend == 'rdflib':
+        return Graph()
+    elif backend == 'triplestore':
+        return Graph(store=TripleStore())
+    else:
+        raise Exception('ERROR: Unknown graph backend {}, use rdflib or triplestore'.format(backend))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import unittest
+
+from scripts.python.DeductiveClosure import infers_closure_triples, rdf_type, subclass_of
+
+
+class TestSparseClosure(unittest.TestCase):
+    """Class tests the sparse matrix closure of subclass and type axioms."""
+
+    def test_infers_transitive_subclasses_and_types(self):
+
+        triples = [('http://example.org/A', subclass_of, 'http://example.org/B'),
+                   ('http://example.org/B', subclass_of, 'http://example.org/C'),
+                   ('http://example.org/x', rdf_type, 'http://example.org/A')]
+
+        self.assertEqual(sorted(infers_closure_triples(triples)),
+                         [('http://example.org/A', subclass_of, 'http://example.org/C'),
+                          ('http://example.org/x', rdf_type, 'http://example.org/B'),
+                          ('http://example.org/x', rdf_type, 'http://example.org/C')])
+
+    def test_infers_entailments_reached_through_many_parallel_paths(self):
+
+        # a class and an instance below 200 middle classes that are all subclasses of one top class, so each
+        # entailment is reached through 200 paths (more than an int8 path count holds)
+        base, paths = 'http://example.org/', 200
+        triples = [(base + 'Bottom', subclass_of, base + 'Middle_{}'.format(i)) for i in range(paths)]
+        triples += [(base + 'Middle_{}'.format(i), subclass_of, base + 'Top') for i in range(paths)]
+        triples += [(base + 'instance', rdf_type, base + 'Middle_{}'.format(i)) for i in range(paths)]
+
+        inferred = set(infers_closure_triples(triples))
+
+        self.assertIn((base + 'Bottom', subclass_of, base + 'Top'), inferred)
+        self.assertIn((base + 'instance', rdf_type, base + 'Top'), inferred)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# import needed libraries
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.parse
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scripts.python.NCBO_rest_api import extracts_mapping_data
+
+
+class StandInBioPortal(object):
+    """Class runs a local stand-in for the mappings endpoint of the BioPortal REST API, serving a configurable number
+    of pages and recording the pages that were requested.
+
+    """
+
+    def __init__(self, page_count, version='1'):
+
+        self.page_count, self.version, self.failing_page = page_count, version, None
+        self.requested = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                page = int(urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)['page'][0])
+                stand_in.requested.append(page)
+
+                if page == stand_in.failing_page:
+                    self.send_response(404)
+                    self.end_headers()
+                    return None
+
+                body = json.dumps({'pageCount': stand_in.page_count, 'collection': [
+                    {'classes': [{'@id': 'http://id.nlm.nih.gov/mesh/{}/M{}'.format(stand_in.version, page)},
+                                 {'@id': 'http://purl.obolibrary.org/obo/CHEBI_{}'.format(page),
+                                  'links': {'ontology': 'http://data.bioontology.org/ontologies/CHEBI'}}]}]})
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body.encode('utf-8'))
+
+                return None
+
+            def log_message(self, *args):
+                return None
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stops(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestMappingFetcher(unittest.TestCase):
+    """Class tests the BioPortal mapping fetcher, and its page cache, against a local stand-in server."""
+
+    def setUp(self):
+
+        self.work_dir = tempfile.mkdtemp()
+        self.server = StandInBioPortal(page_count=20)
+
+    def tearDown(self):
+
+        self.server.stops()
+        shutil.rmtree(self.work_dir)
+
+    def _extracts(self):
+
+        return extracts_mapping_data('MESH', 'CHEBI', self.work_dir + '/map.txt', self.server.url,
+                                     cache_dir=self.work_dir + '/cache/', concurrency=4, rate=1000, api_key='stand-in')
+
+    def test_fetches_all_pages(self):
+
+        mappings = self._extracts()
+
+        self.assertEqual(len(mappings), 20)
+        self.assertEqual(sorted(self.server.requested), list(range(1, 21)))
+
+    def test_resumes_interrupted_run(self):
+
+        self.server.failing_page = 12
+        self.assertRaises(Exception, self._extracts)
+
+        cached = {int(name[5:-5]) for name in os.listdir(self.work_dir + '/cache/127.0.0.1_{}/MESH'.format(
+            self.server.server.server_address[1])) if name.startswith('page_') and name.endswith('.json')}
+        self.assertNotIn(12, cached)
+        self.assertGreater(len(cached), 1)
+
+        self.server.failing_page = None
+        self.server.requested = []
+        mappings = self._extracts()
+
+        # only the first page (which is always fetched) and the pages missing from the interrupted run are requested
+        self.assertEqual(len(mappings), 20)
+        self.assertEqual(sorted(self.server.requested), sorted({1} | (set(range(1, 21)) - cached)))
+
+    def test_does_not_reuse_completed_run(self):
+
+        self._extracts()
+        self.server.requested = []
+        self._extracts()
+
+        self.assertEqual(sorted(self.server.requested), list(range(1, 21)))
+
+    def test_discards_pages_when_first_page_changes(self):
+
+        self.server.failing_page = 12
+        self.assertRaises(Exception, self._extracts)
+
+        self.server.failing_page, self.server.version = None, '2'
+        self.server.requested = []
+        mappings = self._extracts()
+
+        self.assertEqual(sorted(self.server.requested), list(range(1, 21)))
+        self.assertTrue(all('/2/' in mapping[0] for mapping in mappings))
+
+
+if __name__ == '__main__':
+    unittest.main()